@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+# Offline benchmark suite of the client hot paths. Micro benchmarks time
+# the receive framing (text and binary), the dispatch of the received
+# messages, REP_TABLE parsing, the notification and request/reply handoffs
+# between threads and the console output. Macro benchmarks play full games
+# of loadGenerator bots against an in-process stand-in server. Results are
+# written as JSON and compared against a stored baseline, a slowdown past
+# the tolerance fails the run.
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+from queue import SimpleQueue
+from threading import Thread
+from binaryFraming import BinaryFrameDecoder, encode_binary_frame, encode_binary_table
+from clientIO import ScriptedSyncIO, SyncConsoleAppenderInputReader
+from clientMain import Client
+from loadGenerator import run_load
+from messageCodec import (
+    decode_reply,
+    encode,
+    encode_table,
+    encode_table_delta,
+)
+from messageFraming import FrameDecoder, encode_frame
+from notificationQueue import NotificationQueue
+from standInServer import StandInServer, make_puzzle
+from utils import add_logging_arguments, configure_logging_from_args, getmylogger
+from messageProtocol import *
+
+
+logging = getmylogger(__name__)
+
+DEFAULT_PLAYERS = (2, 16, 256)
+# Relative slowdown tolerated before a result counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+
+def measure(fn, items=1, repeat=5, min_time=0.1):
+    # Items per second of fn (processing items per call), best of repeat
+    # runs each calling fn long enough to take min_time seconds
+    number = 1
+    while True:
+        elapsed = _time_calls(fn, number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed) + 1)
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, _time_calls(fn, number))
+    return number * items / best
+
+
+def _time_calls(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - start
+
+
+def result(value, unit, higher_is_better=True):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def game_stream(seed=1, moves=40):
+    # Server messages of a game as seen by a player: the table, then the
+    # replies to its moves, the moves of the others and table deltas
+    rnd = random.Random(seed)
+    puzzle, solution = make_puzzle(rnd=rnd)
+    msgs = [encode_table(puzzle)]
+    empty = [cell for cell, value in enumerate(puzzle) if not value]
+    for version, cell in enumerate(rnd.sample(empty, moves), 1):
+        x, y, nr = cell % 9 + 1, cell // 9 + 1, solution[cell]
+        msgs.append(encode(REP_PUT_NR, PUT_NR_SUCCESS))
+        msgs.append(encode(REP_NOTIFY, "bob put {} at ({}, {})".format(nr, x, y)))
+        msgs.append(encode_table_delta(version, [(cell, nr)]))
+    return msgs
+
+
+def _text_stream(msgs):
+    return b"".join(encode_frame(m) for m in msgs)
+
+
+def _binary_stream(msgs):
+    return b"".join(bytes(encode_binary_frame(m)) for m in msgs)
+
+
+def bench_receive_text(opts):
+    # Frames split out of the received data and decoded to Messages
+    msgs = game_stream()
+    data = _text_stream(msgs)
+    decoder = FrameDecoder()
+
+    def run():
+        for frame in decoder.feed(data):
+            decode_reply(frame)
+
+    return result(measure(run, len(msgs), opts.repeat), "frames/s")
+
+
+def bench_receive_binary(opts):
+    msgs = game_stream()
+    data = _binary_stream(msgs)
+    decoder = BinaryFrameDecoder()
+    return result(measure(lambda: decoder.feed(data), len(msgs), opts.repeat), "frames/s")
+
+
+def bench_dispatch(opts):
+    # Received data through the client's framing, handlers and state
+    # machine (replayed, no network)
+    msgs = game_stream()
+    data = _text_stream(msgs)
+    client = Client(ScriptedSyncIO(keep_output=0))
+
+    def run():
+        client.replay_received(data)
+        client.dispatch_events()
+        client.poll_notifications()
+
+    try:
+        return result(measure(run, len(msgs), opts.repeat), "frames/s")
+    finally:
+        client.stop()
+
+
+def bench_table_parse_text(opts):
+    frame = encode_table(make_puzzle(rnd=random.Random(1))[0])
+    return result(measure(lambda: decode_reply(frame), 1, opts.repeat), "tables/s")
+
+
+def bench_table_parse_binary(opts):
+    frame = bytes(encode_binary_table(make_puzzle(rnd=random.Random(1))[0]))
+    decoder = BinaryFrameDecoder()
+    return result(measure(lambda: decoder.feed(frame), 1, opts.repeat), "tables/s")
+
+
+def bench_notification_handoff(opts):
+    # Notifications put by one thread, taken in batches by another
+    n = 10000
+
+    def run():
+        queue = NotificationQueue(maxlen=n)
+
+        def produce():
+            for i in range(n):
+                queue.put("notification")
+            queue.close()
+
+        producer = Thread(target=produce)
+        producer.start()
+        while queue.get_batch() is not None:
+            pass
+        producer.join()
+
+    return result(measure(run, n, opts.repeat), "msgs/s")
+
+
+def bench_request_handoff(opts):
+    # Request Futures answered by a stand-in network thread, the caller
+    # blocking on each reply like __sync_request does
+    n = 1000
+    client = Client(ScriptedSyncIO(keep_output=0))
+    reply = encode_frame(encode(REP_PUT_NR, PUT_NR_SUCCESS))
+    sent = SimpleQueue()
+
+    def network():
+        while sent.get() is not None:
+            client.replay_received(reply)
+
+    thread = Thread(target=network)
+    thread.start()
+
+    def run():
+        for _ in range(n):
+            rsp = client.replay_request("d:119")
+            sent.put(True)
+            rsp.result()
+
+    try:
+        return result(measure(run, n, opts.repeat), "requests/s")
+    finally:
+        sent.put(None)
+        thread.join()
+        client.stop()
+
+
+def _console_output(opts, batch):
+    # Console writes with the output going to /dev/null
+    io = SyncConsoleAppenderInputReader()
+    msg = "bob put 5 at (3, 7)"
+    msgs = [msg] * batch
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        if batch == 1:
+            return result(measure(lambda: io.output_sync(msg), 1, opts.repeat), "msgs/s")
+        return result(measure(lambda: io.output_batch_sync(msgs), batch, opts.repeat),
+                      "msgs/s")
+
+
+def bench_output_sync(opts):
+    return _console_output(opts, 1)
+
+
+def bench_output_batch_sync(opts):
+    return _console_output(opts, 32)
+
+
+MICRO_BENCHMARKS = {
+    "receive_text": bench_receive_text,
+    "receive_binary": bench_receive_binary,
+    "dispatch": bench_dispatch,
+    "table_parse_text": bench_table_parse_text,
+    "table_parse_binary": bench_table_parse_binary,
+    "notification_handoff": bench_notification_handoff,
+    "request_handoff": bench_request_handoff,
+    "output_sync": bench_output_sync,
+    "output_batch_sync": bench_output_batch_sync,
+}
+
+
+async def _play(players, holes, seed):
+    server = StandInServer(port=0, holes=holes, seed=seed)
+    await server.start()
+    try:
+        return await run_load(server.host, server.port, players, seed=seed)
+    finally:
+        await server.close()
+
+
+def bench_game(players, opts):
+    # Best (by moves/s) of the repeated games, with its put latencies
+    best = None
+    for _ in range(opts.macro_repeat):
+        summary = asyncio.run(_play(players, opts.holes, opts.seed)).summary()
+        if best is None or summary["moves_per_s"] > best["moves_per_s"]:
+            best = summary
+    if best["errors"]:
+        logging.warning("Errors playing with %d players: %s", players, best["errors"])
+    put = best["latency"].get("put_number", {})
+    name = "game_{}p_".format(players)
+    return {
+        name + "moves_per_s": result(best["moves_per_s"], "moves/s"),
+        name + "put_p50_ms": result(put.get("p50_ms", 0.0), "ms", False),
+        name + "put_p99_ms": result(put.get("p99_ms", 0.0), "ms", False),
+    }
+
+
+def run_benchmarks(opts):
+    results = {}
+    if not opts.macro_only:
+        for name, bench in MICRO_BENCHMARKS.items():
+            if opts.filter and opts.filter not in name:
+                continue
+            results[name] = bench(opts)
+            logging.info("%s: %.0f %s", name, results[name]["value"], results[name]["unit"])
+    if not opts.micro_only:
+        for players in opts.players:
+            if opts.filter and opts.filter not in "game_{}p".format(players):
+                continue
+            results.update(bench_game(players, opts))
+    return {
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # (name, value, baseline value, relative change, regressed) of the
+    # results present in both, change > 0 is always an improvement
+    rows = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None or base["value"] <= 0 or r["value"] <= 0:
+            continue
+        if r["higher_is_better"]:
+            change = r["value"] / base["value"] - 1
+        else:
+            change = base["value"] / r["value"] - 1
+        rows.append((name, r["value"], base["value"], change, change < -tolerance))
+    return rows
+
+
+def report(results, rows=()):
+    compared = {row[0]: row for row in rows}
+    lines = []
+    for name, r in results.items():
+        line = "{:<26} {:>14.2f} {:<10}".format(name, r["value"], r["unit"])
+        row = compared.get(name)
+        if row is not None:
+            line += " baseline {:>14.2f} {:+7.1%}{}".format(
+                row[2], row[3], "  REGRESSION" if row[4] else ""
+            )
+        lines.append(line)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Client benchmark suite")
+    parser.add_argument("-o", "--output", default=None, help="write the results here")
+    parser.add_argument("--baseline", default=None,
+                        help="results file to compare with, regressions exit with 1")
+    parser.add_argument("--save-baseline", default=None,
+                        help="store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown accepted, 0.2 = 20%%")
+    parser.add_argument("-k", "--filter", default=None,
+                        help="run the benchmarks having this in their name")
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--macro-only", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="timed runs of each micro benchmark, best counts")
+    parser.add_argument("--players", type=lambda s: [int(n) for n in s.split(",")],
+                        default=list(DEFAULT_PLAYERS),
+                        help="comma separated player counts of the games")
+    parser.add_argument("--macro-repeat", type=int, default=3,
+                        help="games played at each player count, best counts")
+    parser.add_argument("--holes", type=int, default=45,
+                        help="empty cells per game")
+    parser.add_argument("--seed", type=int, default=1)
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging_from_args(args)
+    run = run_benchmarks(args)
+    rows = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(run["results"], json.load(f)["results"], args.tolerance)
+    print(report(run["results"], rows))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(run, f, indent=2)
+    regressed = [row[0] for row in rows if row[4]]
+    if regressed:
+        print("Regressed: {}".format(", ".join(regressed)))
+        sys.exit(1)
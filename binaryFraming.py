@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Length prefixed binary frames, used once both sides agreed on CAP_BINARY
+# (REQ_CAPABILITIES). A frame is a (type, payload length) header and the
+# payload. The type is the REQ_*/REP_* code, tables are packed 4 bits per
+# cell, moves and the cells of table deltas into 2 bytes each (after the
+# 4 byte version of the delta), the rest of the payloads are the text ones
+# in utf-8. The decoder finds the frames by their length instead of
+# scanning for the end char, and parses the payloads into
+# messageCodec.Message objects straight off a memoryview of its buffer.
+import struct
+from messageCodec import (
+    Message,
+    REPLY_DECODERS,
+    REQUEST_DECODERS,
+    TableDelta,
+    format_changes,
+)
+from messageProtocol import *
+
+BINARY_HEADER = struct.Struct("!BH")
+MAX_PAYLOAD = 0xFFFF
+TABLE_BYTES = 41  # 81 cells, two per byte
+DELTA_VERSION = struct.Struct("!I")
+
+# Cell pairs of every byte value
+_NIBBLES = [(b >> 4, b & 0x0F) for b in range(256)]
+_NIBBLE_BYTES = [bytes(pair) for pair in _NIBBLES]
+_DIGIT_CHARS = bytes.maketrans(bytes(range(10)), b"0123456789")
+
+
+def pack_table(cells):
+    # 81 ints (0..9) into 41 bytes, high nibble first
+    packed = bytearray(TABLE_BYTES)
+    for i in range(40):
+        packed[i] = cells[2 * i] << 4 | cells[2 * i + 1]
+    packed[40] = cells[80] << 4
+    return packed
+
+
+def _unpack_cells(view):
+    # 81 cell values as bytes
+    if len(view) != TABLE_BYTES:
+        raise ValueError("Packed table of {} bytes".format(len(view)))
+    cells = b"".join(map(_NIBBLE_BYTES.__getitem__, view))[:81]
+    if max(cells) > 9:
+        raise ValueError("Cell value out of range")
+    return cells
+
+
+def unpack_table(view):
+    return list(_unpack_cells(view))
+
+
+def pack_move(x, y, nr):
+    return bytes((x << 4 | y, nr))
+
+
+def unpack_move(view):
+    if len(view) != 2:
+        raise ValueError("Packed move of {} bytes".format(len(view)))
+    x, y = _NIBBLES[view[0]]
+    return x, y, view[1]
+
+
+def pack_delta(version, changes):
+    # Version, then column/row nibbles and the number of each changed cell
+    packed = bytearray(DELTA_VERSION.size + 2 * len(changes))
+    DELTA_VERSION.pack_into(packed, 0, version)
+    i = DELTA_VERSION.size
+    for cell, nr in changes:
+        packed[i] = (cell % 9 + 1) << 4 | (cell // 9 + 1)
+        packed[i + 1] = nr
+        i += 2
+    return packed
+
+
+def unpack_delta(view):
+    if len(view) < DELTA_VERSION.size or (len(view) - DELTA_VERSION.size) % 2:
+        raise ValueError("Packed delta of {} bytes".format(len(view)))
+    (version,) = DELTA_VERSION.unpack_from(view)
+    changes = []
+    for i in range(DELTA_VERSION.size, len(view), 2):
+        x, y = _NIBBLES[view[i]]
+        nr = view[i + 1]
+        if not (1 <= x <= 9 and 1 <= y <= 9) or nr > 9:
+            raise ValueError("Changed cell out of range")
+        changes.append(((y - 1) * 9 + x - 1, nr))
+    return TableDelta(version, changes)
+
+
+# Text payload -> binary payload, utf-8 when not listed
+def _table_payload(payload):
+    return pack_table(REPLY_DECODERS[REP_TABLE](payload))
+
+
+def _move_payload(payload):
+    return pack_move(*REQUEST_DECODERS[REQ_PUT_NR](payload))
+
+
+def _delta_payload(payload):
+    return pack_delta(*REPLY_DECODERS[REP_TABLE_DELTA](payload))
+
+
+PAYLOAD_ENCODERS = {
+    REP_TABLE: _table_payload,
+    REP_TABLE_DELTA: _delta_payload,
+    REQ_PUT_NR: _move_payload,
+}
+
+
+def binary_frame(header, body):
+    # Frame of an already encoded payload
+    if len(body) > MAX_PAYLOAD:
+        raise ValueError("Payload of {} bytes does not fit a frame".format(len(body)))
+    frame = bytearray(BINARY_HEADER.size + len(body))
+    BINARY_HEADER.pack_into(frame, 0, ord(header), len(body))
+    frame[BINARY_HEADER.size :] = body
+    return frame
+
+
+def encode_binary_frame(msg):
+    # Binary frame of a text protocol message (header:payload)
+    header, payload = msg[0], msg[2:]
+    encoder = PAYLOAD_ENCODERS.get(header)
+    body = encoder(payload) if encoder is not None else payload.encode("utf-8")
+    return binary_frame(header, body)
+
+
+def encode_binary_table(cells):
+    # REP_TABLE frame straight from the cells
+    return binary_frame(REP_TABLE, pack_table(cells))
+
+
+def encode_binary_table_delta(version, changes):
+    return binary_frame(REP_TABLE_DELTA, pack_delta(version, changes))
+
+
+# Binary payload -> (text payload, data) by header
+def _text_decoder(parse):
+    def decode(view):
+        payload = str(view, "utf-8")
+        return payload, parse(payload)
+
+    return decode
+
+
+def _table_decoder(view):
+    # Same text as format_table, made of the digit chars at once
+    cells = _unpack_cells(view)
+    digits = cells.translate(_DIGIT_CHARS).decode("ascii")
+    text = "\n".join(" ".join(digits[r : r + 9]) for r in range(0, 81, 9))
+    return text, list(cells)
+
+
+def _delta_decoder(view):
+    delta = unpack_delta(view)
+    return "{}{}{}".format(delta.version, FIELD_SEP, format_changes(delta.changes)), delta
+
+
+def _move_decoder(view):
+    move = unpack_move(view)
+    return "{}{}{}".format(*move), move
+
+
+BINARY_REPLY_DECODERS = {h: _text_decoder(f) for h, f in REPLY_DECODERS.items()}
+BINARY_REPLY_DECODERS[REP_TABLE] = _table_decoder
+BINARY_REPLY_DECODERS[REP_TABLE_DELTA] = _delta_decoder
+BINARY_REQUEST_DECODERS = {h: _text_decoder(f) for h, f in REQUEST_DECODERS.items()}
+BINARY_REQUEST_DECODERS[REQ_PUT_NR] = _move_decoder
+
+
+class BinaryFrameDecoder:
+    def __init__(self, decoders=BINARY_REPLY_DECODERS):
+        self.__buf = bytearray()
+        self.__decoders = decoders
+
+    def feed(self, data):
+        # Returns (Message, frame size) of every frame completed by data.
+        # Data of an unknown type or not parsing gives a Message without data
+        buf = self.__buf
+        buf += data
+        received = []
+        pos = 0
+        hsize = BINARY_HEADER.size
+        with memoryview(buf) as view:
+            while len(buf) - pos >= hsize:
+                code, length = BINARY_HEADER.unpack_from(view, pos)
+                end = pos + hsize + length
+                if end > len(buf):
+                    break
+                with view[pos + hsize : end] as payload:
+                    received.append((self.__decode(chr(code), payload), end - pos))
+                pos = end
+        del buf[:pos]
+        return received
+
+    def __decode(self, header, payload):
+        decoder = self.__decoders.get(header)
+        try:
+            if decoder is not None:
+                text, data = decoder(payload)
+                return Message(header, text, data)
+            return Message(header, str(payload, "utf-8"), None)
+        except ValueError:
+            return Message(header, str(payload, "utf-8", "replace"), None)
+
+    def pending(self):
+        # Bytes of the incomplete frame kept
+        return len(self.__buf)
+
+    def reset(self):
+        self.__buf = bytearray()
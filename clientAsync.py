@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# asyncio based game client. Speaks the same protocol as clientMain.Client
+# but runs on asyncio streams, so a single event loop can drive any number
+# of clients without networking/notification threads or polling.
+# AsyncConsoleGame adapts it to the AbstractSyncIO front-end.
+import asyncio
+from collections import deque
+from clientIO import InputClosedException, SyncConsoleAppenderInputReader
+from messageCodec import (
+    NOTIFICATION_HEADERS,
+    RESPONSE_HEADERS,
+    decode_reply,
+    encode_join_session,
+    encode_nickname,
+    encode_put_number,
+)
+from messageFraming import FrameDecoder, RECV_CHUNK_SIZE, encode_frame
+from clientTransport import DEFAULT_TRANSPORT, configure_socket, parse_address
+from utils import getmylogger
+from messageProtocol import *
+
+
+logging = getmylogger(__name__)
+
+
+class AsyncClient:
+    def __init__(self, transport=DEFAULT_TRANSPORT):
+        self.__transport = transport  # clientTransport.TransportConfig
+        self.__reader = None
+        self.__writer = None
+        self.__decoder = FrameDecoder()
+        self.__receiver = None  # Task processing the received frames
+        # Futures of the sent requests, answered in the order of sending
+        self.__pending = deque()
+        # Replies which arrived when no request was waiting (the table sent
+        # to all the players when the session fills up)
+        self.__unsolicited = asyncio.Queue()
+        self.__notifications = asyncio.Queue()
+        self.my_name = None
+
+    def connected(self):
+        return self.__writer is not None and not self.__writer.is_closing()
+
+    async def connect(self, host, port=DEFAULT_PORT):
+        # Open the connection and start processing the received frames
+        self.__reader, self.__writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), self.__transport.connect_timeout
+        )
+        configure_socket(self.__writer.get_extra_info("socket"), self.__transport)
+        self.__decoder.reset()
+        logging.info("Connected to Game server at %s:%s", host, port)
+        self.__receiver = asyncio.ensure_future(self.__receive_loop())
+
+    async def close(self):
+        # Close the connection, fail everything still waiting on it
+        if self.__writer is not None:
+            self.__writer.close()
+            try:
+                await self.__writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+        if self.__receiver is not None:
+            await self.__receiver
+            self.__receiver = None
+
+    def __request(self, req):
+        # Send the request, return the future of its reply. Requests may
+        # be issued back to back, replies are matched in FIFO order
+        if not self.connected():
+            raise ConnectionError("Not connected to the game server")
+        rsp = asyncio.get_running_loop().create_future()
+        self.__pending.append(rsp)
+        self.__writer.write(encode_frame(req))
+        return rsp
+
+    async def __sync_request(self, req):
+        rsp = self.__request(req)
+        await self.__writer.drain()
+        timeout = self.__transport.response_timeout
+        if timeout is None:
+            return await rsp
+        try:
+            return await asyncio.wait_for(rsp, timeout)
+        except asyncio.TimeoutError:
+            # Server is gone or stuck, the later replies can't be trusted
+            logging.warning("No Reply In %ss, Dropping The Connection", timeout)
+            self.__writer.close()
+            raise ConnectionError("Game server is not answering")
+
+    async def __receive_loop(self):
+        # Split received data into frames and route them till the server
+        # closes the connection
+        try:
+            while True:
+                data = await self.__reader.read(RECV_CHUNK_SIZE)
+                if len(data) <= 0:
+                    logging.debug("Socket Receive Interrupted")
+                    break
+                for message in self.__decoder.feed(data):
+                    self.__protocol_rcv(message)
+        except (OSError, ConnectionError) as e:
+            logging.error("Connection Error: %s", e)
+        finally:
+            self.__connection_lost()
+
+    def __protocol_rcv(self, frame):
+        msg = decode_reply(frame)
+        if msg is None:
+            logging.debug("Not Enough Data Received From %s", frame)
+        elif msg.header in RESPONSE_HEADERS:
+            while self.__pending:
+                rsp = self.__pending.popleft()
+                if not rsp.done():  # Skip the requests given up on
+                    rsp.set_result(msg)
+                    return
+            self.__unsolicited.put_nowait(msg)
+        elif msg.header in NOTIFICATION_HEADERS:
+            self.__notifications.put_nowait(msg)
+        else:
+            logging.debug("Unknown Control Message Received: %s", frame)
+
+    def __connection_lost(self):
+        logging.info("Disconnected:(")
+        if self.__writer is not None:
+            self.__writer.close()
+        while self.__pending:
+            rsp = self.__pending.popleft()
+            if not rsp.done():
+                rsp.set_exception(ConnectionError("Server closed connection"))
+        self.__unsolicited.put_nowait(None)
+        self.__notifications.put_nowait(None)
+
+    async def nickname(self, name):
+        # Register the nickname, returns the reply Message
+        # REP_CURRENT_SESSIONS on success, REP_NOT_OK if the name is taken
+        rsp = await self.__sync_request(encode_nickname(name))
+        if rsp.header == REP_CURRENT_SESSIONS:
+            self.my_name = name
+        return rsp
+
+    async def join_session(self, name, max_players=None):
+        # Join an existing session or create a new one when max_players is
+        # given. Reply is REP_WAITING_PLAYERS, REP_TABLE or REP_NOT_OK
+        return await self.__sync_request(encode_join_session(name, max_players))
+
+    async def put_number(self, x, y, number):
+        # Put number to column x, row y (all in 1..9)
+        return await self.__sync_request(encode_put_number(x, y, number))
+
+    async def wait_game_start(self):
+        # Wait for the table the server sends when the session is full,
+        # returns None if the connection was lost meanwhile
+        rsp = await self.__unsolicited.get()
+        while rsp is not None and rsp.header != REP_TABLE:
+            rsp = await self.__unsolicited.get()
+        return rsp
+
+    async def notifications(self):
+        # Iterate over the server notification Messages till the
+        # connection gets closed
+        while True:
+            msg = await self.__notifications.get()
+            if msg is None:
+                return
+            yield msg
+
+
+class AsyncConsoleGame:
+    # Runs the console game on top of AsyncClient. The AbstractSyncIO
+    # input is blocking, so it's read in the loop's default executor while
+    # the notifications are printed by a task of the event loop.
+
+    def __init__(self, io, client=None):
+        self.__io = io
+        self.__client = client if client is not None else AsyncClient()
+        self.__game_over = False
+
+    async def __input(self):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.__io.input_sync
+            )
+        except InputClosedException:
+            return "Q"
+
+    async def __notifications_loop(self):
+        async for msg in self.__client.notifications():
+            if msg.header == REP_SCORES_GAME_OVER:
+                self.__game_over = True
+                self.__io.output_sync("The Game Has Ended. {}\n".format(msg.payload))
+            else:
+                self.__io.output_sync(msg.payload)
+
+    @staticmethod
+    def __valid_name(name):
+        return len(name) in range(1, 9) and name.isalnum()
+
+    async def __register(self):
+        # Ask name and server address till the server accepts the name
+        self.__io.output_sync("What's Your NickName?")
+        while True:
+            name = await self.__input()
+            if name == "Q":
+                return False
+            if not self.__valid_name(name):
+                self.__io.output_sync("Not A Suitable Name, Try Again!!")
+                continue
+            if not self.__client.connected():
+                self.__io.output_sync("What's The Server's Address (host[:port])?")
+                address = await self.__input()
+                if address == "Q":
+                    return False
+                try:
+                    host, port = parse_address(address)
+                except ValueError as e:
+                    self.__io.output_sync("Not a server address: {}".format(e))
+                    continue
+                try:
+                    await self.__client.connect(host, port)
+                except OSError as e:
+                    logging.error("Can not connect to game server %s", e)
+                    self.__io.output_sync("Can't connect to server!")
+                    continue
+                asyncio.ensure_future(self.__notifications_loop())
+            rsp = await self.__client.nickname(name)
+            if rsp.header == REP_CURRENT_SESSIONS:
+                return True
+            self.__io.output_sync("That Name Is Already Taken")
+
+    async def __join(self, create_sess):
+        # Ask the session details and join it. Returns None to quit, False
+        # if joining failed and True if the game has started
+        while create_sess not in ["c", "j"]:
+            if create_sess == "Q":
+                return None
+            self.__io.output_sync("Error, Enter Either 'c' or 'j'.")
+            create_sess = await self.__input()
+        p_count = None
+        while create_sess == "c" and p_count is None:
+            self.__io.output_sync("How many people are playing?")
+            p_count = await self.__input()
+            if p_count == "Q":
+                return None
+            if not p_count.isdigit() or int(p_count) < 2:
+                self.__io.output_sync("Need a minimum of two players!")
+                p_count = None
+        self.__io.output_sync("What's the session's name?")
+        sess_name = await self.__input()
+        while not self.__valid_name(sess_name):
+            if sess_name == "Q":
+                return None
+            self.__io.output_sync("Session name must be 1..8 letters or digits.")
+            sess_name = await self.__input()
+        rsp = await self.__client.join_session(sess_name, p_count)
+        if rsp.header == REP_WAITING_PLAYERS:
+            self.__io.output_sync("Waiting For Other Players...")
+            rsp = await self.__client.wait_game_start()
+            if rsp is None:
+                return None
+        if rsp.header == REP_TABLE:
+            self.__game_over = False
+            self.__io.output_sync(">>> Game Started! \n\n{}".format(rsp.payload))
+            self.__io.output_sync("\nEnter column, row, number to fill a spot.")
+            return True
+        self.__io.output_sync("Error Joining Session: {}".format(rsp.payload))
+        return False
+
+    async def run(self):
+        self.__io.output_sync("\nPress Enter ⮐ to initiate input.")
+        try:
+            if not await self.__register():
+                return
+            in_game = False
+            while True:
+                if not in_game:
+                    self.__io.output_sync(
+                        "\nWant To [c]reate A New Session Or [j]oin An Existing One?"
+                    )
+                user_input = await self.__input()
+                if user_input == "Q":
+                    break
+                if self.__game_over:
+                    in_game = False
+                if not in_game:
+                    in_game = await self.__join(user_input)
+                    if in_game is None:
+                        break
+                elif len(user_input) != 3 or not all(
+                    c in "123456789" for c in user_input
+                ):
+                    self.__io.output_sync("Not proper input - need three digits 1..9")
+                else:
+                    rsp = await self.__client.put_number(*user_input)
+                    self.__io.output_sync(rsp.payload)
+        except ConnectionError as e:
+            self.__io.output_sync("Disconnected: {}".format(e))
+        finally:
+            self.__io.output_sync("Queue Entered, Disconnecting...")
+            await self.__client.close()
+
+
+if __name__ == "__main__":
+    print("Starting Async Client Application...")
+    try:
+        asyncio.run(AsyncConsoleGame(SyncConsoleAppenderInputReader()).run())
+    except KeyboardInterrupt:
+        logging.warning("Ctrl+C Issued, Terminating ...")
+    logging.info("Terminating")
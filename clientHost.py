@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Multiplexed host for many Client sessions in one process. Instead of a
+# NetworkThread per client, all the client sockets are registered with one
+# selectors based reactor thread which hands each readable socket to its
+# Client to decode and dispatch the frames.
+import selectors
+from socket import socketpair
+from threading import Lock, Thread
+from utils import getmylogger
+
+
+logging = getmylogger(__name__)
+
+
+class ClientHost:
+    def __init__(self, selector=None):
+        self.__selector = selector if selector is not None else selectors.DefaultSelector()
+        # Registrations come from the game threads, they are queued and the
+        # reactor is woken up to apply them
+        self.__pending_lock = Lock()
+        self.__pending = []
+        self.__wakeup_rcv, self.__wakeup_send = socketpair()
+        self.__wakeup_rcv.setblocking(False)
+        self.__wakeup_send.setblocking(False)
+        self.__selector.register(self.__wakeup_rcv, selectors.EVENT_READ, None)
+        self.__running = False
+        self.reactor_thread = None
+
+    def __len__(self):
+        # Number of hosted connections
+        return len(self.__selector.get_map()) - 1
+
+    def start(self):
+        self.__running = True
+        self.reactor_thread = Thread(name="ClientHostReactor", target=self.run)
+        self.reactor_thread.start()
+
+    def stop(self):
+        # Stop the reactor, the hosted sockets are left to their clients
+        self.__running = False
+        self.__wakeup()
+        if self.reactor_thread is not None:
+            self.reactor_thread.join()
+            self.reactor_thread = None
+
+    def register(self, sock, client):
+        # Serve the socket of the client, client.handle_readable gets called
+        # whenever the socket has data
+        with self.__pending_lock:
+            self.__pending.append((sock, client))
+        self.__wakeup()
+
+    def unregister(self, sock):
+        # Stop serving the socket (its client is about to close it)
+        with self.__pending_lock:
+            self.__pending.append((sock, None))
+        self.__wakeup()
+
+    def __wakeup(self):
+        try:
+            self.__wakeup_send.send(b"\0")
+        except BlockingIOError:
+            pass  # Reactor has wakeups pending anyway
+
+    def __apply_pending(self):
+        try:
+            while self.__wakeup_rcv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self.__pending_lock:
+            pending, self.__pending = self.__pending, []
+        for sock, client in pending:
+            if client is None:
+                try:
+                    self.__selector.unregister(sock)
+                except (ValueError, KeyError):
+                    pass
+                continue
+            try:
+                try:
+                    self.__selector.register(sock, selectors.EVENT_READ, client)
+                except KeyError:
+                    # The descriptor got reused, its previous socket was
+                    # closed by the client without the reactor noticing
+                    self.__selector.unregister(sock.fileno())
+                    self.__selector.register(sock, selectors.EVENT_READ, client)
+            except (ValueError, KeyError, OSError) as e:
+                logging.warning("Can't host a client socket: %s", e)
+
+    def __drop(self, key):
+        try:
+            self.__selector.unregister(key.fileobj)
+        except (ValueError, KeyError):
+            pass
+
+    def run(self):
+        # Reactor loop, dispatches readable sockets to their clients
+        logging.info("Falling To Host Reactor Loop ...")
+        while self.__running:
+            for key, _ in self.__selector.select():
+                if key.data is None:
+                    self.__apply_pending()
+                    continue
+                if key.fileobj.fileno() < 0:
+                    self.__drop(key)  # Closed by its client meanwhile
+                    continue
+                try:
+                    alive = key.data.handle_readable()
+                except Exception:
+                    logging.exception("Hosted client failed")
+                    alive = False
+                if not alive:
+                    self.__drop(key)
+        for key in list(self.__selector.get_map().values()):
+            if key.data is not None:
+                self.__drop(key)
+        logging.info("Host Reactor Stopped")
+
+    def close(self):
+        self.stop()
+        self.__selector.unregister(self.__wakeup_rcv)
+        self.__wakeup_rcv.close()
+        self.__wakeup_send.close()
+        self.__selector.close()
@@ -1,4 +1,6 @@
 from threading import Condition, current_thread
+from time import perf_counter
+from collections import deque
 from getpass import getpass
 from abc import ABCMeta, abstractmethod
 from utils import enum
@@ -22,21 +24,44 @@ class AbstractSyncIO(metaclass=ABCMeta):
         self.__input_lock = False
         self.__output_closed = False
         self.__input_closed = False
+        # Histogram of the time outputs wait for the console (see
+        # clientMetrics), set by the owner
+        self.lock_wait = None
 
     @abstractmethod
     def output(self, msg):
         raise NotImplementedError
 
+    def __wait_console(self, t0):
+        # Called holding the console lock, waits for the input to finish
+        while self.__input_lock:
+            self.__console_lock.wait()
+            if self.__output_closed:
+                raise OutputClosedException
+        if self.lock_wait is not None:
+            self.lock_wait.observe(perf_counter() - t0)
+
     def output_sync(self, msg):
         if self.__output_closed:
             raise OutputClosedException
+        t0 = perf_counter()
         with self.__console_lock:
-            while self.__input_lock:
-                self.__console_lock.wait()
-                if self.__output_closed:
-                    raise OutputClosedException
+            self.__wait_console(t0)
+            self.output(msg)
+
+    def output_batch(self, msgs):
+        for msg in msgs:
             self.output(msg)
 
+    def output_batch_sync(self, msgs):
+        # Write all the messages taking the console once
+        if self.__output_closed:
+            raise OutputClosedException
+        t0 = perf_counter()
+        with self.__console_lock:
+            self.__wait_console(t0)
+            self.output_batch(msgs)
+
     @abstractmethod
     def input(self, prompt='', hidden=False):
         raise NotImplementedError
@@ -50,12 +75,14 @@ class AbstractSyncIO(metaclass=ABCMeta):
         self.__input_closed_exception_wrap(hidden=True)
         with self.__console_lock:
             self.__input_lock = True
-        msg = self.__input_closed_exception_wrap(prompt)
-        while len(msg) <= 0:
+        try:
             msg = self.__input_closed_exception_wrap(prompt)
-        with self.__console_lock:
-            self.__input_lock = False
-            self.__console_lock.notifyAll()
+            while len(msg) <= 0:
+                msg = self.__input_closed_exception_wrap(prompt)
+        finally:
+            with self.__console_lock:
+                self.__input_lock = False
+                self.__console_lock.notifyAll()
         return msg
 
     def close(self, pipe=ioclose.BOTH):
@@ -77,7 +104,51 @@ class SyncConsoleAppenderInputReader(AbstractSyncIO):
         else:
             print(msg)
 
+    def output_batch(self, msgs):
+        print("\n".join(msgs))
+
     def input(self, prompt='', hidden=False):
         if hidden:
             return getpass(prompt)
         return input(prompt)
+
+
+class ScriptedSyncIO(AbstractSyncIO):
+    # Non-interactive IO for bots and load tests. Input lines come from the
+    # script (more can be fed later on), outputs are kept in memory.
+    def __init__(self, script=(), keep_output=1000):
+        AbstractSyncIO.__init__(self)
+        self.__lines_lock = Condition()
+        self.__lines = deque(script)
+        self.__ended = False
+        self.outputs = deque(maxlen=keep_output)
+
+    def feed(self, *lines):
+        with self.__lines_lock:
+            self.__lines.extend(lines)
+            self.__lines_lock.notifyAll()
+
+    def end(self):
+        # Input gets closed once the remaining lines have been read
+        with self.__lines_lock:
+            self.__ended = True
+            self.__lines_lock.notifyAll()
+
+    def output(self, msg):
+        self.outputs.append(msg)
+
+    def output_batch(self, msgs):
+        self.outputs.extend(msgs)
+
+    def input(self, prompt='', hidden=False):
+        # The hidden "Press Enter" prompt waits for the next line like the
+        # console does, leaving the line for the input that follows. The
+        # console stays free for the outputs meanwhile
+        with self.__lines_lock:
+            while len(self.__lines) <= 0:
+                if self.__ended:
+                    raise InputClosedException
+                self.__lines_lock.wait()
+            if hidden:
+                return ''
+            return self.__lines.popleft()
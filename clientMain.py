@@ -2,16 +2,72 @@
 # Main client file. Upon running asks input from the player
 # and communicates with the server. clientHandler objects are
 # created in serverMain
-from threading import Thread, Lock, Condition
+import argparse
+from threading import Event, Thread, Lock
+from collections import deque
+from queue import Queue
+from time import perf_counter
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from clientIO import InputClosedException, SyncConsoleAppenderInputReader
-from utils import enum, getmylogger
-from socket import AF_INET, SOCK_STREAM, socket, SHUT_RD
+from clientTransport import (
+    DEFAULT_RECONNECT,
+    DEFAULT_TRANSPORT,
+    ReconnectPolicy,
+    TransportConfig,
+    backoff_delays,
+    open_connection,
+    parse_address,
+    timeout_seconds,
+)
+from clientMetrics import (
+    LOCK_WAIT_BUCKETS,
+    METRICS_FORMATS,
+    MetricsExporter,
+    MetricsRegistry,
+)
+from binaryFraming import BinaryFrameDecoder, encode_binary_frame
+from messageCodec import (
+    RESPONSE_HEADERS,
+    SessionInfo,
+    decode_reply,
+    decode_request,
+    encode,
+    encode_capabilities,
+    encode_join_session,
+    encode_nickname,
+    is_move_notification,
+)
+from messageFraming import FrameDecoder, RECV_CHUNK_SIZE, encode_frame
+from notificationQueue import NotificationQueue, OVERFLOW_DROP_OLDEST, OVERFLOW_POLICIES
+from gameHistory import GameHistory
+from sessionDirectory import SessionDirectory, free_seats
+from stateMachine import ANY_STATE, StateMachine, Transition
+from sudokuBoard import Board, cell_index
+from sudokuHints import HintEngine
+from wireRecorder import WIRE_CONNECT, WIRE_IN, WIRE_OUT, WireRecorder
+from utils import (
+    add_logging_arguments,
+    configure_logging_from_args,
+    enum,
+    getmylogger,
+    positive_int,
+)
+from socket import SHUT_RD, timeout as soc_timeout
 from socket import error as soc_err
+from struct import error as struct_err
 from messageProtocol import *
 
 
 logging = getmylogger(__name__)
 
+# Notification key of the board changes, coalesced when the notification
+# queue overflows
+BOARD_UPDATE = "board update"
+# Seconds to wait for the capabilities reply (at most half the response
+# timeout). Old servers may ignore REQ_CAPABILITIES, the client goes on
+# without any capability then
+CAPABILITIES_TIMEOUT = 2.0
+
 
 class Client:
     # Client can be in these states
@@ -23,109 +79,522 @@ class Client:
         WAIT_FOR_PLAYERS=4,
         NEED_PUTNUMBER=5,
     )
+    # Events driving the state machine, user input comes from the game loop
+    # thread, the rest from the network
+    __gm_events = enum(
+        USER_INPUT="user input",
+        TABLE_RECEIVED="table received",
+        GAME_OVER="game over",
+        DISCONNECTED="disconnected",
+        RESUMED="resumed",
+    )
+    # States waiting for the player to type something
+    __gm_input_states = frozenset(
+        [
+            __gm_states.NEED_NAME,
+            __gm_states.NOTCONNECTED,
+            __gm_states.SERVER_REFUSED_NAME,
+            __gm_states.NEED_SESSION,
+            __gm_states.NEED_PUTNUMBER,
+        ]
+    )
     # messages notified when client state changes
     __gm_ui_input_prompts = {
         __gm_states.NEED_NAME: "What's Your Nickname?",
-        __gm_states.NOTCONNECTED: "What's The Server's IP Address?",
+        __gm_states.NOTCONNECTED: "What's The Server's Address (host[:port])?",
         __gm_states.SERVER_REFUSED_NAME: "That Name Is Already Taken",
-        __gm_states.NEED_SESSION: """\nWant To [c]reate A New Session \
-                                  Or [j]oin An Existing One?""",
+        __gm_states.NEED_SESSION: """\nWant To [c]reate A New Session, \
+                                  [j]oin An Existing One, [a]uto-join \
+                                  The Best Open One Or [l]ist Them?""",
         __gm_states.WAIT_FOR_PLAYERS: "Waiting For Other Players...",
         __gm_states.NEED_PUTNUMBER: """\nEnter column, row, number to \
                                     fill a spot.\n
                                     For example,\
-                                    '213' puts '3' at (x=2, y=1).""",
+                                    '213' puts '3' at (x=2, y=1),\
+                                    'H' shows a hint.""",
     }
 
-    def __init__(self, io):
+    def __init__(self, io, strict_validation=False, notification_queue_size=256,
+                 notification_overflow=OVERFLOW_DROP_OLDEST, host=None,
+                 recorder=None, metrics=None, transport=DEFAULT_TRANSPORT,
+                 reconnect=DEFAULT_RECONNECT, binary=False, table_deltas=False,
+                 history=None):
         # Network related
         self.__send_lock = Lock()  # Only one entity can send out at a time
+        # Futures of the sent requests. Server replies in the order of the
+        # requests, so they get answered FIFO
+        self.__pending = deque()
         self.__s = None
-        # Here we collect the received responses and notify the waiting
-        # entities
-        self.__rcv_sync_msgs_lock = Condition()  # To wait/notify on received
-        self.__rcv_sync_msgs = []  # To collect the received responses
-        self.__rcv_async_msgs_lock = Condition()
-        self.__rcv_async_msgs = []  # To collect the received notifications
+        self.__transport = transport  # clientTransport.TransportConfig
+        # Dropped connections are made again following the
+        # clientTransport.ReconnectPolicy (None: never). Requests made while
+        # reconnecting are held, sent once the session is resumed
+        self.__reconnect_policy = reconnect
+        self.__reconnecting = False
+        self.__held = deque()
+        self.__stopping = Event()
+        self.__server_addr = None
+        # Frames are text ones till binary ones get negotiated (if wanted)
+        # after connecting
+        self.__binary_wanted = binary
+        self.binary_framing = False
+        # Table updates as REP_TABLE_DELTA, if the server agrees
+        self.__deltas_wanted = table_deltas
+        self.table_deltas = False
+        self.__decoder = FrameDecoder()  # Splits received data into frames
+        self.__receive = self.__receive_text
+        self.__frame_encoder = encode_frame
+        # wireRecorder.WireRecorder capturing the traffic, if any
+        self.__recorder = recorder
+        # gameHistory.GameHistory storing the finished games, if any
+        self.__history = history
+        # To collect the received notifications, bounded
+        self.__rcv_async_msgs = NotificationQueue(
+            notification_queue_size, notification_overflow
+        )
         self.__io = io  # User interface IO
-        # Current state of the game client
-        self.__gm_state_lock = Lock()
-        self.__gm_state = self.__gm_states.NEED_NAME
+        # Current state of the game client. Events are queued as
+        # (event, data, state when queued) and run by the game loop thread
+        self.__events = Queue()
+        self.__fsm = self.__build_state_machine()
         # Stores the server approved name
         self.__my_name = None
-        # Networking thread is created after the player has chose a name
+        self.__registered = False  # Server has accepted the name
+        self.__session_name = None  # Session joined, to rejoin on reconnect
+        # Open sessions of the server as last listed, kept up to date with
+        # the join replies
+        self.sessions = SessionDirectory()
+        # Local copy of the game board, moves known to be illegal are not
+        # sent to the server in strict validation mode
+        self.__board = None
+        self.__hints = None  # Candidates kept up to date with the board
+        # Tables and deltas are applied by the network thread, the game
+        # thread reads the board
+        self.__board_lock = Lock()
+        self.__board_version = None  # Of the last delta, None after a table
+        self.__resyncing = False  # Asked for the table, deltas are ignored
+        self.__game_started_at = None  # perf_counter() of the game's first table
+        self.__game_moves = 0  # Moves answered during the game
+        self.__strict_validation = strict_validation
+        # Networking thread is created after the player has chose a name,
+        # unless the socket is served by a shared clientHost.ClientHost
         self.network_thread = None
+        self.__host = host
+        # Handlers of the received messages by header
+        self.__rcv_handlers = {
+            REP_NOTIFY: self.__on_notify,
+            REP_SCORES_GAME_OVER: self.__on_game_over,
+        }
+        for header in RESPONSE_HEADERS:
+            self.__rcv_handlers[header] = self.__sync_response
+        self.__rcv_handlers[REP_CAPABILITIES] = self.__on_capabilities
+        self.__rcv_handlers[REP_TABLE] = self.__on_table
+        self.__rcv_handlers[REP_TABLE_DELTA] = self.__on_table_delta
+        self.__init_metrics(metrics)
+        # Handlers of the replies by request header, for replayed requests
+        self.__replay_handlers = {
+            REQ_NICKNAME: lambda req, rsp: self.__name_ack(rsp),
+            REQ_JOIN_EXIST_SESS: lambda req, rsp: self.__session_joined(rsp),
+            REQ_JOIN_NEW_SESS: lambda req, rsp: self.__session_joined(rsp),
+            REQ_PUT_NR: lambda req, rsp: self.__put_number_done(req.payload, rsp),
+        }
+
+    def __init_metrics(self, metrics):
+        # Instruments of the clientMetrics.MetricsRegistry (own one unless
+        # shared), the per message code ones get created on first use
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        m = self.metrics
+        self.__frame_metrics = {}  # (direction, code) -> (frames, bytes)
+        self.__latency_metrics = {}  # request code -> histogram
+        self.__error_metrics = {}  # kind -> counter
+        self.__send_lock_wait = m.histogram(
+            "send_lock_wait_seconds", "Time waited for the send lock",
+            buckets=LOCK_WAIT_BUCKETS,
+        )
+        self.__io.lock_wait = m.histogram(
+            "console_wait_seconds", "Time outputs waited for the console",
+            buckets=LOCK_WAIT_BUCKETS,
+        )
+        # Counters may be shared with other clients, the first connection
+        # is told apart by the client itself
+        self.__connected_before = False
+        self.__connects = m.counter("connects_total", "Connections made to the server")
+        self.__reconnects = m.counter(
+            "reconnects_total", "Connections made after the first one"
+        )
+        self.__disconnects = m.counter("disconnects_total", "Connections lost")
+        self.__deltas = m.counter("table_deltas_total", "Table deltas applied")
+        self.__resyncs = m.counter(
+            "table_resyncs_total", "Tables asked for after a missed delta"
+        )
+        m.gauge("pending_requests", "Requests waiting for their reply",
+                callback=lambda: len(self.__pending))
+        m.gauge("events_queued", "State machine events not run yet",
+                callback=lambda: self.__events.qsize())
+        m.gauge("notifications_queued", "Notifications not shown yet",
+                callback=lambda: len(self.__rcv_async_msgs))
+        m.gauge("notifications_dropped", "Notifications dropped on overflow",
+                callback=lambda: self.__rcv_async_msgs.dropped)
+        m.gauge("notifications_coalesced", "Notifications coalesced on overflow",
+                callback=lambda: self.__rcv_async_msgs.coalesced)
+
+    def __count_frame(self, direction, code, nbytes):
+        c = self.__frame_metrics.get((direction, code))
+        if c is None:
+            c = (
+                self.metrics.counter("frames_total", "Frames by message code",
+                                     direction=direction, code=code),
+                self.metrics.counter("bytes_total", "Frame bytes by message code",
+                                     direction=direction, code=code),
+            )
+            self.__frame_metrics[(direction, code)] = c
+        c[0].inc()
+        c[1].inc(nbytes)
+
+    def __count_error(self, kind):
+        c = self.__error_metrics.get(kind)
+        if c is None:
+            c = self.metrics.counter("errors_total", "Errors by kind", kind=kind)
+            self.__error_metrics[kind] = c
+        c.inc()
+
+    def __request_done(self, code, t0, rsp):
+        # Reply latency of the request, unanswered ones count as errors
+        if rsp.result() is None:
+            self.__count_error("no reply")
+            return
+        h = self.__latency_metrics.get(code)
+        if h is None:
+            h = self.metrics.histogram(
+                "request_latency_seconds", "Request to reply latency", code=code
+            )
+            self.__latency_metrics[code] = h
+        h.observe(perf_counter() - t0)
+
+    def __build_state_machine(self):
+        # Transition table of the game client, handlers returning no next
+        # state move the machine themselves depending on the server replies
+        S, E = self.__gm_states, self.__gm_events
+        transitions = {
+            (S.NEED_NAME, E.USER_INPUT): Transition(self.set_user_name, None),
+            (S.SERVER_REFUSED_NAME, E.USER_INPUT): Transition(self.set_user_name, None),
+            (S.NOTCONNECTED, E.USER_INPUT): Transition(self.get_connected, None),
+            (S.NEED_SESSION, E.USER_INPUT): Transition(self.get_session, None),
+            (S.NEED_SESSION, E.TABLE_RECEIVED): Transition(
+                self.__game_started, S.NEED_PUTNUMBER
+            ),
+            (S.WAIT_FOR_PLAYERS, E.TABLE_RECEIVED): Transition(
+                self.__game_started, S.NEED_PUTNUMBER
+            ),
+            (S.NEED_PUTNUMBER, E.USER_INPUT): Transition(self.putNumber, None),
+            (S.NEED_PUTNUMBER, E.GAME_OVER): Transition(None, S.NEED_SESSION),
+            (ANY_STATE, E.DISCONNECTED): Transition(self.__disconnected, None),
+            (ANY_STATE, E.RESUMED): Transition(self.__resumed, None),
+        }
+        # Entering a state prompts the player for what it needs
+        on_enter = {}
+        for state, prompt in self.__gm_ui_input_prompts.items():
+            on_enter[state] = lambda old_state, prompt=prompt: self.__io.output_sync(prompt)
+        on_exit = {S.NEED_PUTNUMBER: self.__game_left}
+        return StateMachine(S.NEED_NAME, transitions, on_enter, on_exit)
 
     def __state_change(self, newstate):
         # Set the new state of the game and notifies the player
-        with self.__gm_state_lock:
-            self.__gm_state = newstate
-            logging.debug("Game State Has Changed To {}".format(newstate))
-            self.__io.output_sync(self.__gm_ui_input_prompts[newstate])
+        self.__fsm.goto(newstate)
 
-    def __sync_request(self, header, payload):
-        # Send request and wait for response
+    def __post_event(self, event, data=None):
+        # Queue an event for the game loop thread
+        self.__events.put((event, data, self.__fsm.state))
+
+    def __run_event(self, event, data, state):
+        # Run a queued event through the state machine. Input typed for a
+        # state left meanwhile is dropped. Returns False once the client is
+        # stopped or the player quits
+        if event is None:
+            return False
+        if event == self.__gm_events.USER_INPUT and state != self.__fsm.state:
+            logging.debug("Dropped Input %s Given In State %s", data, state)
+            return True
+        return self.__fsm.fire(event, data) is not False
+
+    def __dispatch_events(self, block=True):
+        # Run the queued events, blocks till there is one unless told not to
+        while True:
+            if not block and self.__events.empty():
+                return True
+            if not self.__run_event(*self.__events.get()):
+                return False
+            if self.__events.empty():
+                return True
+
+    def state_trace(self):
+        # Transitions taken so far, oldest first
+        return list(self.__fsm.trace)
+
+    def __request(self, req, resume=False, done=None):
+        # Send request without waiting for the response, return the Future
+        # of the response Message. The result is None if the request could
+        # not be answered. done(Future) is run by the thread answering it
+        # (usually the network thread) before it goes on to the next message
+        t0 = perf_counter()
+        rsp = Future()
+        rsp.request = req
+        rsp.sent_at = t0
+        rsp.add_done_callback(lambda f: self.__request_done(req[:1], t0, f))
+        if done is not None:
+            rsp.add_done_callback(done)
         with self.__send_lock:
-            req = header + HEADER_SEP + payload
-            if self.__session_send(req):
-                with self.__rcv_sync_msgs_lock:
-                    while len(self.__rcv_sync_msgs) <= 0:
-                        self.__rcv_sync_msgs_lock.wait()
-                    rsp = self.__rcv_sync_msgs.pop()
-                if rsp != "DIE!":
-                    return rsp
-            return None
+            self.__send_lock_wait.observe(perf_counter() - t0)
+            if self.__reconnecting and not resume:
+                self.__held.append(rsp)
+                return rsp
+            self.__pending.append(rsp)
+            if not self.__session_send(req):
+                try:
+                    self.__pending.remove(rsp)
+                except ValueError:
+                    pass
+                if not resume and self.__host is None and self.__can_reconnect():
+                    # Network thread is about to notice the drop too
+                    self.__held.append(rsp)
+                elif rsp.set_running_or_notify_cancel():
+                    rsp.set_result(None)
+        return rsp
+
+    def __sync_request(self, req):
+        # Send request and wait for response
+        return self.__request(req).result()
 
     def __sync_response(self, rsp):
-        # Collect the received response, notify waiting threads
-        with self.__rcv_sync_msgs_lock:
-            was_empty = len(self.__rcv_sync_msgs) <= 0
-            self.__rcv_sync_msgs.append(rsp)
-            if was_empty:
-                self.__rcv_sync_msgs_lock.notifyAll()
-
-    def __async_notification(self, msg):
+        # Answer the oldest pending request. The game start table comes
+        # unasked, it is posted to the state machine
+        while len(self.__pending) > 0:
+            try:
+                req = self.__pending.popleft()
+            except IndexError:
+                break
+            if req.set_running_or_notify_cancel():
+                req.set_result(rsp)
+                return
+        if rsp is not None and rsp.header == REP_TABLE:
+            self.__post_event(self.__gm_events.TABLE_RECEIVED, rsp)
+        else:
+            logging.debug("Unexpected Response Dropped: %s", rsp)
+
+    def __unanswered(self, rsp):
+        # Stop waiting for the reply of the request, unless the network
+        # thread is answering it meanwhile
+        with self.__send_lock:
+            try:
+                self.__pending.remove(rsp)
+            except ValueError:
+                return
+        if rsp.set_running_or_notify_cancel():
+            rsp.set_result(None)
+
+    def __fail_pending(self):
+        # Connection is gone, nothing is answering the sent requests
+        while len(self.__pending) > 0:
+            try:
+                req = self.__pending.popleft()
+            except IndexError:
+                break
+            if req.set_running_or_notify_cancel():
+                req.set_result(None)
+
+    def __fail_held(self):
+        with self.__send_lock:
+            held, self.__held = self.__held, deque()
+        for req in held:
+            if req.set_running_or_notify_cancel():
+                req.set_result(None)
+
+    def __connect(self, server_addr):
+        # Open the connection, raises socket.error
+        self.__s = open_connection(server_addr[0], server_addr[1], self.__transport)
+        self.__reset_framing()
+        self.table_deltas = False
+        if self.__recorder is not None:
+            self.__recorder.record(WIRE_CONNECT, b"")
+        logging.info("Connected to Game server at %s:%d", *server_addr)
+        if self.__connected_before:
+            self.__reconnects.inc()
+        self.__connected_before = True
+        self.__connects.inc()
+
+    def __can_reconnect(self):
+        return (
+            self.__reconnect_policy is not None
+            and self.__registered
+            and not self.__stopping.is_set()
+        )
+
+    def __connection_lost(self):
+        # The connection dropped, make it again if possible. Returns True
+        # once reconnected, otherwise the player has to start over
+        self.__disconnects.inc()
+        if self.__can_reconnect() and self.__reconnect():
+            return True
+        self.__registered = False
+        self.__fail_pending()
+        self.__fail_held()
+        self.__post_event(self.__gm_events.DISCONNECTED)
+        return False
+
+    def __reconnect(self):
+        # Connect again backing off between the attempts, then register the
+        # nickname, rejoin the session and resend the moves not answered.
+        # Requests made meanwhile are held till then
+        with self.__send_lock:
+            self.__reconnecting = True
+            unanswered, self.__pending = self.__pending, deque()
+            for req in unanswered:
+                if req.request[:1] == REQ_PUT_NR:
+                    self.__held.append(req)
+        for req in unanswered:
+            if req.request[:1] != REQ_PUT_NR and req.set_running_or_notify_cancel():
+                req.set_result(None)
+        self.__async_notification("Connection Lost, Reconnecting ...")
+        for delay in backoff_delays(self.__reconnect_policy):
+            if self.__stopping.wait(delay):
+                break
+            try:
+                self.__connect(self.__server_addr)
+            except soc_err as e:
+                logging.warning("Reconnecting failed: %s", e)
+                self.__count_error("connect")
+                continue
+            if self.__resume():
+                self.__async_notification("Reconnected")
+                return True
+            self.__s.close()
+        logging.warning("Reconnecting given up")
+        with self.__send_lock:
+            self.__reconnecting = False
+        self.__fail_held()
+        return False
+
+    def __resume_request(self, req, timeout=None):
+        # Send a request and read the connection till it is answered (or
+        # the timeout passes), the receiving loop is not running while
+        # resuming
+        rsp = self.__request(req, resume=True)
+        deadline = None if timeout is None else perf_counter() + timeout
+        while not rsp.done():
+            if deadline is not None and perf_counter() > deadline:
+                self.__unanswered(rsp)
+                break
+            alive, frames = self.__session_rcv_once()
+            if len(frames) > 0:
+                self.__protocol_rcv(frames)
+            if not alive:
+                self.__fail_pending()
+        return rsp.result()
+
+    def __resume(self):
+        # Get back to where the dropped connection was, False to try again
+        # (the server may not have noticed the drop and hold the name)
+        caps = self.__wanted_capabilities()
+        if len(caps) > 0:
+            self.__resume_request(encode_capabilities(caps), self.__capabilities_timeout())
+        rsp = self.__resume_request(encode_nickname(self.__my_name))
+        if rsp is None or rsp.header != REP_CURRENT_SESSIONS:
+            logging.info("Nickname not accepted on reconnect: %s", rsp)
+            return False
+        self.__sessions_listed(rsp)
+        joined = None
+        if self.__session_name is not None:
+            joined = self.__resume_request(encode_join_session(self.__session_name))
+            if joined is None:
+                return False
+            if joined.header not in (REP_TABLE, REP_WAITING_PLAYERS):
+                self.__session_name = None
+        lost = []
+        with self.__send_lock:
+            held, self.__held = self.__held, deque()
+            self.__reconnecting = False
+            sending = True
+            for req in held:
+                if self.__session_name is None and req.request[:1] == REQ_PUT_NR:
+                    lost.append(req)
+                    continue
+                req.sent_at = perf_counter()
+                self.__pending.append(req)
+                if sending and not self.__session_send(req.request):
+                    # Dropped again, the rest stay pending unsent. The
+                    # receiving loop reconnects and holds them once more
+                    sending = False
+        for req in lost:
+            if req.set_running_or_notify_cancel():
+                req.set_result(None)
+        self.__post_event(self.__gm_events.RESUMED, joined)
+        return True
+
+    def __async_notification(self, msg, key=None):
         # Collect the received server notifications, notify waiting threads
-        with self.__rcv_async_msgs_lock:
-            was_empty = len(self.__rcv_async_msgs) <= 0
-            self.__rcv_async_msgs.append(msg)
-            if was_empty:
-                self.__rcv_async_msgs_lock.notifyAll()
+        self.__rcv_async_msgs.put(msg, key)
 
     def __session_rcv(self):
-        # Receive the block of data till next block separator
-        m, b = "", ""
+        # Receive the next chunk(s) of data, return all the frames completed
+        # by it. Empty list means the connection is gone
+        while True:
+            alive, frames = self.__session_rcv_once()
+            if not alive or len(frames) > 0:
+                return frames
+
+    def __replies_overdue(self):
+        # Has the oldest request waited for its reply too long
+        timeout = self.__transport.response_timeout
+        if timeout is None:
+            return False
+        try:
+            oldest = self.__pending[0]
+        except IndexError:
+            return False
+        return perf_counter() - oldest.sent_at > timeout
+
+    def __session_rcv_once(self):
+        # Single read from the socket, returns (connection alive, frames
+        # completed by the read). The read times out regularly to check the
+        # server is still answering
         try:
-            b = str(self.__s.recv(1), 'utf-8')
-            m += b
-            while len(b) > 0 and not (b.endswith(MSG_TERMCHR)):
-                b = str(self.__s.recv(1), 'utf-8')
-                m += b
+            b = self.__s.recv(RECV_CHUNK_SIZE)
+            if self.__recorder is not None and len(b) > 0:
+                self.__recorder.record(WIRE_IN, b)
             if len(b) <= 0:
                 logging.debug("Socket Receive Interrupted")
                 self.__s.close()
-                m = ""
-            m = m[:-1]
+                return False, []
+            return True, self.__receive(b)
         except KeyboardInterrupt:
             self.__s.close()
             logging.info("Ctrl+C Issued, Terminating ...")
-            m = ""
+        except soc_timeout:
+            if not self.__replies_overdue():
+                return True, []
+            logging.warning("Server Is Not Answering, Terminating ...")
+            self.__count_error("timeout")
+            self.__s.close()
         except soc_err as e:
             if e.errno == 107:
                 logging.warning("Server Closed Connection, Terminating ...")
             else:
-                logging.error("Connection Error: {}".format(str(e)))
+                logging.error("Connection Error: %s", e)
+                self.__count_error("receive")
             self.__s.close()
             logging.info("Disconnected:(")
-            m = ""
-        return m
+        return False, []
 
     def __session_send(self, msg):
         # Sends the data with message end char
-        m = msg + MSG_TERMCHR
         r = False
         try:
-            self.__s.sendall(m.encode('utf-8'))
+            data = self.__frame_encoder(msg)
+            # Recorded first, the reply may be received before sendall returns
+            if self.__recorder is not None:
+                self.__recorder.record(WIRE_OUT, data)
+            self.__s.sendall(data)
+            self.__count_frame("out", msg[:1], len(data))
             r = True
         except KeyboardInterrupt:
             self.__s.close()
@@ -134,47 +603,217 @@ class Client:
             if e.errno == 107:
                 logging.warning("Server Closed Connection, Terminating...")
             else:
-                logging.error("Connection Error: {}".format(str(e)))
+                logging.error("Connection Error: %s", e)
+                self.__count_error("send")
             self.__s.close()
             logging.info("Disconnected:(")
         return r
 
-    def __protocol_rcv(self, message):
-        # Process Received Messages.
-        # Server notifications, request/responses and game end
-        # messages are processed separately
-        logging.debug("Received [{} bytes] in total".format(len(message)))
-        if len(message) < 2:
-            logging.debug("Not Enough Data Received From {}".format(message))
+    def __reset_framing(self):
+        # New connections start with the text frames
+        self.__decoder.reset()
+        self.__receive = self.__receive_text
+        self.__frame_encoder = encode_frame
+        self.binary_framing = False
+
+    def __receive_text(self, data):
+        # (Message, frame size) of the text frames completed by the data.
+        # Frames are counted in chars, plus the end char
+        return [(decode_reply(frame), len(frame) + 1) for frame in self.__decoder.feed(data)]
+
+    def __on_capabilities(self, msg):
+        # Server agreed on binary frames, it sends only those after this one
+        granted = msg.data or []
+        if self.__binary_wanted and CAP_BINARY in granted:
+            with self.__send_lock:
+                self.__receive = BinaryFrameDecoder().feed
+                self.__frame_encoder = encode_binary_frame
+                self.binary_framing = True
+            logging.info("Using Binary Frames")
+        self.table_deltas = self.__deltas_wanted and CAP_DELTA in granted
+        if len(self.__pending) > 0 and self.__pending[0].request[:1] == REQ_CAPABILITIES:
+            self.__sync_response(msg)
+        else:
+            # Came after the client stopped waiting for it
+            logging.debug("Late Capabilities Reply Dropped: %s", msg)
+
+    def __wanted_capabilities(self):
+        caps = []
+        if self.__binary_wanted:
+            caps.append(CAP_BINARY)
+        if self.__deltas_wanted:
+            caps.append(CAP_DELTA)
+        return caps
+
+    def __capabilities_timeout(self):
+        timeout = self.__transport.response_timeout
+        if timeout is None:
+            return CAPABILITIES_TIMEOUT
+        return min(CAPABILITIES_TIMEOUT, timeout / 2)
+
+    def __negotiate(self):
+        # Ask for the capabilities wanted. Servers not knowing them refuse
+        # or don't answer at all, none is used then and the connection
+        # is kept
+        caps = self.__wanted_capabilities()
+        if len(caps) > 0:
+            rsp = self.__request(encode_capabilities(caps))
+            try:
+                rsp.result(self.__capabilities_timeout())
+            except FutureTimeout:
+                logging.info("Capabilities Not Answered, Using None")
+                self.__unanswered(rsp)
+
+    def __protocol_rcv(self, received):
+        # Process a batch of received (Message, frame size). Server
+        # notifications, request/responses and game end messages are
+        # dispatched on the header to their handlers
+        handlers = self.__rcv_handlers
+        for msg, size in received:
+            if msg is None:
+                logging.debug("Frame Without Header Received")
+                self.__count_error("bad frame")
+                continue
+            self.__count_frame("in", msg.header, size)
+            handler = handlers.get(msg.header)
+            if handler is None:
+                logging.debug("Unknown Control Message Received: %s", msg)
+                self.__count_error("unknown message")
+            else:
+                handler(msg)
+
+    def __on_table(self, msg):
+        # Tables replace the board before the request is answered, the
+        # deltas following them on the wire apply to this one
+        resynced = self.__resyncing
+        with self.__board_lock:
+            if self.__game_started_at is None:
+                self.__game_started_at = perf_counter()
+                self.__game_moves = 0
+        self.__set_board(msg)
+        if resynced:
+            self.__async_notification("Table Resynced\n\n{}".format(msg.payload))
+        self.__sync_response(msg)
+
+    def __on_table_delta(self, msg):
+        # Apply the changed cells in place and show just those. A version
+        # gap means deltas were missed, the whole table is asked for then
+        delta = msg.data
+        if delta is None:
+            logging.debug("Malformed Table Delta: %s", msg.payload)
+            self.__count_error("bad delta")
             return
-        logging.debug("Response Control Code [{}]".format(message[0]))
-        if message.startswith(REP_NOTIFY + HEADER_SEP):
-            payload = message[2:]
-            logging.debug("Server Notification Received: {}".format(payload))
-            self.__async_notification(payload)
-        elif message[:2] in map(
-            lambda x: x + HEADER_SEP,
-            [
-                REP_CURRENT_SESSIONS,
-                REP_PUT_NR,
-                REP_WAITING_PLAYERS,
-                REP_TABLE,
-                REP_NOT_OK,
-            ],
-        ):
-            self.__sync_response(message)
-        elif message[:2] == REP_SCORES_GAME_OVER + HEADER_SEP:
-            self.__async_notification("The Game Has Ended. {}\n".format(message[2:]))
-            self.__state_change(self.__gm_states.NEED_SESSION)
+        with self.__board_lock:
+            if self.__board is None or self.__resyncing:
+                return
+            version = self.__board_version
+            if version is not None and delta.version != version + 1:
+                if delta.version <= version:
+                    return  # Seen already
+                logging.info("Table Delta %d Missed, Resyncing", version + 1)
+                self.__resyncing = True
+                changed = None
+            else:
+                changed = self.__apply_changes(delta)
+        if changed is None:
+            self.__resync()
+            return
+        self.__deltas.inc()
+        if len(changed) > 0:
+            self.__async_notification(
+                "Table Updated: " + ", ".join(
+                    "{} at ({}, {})".format(nr, cell % 9 + 1, cell // 9 + 1)
+                    for cell, nr in changed
+                ),
+                BOARD_UPDATE,
+            )
+
+    def __apply_changes(self, delta):
+        # Called holding the board lock, returns the cells actually changed
+        changed = []
+        for cell, nr in delta.changes:
+            if self.__board.cells[cell] == nr:
+                continue
+            self.__board.set_cell(cell, nr)
+            changed.append((cell, nr))
+        if len(changed) > 0:
+            self.__hints.sync(self.__board)
+        self.__board_version = delta.version
+        return changed
+
+    def __resync(self):
+        # Ask for the current table, deltas are ignored till it comes
+        self.__resyncs.inc()
+        if self.__s is None:
+            return  # Replaying a capture, the captured request follows
+        self.__request(encode(REQ_TABLE_RESYNC, "")).add_done_callback(
+            self.__resync_done
+        )
+
+    def __resync_done(self, rsp):
+        # Refused or not answered, the next gap asks again
+        with self.__board_lock:
+            self.__resyncing = False
+
+    def __on_notify(self, msg):
+        key = BOARD_UPDATE if is_move_notification(msg.payload) else None
+        self.__async_notification(msg.payload, key)
+
+    def __on_game_over(self, msg):
+        self.__async_notification("The Game Has Ended. {}\n".format(msg.payload))
+        self.__store_game(msg)
+        self.__session_name = None
+        self.__post_event(self.__gm_events.GAME_OVER, msg)
+
+    def __store_game(self, msg):
+        # Append the final scores to the history, with the session name
+        # still known
+        with self.__board_lock:
+            started, moves = self.__game_started_at, self.__game_moves
+            self.__game_started_at = None
+        if self.__history is None or msg.data is None:
+            return
+        duration = perf_counter() - started if started is not None else 0.0
+        try:
+            self.__history.append_game(self.__session_name, msg.data, duration, moves)
+        except (OSError, ValueError, struct_err) as e:
+            logging.error("Can't store the game in the history: %s", e)
+
+    def __game_left(self, new_state):
+        # The board of a finished game is of no use any more
+        with self.__board_lock:
+            self.__board = None
+            self.__hints = None
+            self.__game_started_at = None
+
+    def __disconnected(self, data):
+        # Connection to the server is lost, the player may connect again
+        if self.__fsm.state != self.__gm_states.NEED_NAME:
+            self.__io.output_sync("Disconnected From The Server")
+            self.__state_change(self.__gm_states.NOTCONNECTED)
+
+    def __resumed(self, rsp):
+        # Reconnected, rsp is the reply of rejoining the session (None if
+        # there was no session)
+        S = self.__gm_states
+        if rsp is None:
+            return
+        if rsp.header == REP_TABLE:
+            self.__io.output_sync(">>> Game Resumed! \n\n{}".format(rsp.payload))
+            if self.__fsm.state != S.NEED_PUTNUMBER:
+                self.__state_change(S.NEED_PUTNUMBER)
+        elif rsp.header == REP_WAITING_PLAYERS:
+            if self.__fsm.state != S.WAIT_FOR_PLAYERS:
+                self.__state_change(S.WAIT_FOR_PLAYERS)
         else:
-            logging.debug("Unknown Control Message Received: {}".format(message))
-            return REP_NOT_OK
+            self.__io.output_sync("Can't Rejoin The Session: {}".format(rsp.payload))
+            self.__state_change(S.NEED_SESSION)
 
     def __get_user_input(self):
         # Gather User Input
         try:
             msg = self.__io.input_sync()
-            logging.debug("User Entered: {}".format(msg))
+            logging.debug("User Entered: %s", msg)
             return msg
         except InputClosedException:
             return None
@@ -191,60 +830,147 @@ class Client:
             self.__io.output_sync("Not A Suitable Name, Try Again!!")
         else:
             self.__my_name = user_input
-            if self.__gm_state == self.__gm_states.NEED_NAME:
+            if self.__fsm.state == self.__gm_states.NEED_NAME:
                 self.__state_change(self.__gm_states.NOTCONNECTED)
-            elif self.__gm_state == self.__gm_states.SERVER_REFUSED_NAME:
+            elif self.__fsm.state == self.__gm_states.SERVER_REFUSED_NAME:
                 self.send_server_my_name_get_ack()
 
     def send_server_my_name_get_ack(self):
         # Ask server for name verification
+        self.__name_ack(self.__sync_request(encode_nickname(self.__my_name)))
+
+    def __name_ack(self, rsp):
         try:
-            rsp = self.__sync_request(REQ_NICKNAME, self.__my_name)
-            header, msg = rsp.split(HEADER_SEP)
-            if header == REP_NOT_OK:
+            if rsp.header == REP_NOT_OK:
                 self.__state_change(self.__gm_states.SERVER_REFUSED_NAME)
-            elif header == REP_CURRENT_SESSIONS:
+            elif rsp.header == REP_CURRENT_SESSIONS:
+                self.__registered = True
+                self.__sessions_listed(rsp)
                 self.__state_change(self.__gm_states.NEED_SESSION)
         except Exception as e:
             self.__io.output_sync(
                 "Name verification by client failed {}".format(str(e))
             )
 
-    def get_connected(self, ip):
-        # Connects to the server, creates networking thread,
+    def __sessions_listed(self, rsp):
+        if rsp.data is not None:
+            added, removed, changed = self.sessions.update(rsp.data)
+            logging.debug("Sessions listed: %d new, %d gone, %d changed",
+                          added, removed, changed)
+
+    def refresh_sessions(self):
+        # Ask the server for the open sessions again. The list comes with
+        # the nickname accepted, so the name is registered again
+        rsp = self.__sync_request(encode_nickname(self.__my_name))
+        if rsp is None or rsp.header != REP_CURRENT_SESSIONS:
+            return False
+        self.__sessions_listed(rsp)
+        return True
+
+    def show_sessions(self):
+        found = self.sessions.open_sessions()
+        if len(found) <= 0:
+            self.__io.output_sync("No Open Sessions")
+            return
+        self.__io.output_sync(
+            "Open Sessions:\n" + "\n".join(
+                "{} {}/{}".format(s.name, s.players, s.max_players) for s in found
+            )
+        )
+
+    def __can_join(self, sess_name):
+        # Refuse only the sessions known to be full, saving the round trip
+        # of a join bound to be refused. Sessions not listed (started ones
+        # aren't, rejoining them is fine) are left to the server
+        info = self.sessions.get(sess_name)
+        if info is not None and free_seats(info) <= 0:
+            self.__io.output_sync("Session {} Is Full".format(sess_name))
+            return False
+        return True
+
+    def __join(self, sess_name, max_players=None):
+        # Join (create if max_players given) the session, keeping the
+        # directory up to date with the reply. Returns the reply
+        rsp = self.__sync_request(encode_join_session(sess_name, max_players))
+        if rsp is None:
+            return None
+        if rsp.header == REP_WAITING_PLAYERS and rsp.data is not None:
+            if max_players is None:
+                info = self.sessions.get(sess_name)
+                # Not listed, its size is unknown till the next list
+                max_players = info.max_players if info is not None else None
+            if max_players is not None:
+                self.sessions.put(SessionInfo(sess_name, len(rsp.data), int(max_players)))
+        elif rsp.header == REP_TABLE or max_players is None:
+            self.sessions.discard(sess_name)  # Started, or not open any more
+        if rsp.header in (REP_WAITING_PLAYERS, REP_TABLE):
+            self.__session_name = sess_name
+        return rsp
+
+    def auto_join(self):
+        # Join the open session closest to starting. Sessions started or
+        # gone meanwhile are skipped, then the list is asked for once more
+        tried = set()
+        for refresh in (False, True):
+            if refresh and not self.refresh_sessions():
+                break
+            info = self.sessions.best_open(tried)
+            while info is not None:
+                tried.add(info.name)
+                rsp = self.__join(info.name)
+                if rsp is None or rsp.header != REP_NOT_OK:
+                    self.__session_joined(rsp)
+                    return True
+                info = self.sessions.best_open(tried)
+        self.__io.output_sync("No Open Session To Join, [c]reate One")
+        return True
+
+    def get_connected(self, address):
+        # Connects to the server (host[:port]), creates networking thread,
         # calls name verification
-        self.__s = socket(AF_INET, SOCK_STREAM)
-        server_addr = (ip, 7777)
         try:
-            self.__s.connect(server_addr)
-            logging.info(
-                "Connected to Game server at {}:{}".format(
-                    server_addr[0], server_addr[1]
+            server_addr = parse_address(address)
+        except ValueError as e:
+            self.__io.output_sync("Not a server address: {}".format(e))
+            return
+        try:
+            self.__connect(server_addr)
+            self.__server_addr = server_addr
+            if self.__host is not None:
+                self.__host.register(self.__s, self)
+            else:
+                self.network_thread = Thread(
+                    name="NetworkThread", target=self.network_loop
                 )
-            )
-            self.network_thread = Thread(name="NetworkThread", target=self.network_loop)
-            self.network_thread.start()
+                self.network_thread.start()
+            self.__negotiate()
             self.send_server_my_name_get_ack()
         except soc_err as e:
             logging.error(
-                "Can not connect to game server at %s:%d"
-                " %s " % (server_addr + (str(e),))
+                "Can not connect to game server at %s:%d %s", server_addr[0],
+                server_addr[1], e
             )
+            self.__count_error("connect")
             self.__io.output_sync("Can't connect to server!")
 
     def get_session(self, create_sess):
         # Asks the player if to create a new session or join an existing one
         # guides the player through the process while checking if the input is
         # valid. Then creates/connects to the session.
-        while create_sess not in ["c", "j"]:
+        while create_sess not in ["c", "j", "a"]:
+            if create_sess == "l":
+                self.refresh_sessions()
+                self.show_sessions()
             try:
                 create_sess = self.__get_user_input()
             except KeyboardInterrupt:
                 return False
             if create_sess == "Q":
                 return False
-            if create_sess not in ["c", "j"]:
-                self.__io.output_sync("Error, Enter Either 'c' or 'j'.")
+            if create_sess not in ["c", "j", "a", "l"]:
+                self.__io.output_sync("Error, Enter Either 'c', 'j', 'a' or 'l'.")
+        if create_sess == "a":
+            return self.auto_join()
         p_count = "0"
         if create_sess == "c":
             while int(p_count) < 2:
@@ -283,130 +1009,332 @@ class Client:
                         break
 
         if create_sess == "j":
-            rsp = self.__sync_request(REQ_JOIN_EXIST_SESS, sess_name)
+            if not self.__can_join(sess_name):
+                return True
+            rsp = self.__join(sess_name)
         else:
-            rsp = self.__sync_request(
-                REQ_JOIN_NEW_SESS, sess_name + FIELD_SEP + p_count
-            )
+            rsp = self.__join(sess_name, p_count)
+        self.__session_joined(rsp)
+        return True
+
+    def __session_joined(self, rsp):
         try:
-            header, msg = rsp.split(HEADER_SEP)
-            if header == REP_NOT_OK:
-                self.__io.output_sync("Error Joining Session: {}".format(msg))
-            elif header == REP_WAITING_PLAYERS:
+            if rsp.header == REP_NOT_OK:
+                self.__io.output_sync("Error Joining Session: {}".format(rsp.payload))
+            elif rsp.header == REP_WAITING_PLAYERS:
                 self.__state_change(self.__gm_states.WAIT_FOR_PLAYERS)
-            elif header == REP_TABLE:
-                self.__io.output_sync(">>> Game Started! \n\n{}".format(rsp[2:]))
-                self.__state_change(self.__gm_states.NEED_PUTNUMBER)
+            elif rsp.header == REP_TABLE:
+                self.__fsm.fire(self.__gm_events.TABLE_RECEIVED, rsp)
         except Exception as e:
             self.__io.output_sync(
                 "Analysing sess join/create msg fail {}".format(str(e))
             )
-        return True
 
-    def waiting_for_players(self):
-        # loop till the server notifies all the clients have connected
-        # to the game session
-        with self.__rcv_sync_msgs_lock:
-            while len(self.__rcv_sync_msgs) <= 0:
-                try:
-                    self.__rcv_sync_msgs_lock.wait(0.1)
-                except KeyboardInterrupt:
-                    return False
-                except RuntimeError:
-                    continue
-            rsp = self.__rcv_sync_msgs.pop()
-        if rsp.startswith(REP_TABLE + HEADER_SEP):
-            self.__io.output_sync(">>> Game Started! \n\n{}".format(rsp[2:]))
-            self.__state_change(self.__gm_states.NEED_PUTNUMBER)
-        return True
+    def __game_started(self, rsp):
+        # The board is kept already (__on_table), let the player make moves
+        self.__io.output_sync(">>> Game Started! \n\n{}".format(rsp.payload))
 
-    def putNumber(self, s):
-        # interacts with server's Sudoku board. Checks if client has
-        # input correctly three numbers in range 1...9
+    def __set_board(self, rsp):
+        # Hints of the game are caught up with the new table (resyncs,
+        # rejoins), built from scratch for a new game only
+        board = None
+        if rsp.data is not None:
+            board = Board(rsp.data)
+        else:
+            logging.warning("Can't parse the game table: %s", rsp.payload)
+        with self.__board_lock:
+            if board is None:
+                self.__hints = None
+            elif self.__hints is not None:
+                self.__hints.sync(board)
+            else:
+                self.__hints = HintEngine(board)
+            self.__board = board
+            self.__board_version = None
+            self.__resyncing = False
+
+    def __valid_move(self, s):
+        # Checks if client has input correctly three numbers in range 1...9
         if len(s) != 3:
             self.__io.output_sync("Not proper input - did not give three " "integers")
-            return
+            return False
         try:
             ints = list(s)
             for nr in [int(ints[0]), int(ints[1]), int(ints[2])]:
                 if nr not in range(1, 10):
                     self.__io.output_sync("Not proper input - numbers not " "1...9")
-                    return
+                    return False
         except ValueError:
             self.__io.output_sync("Not proper input - cant find three integers")
-            rsp = self.__sync_request(REQ_PUT_NR, s)
-            if rsp.startswith(REP_PUT_NR + HEADER_SEP):
-                self.__io.output_sync("{}".format(rsp[2:]))
-            else:
-                self.__io.output_sync("Incorrect server response: ({})".format(rsp))
+            return False
+        return True
+
+    def __locally_legal(self, s):
+        # In strict validation mode refuse the moves the local board knows
+        # to be illegal, saving the round trip
+        if not self.__strict_validation:
+            return True
+        with self.__board_lock:
+            if self.__board is None:
+                return True
+            reason = self.__board.check_move(int(s[0]), int(s[1]), int(s[2]))
+        if reason is None:
+            return True
+        self.__io.output_sync("Move not sent - {}".format(reason))
+        return False
+
+    def __send_move(self, s):
+        # The accepted move is put on the board as soon as the reply comes,
+        # so the table delta following it doesn't show it as a change
+        return self.__request(
+            encode(REQ_PUT_NR, s), done=lambda f: self.__put_number_done(s, f.result())
+        )
+
+    def __put_number_done(self, s, rsp):
+        # Track the accepted moves on the local board
+        if rsp is None or rsp.header != REP_PUT_NR:
+            return
+        with self.__board_lock:
+            self.__game_moves += 1
+        if rsp.data != PUT_NR_SUCCESS:
+            return
+        cell, nr = cell_index(int(s[0]), int(s[1])), int(s[2])
+        with self.__board_lock:
+            if self.__board is not None and not self.__board.cells[cell]:
+                self.__board.set_cell(cell, nr)
+                self.__hints.place(cell, nr)
+
+    def show_hint(self):
+        # Tell the player the most promising move
+        with self.__board_lock:
+            hint = self.__hints.next_best_move() if self.__hints is not None else None
+        if hint is None:
+            self.__io.output_sync("No hint available")
+        else:
+            self.__io.output_sync(
+                "Hint: {}{}{} - {}".format(hint.x, hint.y, hint.nr, hint.reason)
+            )
+
+    def putNumber(self, s):
+        # interacts with server's Sudoku board.
+        if s == "H":
+            self.show_hint()
+            return
+        if not self.__valid_move(s) or not self.__locally_legal(s):
+            return
+        rsp = self.__send_move(s).result()
+        if rsp is not None and rsp.header == REP_PUT_NR:
+            self.__io.output_sync("{}".format(rsp.payload))
+        else:
+            self.__io.output_sync("Incorrect server response: ({})".format(rsp))
+
+    def put_number_pipelined(self, s):
+        # Send the move without waiting for the previous replies, returns
+        # the Future of the server response (None if s is not a valid move)
+        if not self.__valid_move(s) or not self.__locally_legal(s):
+            return None
+        return self.__send_move(s)
+
+    def put_numbers(self, moves):
+        # Send a burst of moves in one go, then collect the responses in
+        # the order of the moves
+        reqs = [self.put_number_pipelined(s) for s in moves]
+        return [req.result() if req is not None else None for req in reqs]
 
     def stop(self):
         # Stop the game client (it's socket and notification thread)
+        self.__stopping.set()
         if self.__s is not None:
+            if self.__host is not None:
+                self.__host.unregister(self.__s)
             try:
                 self.__s.shutdown(SHUT_RD)
             except soc_err:
                 logging.warning("The Socket Was not connected anyway ..")
             finally:
                 self.__s.close()
-        self.__sync_response("DIE!")
-        self.__async_notification("DIE!")
+        self.__fail_pending()
+        self.__fail_held()
+        self.__events.put((None, None, None))
+        self.__rcv_async_msgs.close()
 
     def game_loop(self):
         # Main game loop (notifications-loop are running already)
         # Networking thread gets started along the way
         self.__io.output_sync("\nPress Enter ⮐ to initiate input.")
         self.__io.output_sync("What's Your NickName?")
+        # The input thread reads a line whenever a state needs one, the
+        # loop itself only waits for the events. Network events so run at
+        # once, also while the player has not typed anything
+        wanted = Queue()
+        reader = Thread(name="InputThread", target=self.__input_loop,
+                        args=(wanted,), daemon=True)
+        reader.start()
+        reading = False
         while True:
-            if self.__gm_state != self.__gm_states.WAIT_FOR_PLAYERS:
-                user_input = self.__get_user_input()
-            if user_input == "Q":
+            if not reading and self.__fsm.state in self.__gm_input_states:
+                wanted.put(True)
+                reading = True
+            event, data, state = self.__events.get()
+            if event == self.__gm_events.USER_INPUT:
+                reading = False
+            if not self.__run_event(event, data, state):
                 break
-            elif (
-                self.__gm_state == self.__gm_states.NEED_NAME
-                or self.__gm_state == self.__gm_states.SERVER_REFUSED_NAME
-            ):
-                self.set_user_name(user_input)
-            elif self.__gm_state == self.__gm_states.NOTCONNECTED:
-                self.get_connected(user_input)
-            elif self.__gm_state == self.__gm_states.NEED_SESSION:
-                if not self.get_session(user_input):
-                    break
-            elif self.__gm_state == self.__gm_states.WAIT_FOR_PLAYERS:
-                if not self.waiting_for_players():
-                    break
-            elif self.__gm_state == self.__gm_states.NEED_PUTNUMBER:
-                self.putNumber(user_input)
+        wanted.put(False)
         self.__io.output_sync("Queue Entered, Disconnecting...")
 
+    def __input_loop(self, wanted):
+        # Read a line each time the game loop wants one, posted as input of
+        # the state current when it was typed. Quitting stops the game loop
+        while wanted.get():
+            user_input = self.__get_user_input()
+            if user_input is None or user_input == "Q":
+                self.__events.put((None, None, None))
+                return
+            self.__post_event(self.__gm_events.USER_INPUT, user_input)
+
     def notifications_loop(self):
-        # Iterate over received notifications, show them to user, wait if
-        # no notifications
+        # Iterate over received notifications, show them to user in batches,
+        # wait if no notifications
         logging.info("Falling To notifier loop ...")
         while True:
-            with self.__rcv_async_msgs_lock:
-                if len(self.__rcv_async_msgs) <= 0:
-                    self.__rcv_async_msgs_lock.wait()
-                msg = self.__rcv_async_msgs.pop(0)
-                if msg == "DIE!":
-                    return
-            self.__io.output_sync(msg)
+            batch = self.__rcv_async_msgs.get_batch()
+            if batch is None:
+                return
+            self.__io.output_batch_sync(batch)
 
     def network_loop(self):
         # Network Receiver/Message Processor loop. Stops if empty char
         # has been received
         logging.info("Falling To Receiver Loop ...")
         while True:
-            m = self.__session_rcv()
-            if len(m) <= 0:
+            frames = self.__session_rcv()
+            if len(frames) <= 0:
+                if self.__connection_lost():
+                    continue
                 break
-            self.__protocol_rcv(m)
+            self.__protocol_rcv(frames)
+
+    def replay_request(self, req):
+        # Track a request of a wire capture as sent without sending it, its
+        # reply gets handled like the live one (see wireReplay)
+        msg = decode_request(req)
+        rsp = Future()
+        rsp.request = req
+        rsp.sent_at = perf_counter()
+        handler = self.__replay_handlers.get(msg.header) if msg is not None else None
+        if handler is not None:
+            rsp.add_done_callback(lambda f: handler(msg, f.result()))
+        self.__pending.append(rsp)
+        return rsp
+
+    def replay_connected(self):
+        # A new connection starts in the wire capture
+        self.__reset_framing()
+
+    def replay_received(self, data):
+        # Process data of a wire capture as if read from the socket, returns
+        # the number of frames completed by it
+        received = self.__receive(data)
+        self.__protocol_rcv(received)
+        return len(received)
+
+    def dispatch_events(self):
+        # Run the queued state machine events without waiting for more, for
+        # the clients not running game_loop
+        return self.__dispatch_events(block=False)
+
+    def handle_readable(self):
+        # Called by the ClientHost when the socket has data instead of
+        # network_loop. Returns False once the connection is gone
+        alive, frames = self.__session_rcv_once()
+        if len(frames) > 0:
+            self.__protocol_rcv(frames)
+        if not alive:
+            # Reconnecting blocks, the host's other clients must not wait
+            Thread(name="Reconnect", target=self.__reconnect_hosted).start()
+        return alive
+
+    def __reconnect_hosted(self):
+        if self.__connection_lost():
+            self.__host.register(self.__s, self)
+
+    def poll_notifications(self):
+        # Notifications received so far, without waiting (for the hosted
+        # clients not running notifications_loop). None once stopped
+        return self.__rcv_async_msgs.get_batch(block=False)
 
 
 if __name__ == "__main__":
     print("Starting Client Application...")
+    parser = argparse.ArgumentParser(description="Sudoku game client")
+    parser.add_argument("--strict", action="store_true",
+                        help="don't send moves the local board knows to be illegal")
+    parser.add_argument("--notify-queue", type=positive_int, default=256,
+                        help="notifications kept while the console is busy")
+    parser.add_argument("--notify-overflow", default=OVERFLOW_DROP_OLDEST,
+                        choices=OVERFLOW_POLICIES,
+                        help="what to do when the notification queue is full")
+    parser.add_argument("--connect-timeout", type=timeout_seconds,
+                        default=DEFAULT_TRANSPORT.connect_timeout,
+                        help="seconds to connect to the server, 0 waits forever")
+    parser.add_argument("--write-timeout", type=timeout_seconds,
+                        default=DEFAULT_TRANSPORT.write_timeout,
+                        help="seconds a send may block, 0 waits forever")
+    parser.add_argument("--response-timeout", type=timeout_seconds,
+                        default=DEFAULT_TRANSPORT.response_timeout,
+                        help="seconds without a reply before the server is "
+                             "considered dead, 0 waits forever")
+    parser.add_argument("--keepalive-idle", type=int,
+                        default=DEFAULT_TRANSPORT.keepalive_idle,
+                        help="idle seconds before TCP keepalive probes, 0 disables")
+    parser.add_argument("--reconnect-attempts", type=int,
+                        default=DEFAULT_RECONNECT.max_attempts,
+                        help="times to try reconnecting a dropped connection, 0 never")
+    parser.add_argument("--binary", action="store_true",
+                        help="use binary frames if the server supports them")
+    parser.add_argument("--deltas", action="store_true",
+                        help="get the table updates as deltas if the server supports them")
+    parser.add_argument("--capture", default=None,
+                        help="append the wire traffic to this file (see wireReplay)")
+    parser.add_argument("--history", default=None,
+                        help="append the finished games to this file (see gameHistory)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="write the client metrics to this file periodically")
+    parser.add_argument("--metrics-format", default="json", choices=METRICS_FORMATS,
+                        help="JSON snapshot or Prometheus text")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between the metrics writes")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging_from_args(args)
     sync_io = SyncConsoleAppenderInputReader()
-    client = Client(sync_io)
+    recorder = WireRecorder(args.capture) if args.capture else None
+    history = GameHistory(args.history) if args.history else None
+    transport = TransportConfig(
+        connect_timeout=args.connect_timeout,
+        write_timeout=args.write_timeout,
+        response_timeout=args.response_timeout,
+        keepalive_idle=args.keepalive_idle or None,
+    )
+    client = Client(
+        sync_io,
+        strict_validation=args.strict,
+        notification_queue_size=args.notify_queue,
+        notification_overflow=args.notify_overflow,
+        recorder=recorder,
+        transport=transport,
+        reconnect=ReconnectPolicy(args.reconnect_attempts) if args.reconnect_attempts > 0 else None,
+        binary=args.binary,
+        table_deltas=args.deltas,
+        history=history,
+    )
+    exporter = None
+    if args.metrics_file:
+        exporter = MetricsExporter(
+            client.metrics, args.metrics_file, args.metrics_format, args.metrics_interval
+        )
+        exporter.start()
     notifications_thread = Thread(
         name="NotificationsThread", target=client.notifications_loop
     )
@@ -420,4 +1348,10 @@ if __name__ == "__main__":
     if client.network_thread is not None:
         client.network_thread.join()
     notifications_thread.join()
+    if recorder is not None:
+        recorder.close()
+    if history is not None:
+        history.close()
+    if exporter is not None:
+        exporter.stop()
     logging.info("Terminating")
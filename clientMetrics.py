@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# In-process metrics of the client: counters, gauges and histograms keyed
+# by name and labels in a registry, exported as a JSON snapshot or in the
+# Prometheus text format, on demand or periodically to a local file.
+import json
+import os
+import time
+from bisect import bisect_left
+from threading import Event, Lock, Thread
+from utils import getmylogger
+
+METRICS_FORMATS = ("json", "prometheus")
+
+# Upper bounds (seconds) of the histogram buckets
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+LOCK_WAIT_BUCKETS = (0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)
+
+
+logging = getmylogger(__name__)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.value = 0
+
+    def inc(self, n=1):
+        with self.__lock:
+            self.value += n
+
+    def sample(self):
+        return self.value
+
+
+class Gauge:
+    # Either set explicitly, or read from the callbacks on export (queue
+    # lengths and the like). Clients sharing a registry each add their
+    # callback, the gauge is their sum
+    kind = "gauge"
+
+    def __init__(self, callback=None):
+        self.__lock = Lock()
+        self.__callbacks = [] if callback is None else [callback]
+        self.value = 0
+
+    def add_callback(self, callback):
+        with self.__lock:
+            self.__callbacks.append(callback)
+
+    def set(self, value):
+        self.value = value
+
+    def sample(self):
+        with self.__lock:
+            callbacks = list(self.__callbacks)
+        if callbacks:
+            return sum(callback() for callback in callbacks)
+        return self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.__lock = Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.__lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def sample(self):
+        # Cumulative bucket counts, as exported
+        with self.__lock:
+            cumulative, total = [], 0
+            for c in self.counts:
+                total += c
+                cumulative.append(total)
+            return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _prom_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if len(pairs) <= 0:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="sudoku_client_"):
+        self.__lock = Lock()
+        self.__prefix = prefix
+        self.__metrics = {}  # (name, labels key) -> metric
+        self.__help = {}  # name -> (kind, help text)
+
+    def __get(self, name, labels, helptext, factory):
+        key = (self.__prefix + name, _labels_key(labels))
+        metric = self.__metrics.get(key)
+        if metric is None:
+            with self.__lock:
+                metric = self.__metrics.get(key)
+                if metric is None:
+                    metric = factory()
+                    self.__metrics[key] = metric
+                    self.__help.setdefault(key[0], (metric.kind, helptext))
+        return metric
+
+    def counter(self, name, helptext="", **labels):
+        return self.__get(name, labels, helptext, Counter)
+
+    def gauge(self, name, helptext="", callback=None, **labels):
+        g = self.__get(name, labels, helptext, Gauge)
+        if callback is not None:
+            g.add_callback(callback)
+        return g
+
+    def histogram(self, name, helptext="", buckets=LATENCY_BUCKETS, **labels):
+        return self.__get(name, labels, helptext, lambda: Histogram(buckets))
+
+    def __items(self):
+        with self.__lock:
+            return sorted(self.__metrics.items(), key=lambda kv: kv[0])
+
+    def snapshot(self):
+        # Current values as a JSON serializable dict
+        metrics = []
+        for (name, labels), metric in self.__items():
+            entry = {"name": name, "type": metric.kind, "labels": dict(labels)}
+            value = metric.sample()
+            if metric.kind == "histogram":
+                entry.update(value)
+                entry["bounds"] = list(metric.buckets)
+            else:
+                entry["value"] = value
+            metrics.append(entry)
+        return {"time": time.time(), "metrics": metrics}
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self):
+        # Prometheus text exposition format
+        lines = []
+        last_name = None
+        for (name, labels), metric in self.__items():
+            if name != last_name:
+                kind, helptext = self.__help[name]
+                if helptext:
+                    lines.append("# HELP {} {}".format(name, helptext))
+                lines.append("# TYPE {} {}".format(name, kind))
+                last_name = name
+            value = metric.sample()
+            if metric.kind != "histogram":
+                lines.append("{}{} {}".format(name, _prom_labels(labels), value))
+                continue
+            bounds = [str(b) for b in metric.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, value["buckets"]):
+                lines.append("{}_bucket{} {}".format(
+                    name, _prom_labels(labels, [("le", bound)]), count))
+            lines.append("{}_sum{} {}".format(name, _prom_labels(labels), value["sum"]))
+            lines.append("{}_count{} {}".format(name, _prom_labels(labels), value["count"]))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt="json"):
+        # Replace the file atomically, readers never see half a snapshot
+        text = self.to_prometheus() if fmt == "prometheus" else self.to_json() + "\n"
+        tmp = "{}.tmp".format(path)
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+class MetricsExporter:
+    # Writes the registry to a file every interval seconds, and once more
+    # when stopped
+    def __init__(self, registry, path, fmt="json", interval=10.0):
+        if fmt not in METRICS_FORMATS:
+            raise ValueError("Unknown metrics format {}".format(fmt))
+        self.__registry = registry
+        self.__path = path
+        self.__fmt = fmt
+        self.__interval = interval
+        self.__stopped = Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(name="MetricsExporter", target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.__stopped.wait(self.__interval):
+            self.export()
+        self.export()
+
+    def export(self):
+        try:
+            self.__registry.write(self.__path, self.__fmt)
+        except OSError as e:
+            logging.warning("Can't write the metrics to %s: %s", self.__path, e)
+
+    def stop(self):
+        self.__stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
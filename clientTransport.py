@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# TCP transport settings of the clients. Connections are opened through
+# socket.create_connection (IPv4 or IPv6, whatever the address resolves
+# to) with a connect timeout, Nagle disabled so the small move frames go
+# out at once, and TCP keepalive tuned to notice a dead server in seconds.
+# On top of that the clients consider the server dead when a request has
+# gone unanswered for response_timeout seconds.
+import random
+import socket
+from collections import namedtuple
+from utils import getmylogger
+from messageProtocol import DEFAULT_PORT
+
+# connect_timeout: seconds to establish the connection, None = no limit
+# write_timeout: seconds a send may block (full send buffer) before failing,
+# blocked receives also wake up this often to check the replies are coming.
+# None = no limit (and no wake ups)
+# response_timeout: seconds a request may wait for its reply, None = forever
+# nodelay: disable Nagle's algorithm
+# keepalive_idle/interval/count: idle seconds before the first probe,
+# seconds between the probes, unanswered probes before the peer is dead.
+# keepalive_idle None disables TCP keepalive
+TransportConfig = namedtuple(
+    "TransportConfig",
+    [
+        "connect_timeout",
+        "write_timeout",
+        "response_timeout",
+        "nodelay",
+        "keepalive_idle",
+        "keepalive_interval",
+        "keepalive_count",
+    ],
+    defaults=[5.0, 5.0, 10.0, True, 10, 3, 3],
+)
+
+DEFAULT_TRANSPORT = TransportConfig()
+
+# Reconnecting after the connection dropped: the first attempt is made at
+# once, then after initial_delay growing by factor up to max_delay (each
+# jittered down by up to a half so clients dropped together don't come
+# back together). Given up after max_attempts
+ReconnectPolicy = namedtuple(
+    "ReconnectPolicy",
+    ["max_attempts", "initial_delay", "max_delay", "factor"],
+    defaults=[10, 0.05, 5.0, 2.0],
+)
+
+DEFAULT_RECONNECT = ReconnectPolicy()
+
+
+logging = getmylogger(__name__)
+
+
+def timeout_seconds(text):
+    # argparse type of the timeouts, 0 (or less) is no timeout. Never 0
+    # for the sockets, that would make them non-blocking
+    seconds = float(text)
+    return seconds if seconds > 0 else None
+
+
+def parse_address(address, default_port=DEFAULT_PORT):
+    # host, host:port, [v6 address]:port or a bare v6 address -> (host, port)
+    address = address.strip()
+    if address.startswith("["):
+        host, _, rest = address[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif address.count(":") == 1:
+        host, _, port = address.partition(":")
+    else:
+        host, port = address, ""
+    if len(host) <= 0:
+        raise ValueError("No host in address {!r}".format(address))
+    if len(port) <= 0:
+        return host, default_port
+    port = int(port)
+    if port not in range(1, 65536):
+        raise ValueError("Port out of range in address {!r}".format(address))
+    return host, port
+
+
+def _setopt(sock, level, name, value):
+    # Options missing on the platform are skipped
+    opt = getattr(socket, name, None)
+    if opt is None:
+        return
+    try:
+        sock.setsockopt(level, opt, value)
+    except OSError as e:
+        logging.debug("Can't set socket option %s: %s", name, e)
+
+
+def configure_socket(sock, config=DEFAULT_TRANSPORT):
+    # Latency and dead peer detection options of a connected socket
+    if config.nodelay:
+        _setopt(sock, socket.IPPROTO_TCP, "TCP_NODELAY", 1)
+    if config.keepalive_idle is not None:
+        _setopt(sock, socket.SOL_SOCKET, "SO_KEEPALIVE", 1)
+        _setopt(sock, socket.IPPROTO_TCP, "TCP_KEEPIDLE", config.keepalive_idle)
+        _setopt(sock, socket.IPPROTO_TCP, "TCP_KEEPALIVE", config.keepalive_idle)  # macOS
+        _setopt(sock, socket.IPPROTO_TCP, "TCP_KEEPINTVL", config.keepalive_interval)
+        _setopt(sock, socket.IPPROTO_TCP, "TCP_KEEPCNT", config.keepalive_count)
+    if config.write_timeout is not None:
+        # Linux drops the connection when sent data stays unacknowledged
+        _setopt(sock, socket.IPPROTO_TCP, "TCP_USER_TIMEOUT",
+                int(config.write_timeout * 1000))
+
+
+def open_connection(host, port=DEFAULT_PORT, config=DEFAULT_TRANSPORT):
+    # Connected and configured blocking socket. Its timeout bounds the sends
+    # and makes the receives wake up for the liveness check
+    sock = socket.create_connection((host, port), timeout=config.connect_timeout)
+    configure_socket(sock, config)
+    sock.settimeout(config.write_timeout)
+    return sock
+
+
+def backoff_delays(policy=DEFAULT_RECONNECT, rnd=random):
+    # Seconds to wait before each reconnect attempt
+    delay = policy.initial_delay
+    for attempt in range(policy.max_attempts):
+        if attempt == 0:
+            yield 0.0
+            continue
+        yield delay * rnd.uniform(0.5, 1.0)
+        delay = min(delay * policy.factor, policy.max_delay)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Bot fleet for soak testing a game server from one box. The players are
+# sharded (whole sessions each) over worker processes, one per core by
+# default, each playing its share of loadGenerator bots on its own event
+# loop. The bots solve the received table and play its numbers. Every
+# worker streams the results collected so far (LoadStats) to the parent
+# through a queue, the parent merges them and reports the progress.
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import time
+from queue import Empty
+from loadGenerator import Bot, LoadStats, run_load
+from standInServer import StandInServer
+from sudokuSolver import solve
+from utils import add_logging_arguments, configure_logging_from_args, getmylogger
+from messageProtocol import *
+
+
+logging = getmylogger(__name__)
+
+# Seconds between the results streamed by the workers
+DEFAULT_REPORT_INTERVAL = 1.0
+
+
+class SolverBot(Bot):
+    # Plays the solution of the received table. Tables with holes enough
+    # can have several, when the server's differs the other numbers of
+    # the cell are tried next
+    def __init__(self, name, stats, rate=0.0, rnd=random):
+        Bot.__init__(self, name, stats, rate, rnd)
+        self.solution = None
+
+    def choose_cells(self, cells):
+        self.solution = solve(cells)
+        return Bot.choose_cells(self, cells)
+
+    def digits(self, cell):
+        if self.solution is None:
+            return Bot.digits(self, cell)
+        nr = self.solution[cell]
+        return [nr] + [d for d in Bot.digits(self, cell) if d != nr]
+
+
+BOT_STRATEGIES = {"solver": SolverBot, "brute": Bot}
+
+
+def shard(players, per_session, workers):
+    # Players of each worker, in whole sessions spread evenly
+    sessions = players // per_session
+    return [
+        (sessions // workers + (1 if i < sessions % workers else 0)) * per_session
+        for i in range(workers)
+    ]
+
+
+async def _run_shard(index, players, opts, results):
+    # Play the shard, putting (index, LoadStats) to results every
+    # report_interval seconds and once done
+    stats = LoadStats()
+
+    async def stream():
+        while True:
+            await asyncio.sleep(opts.report_interval)
+            results.put((index, stats.take()))
+
+    # The connects are staggered over the workers too, worker i starts
+    # i sessions later and each one connects its share of the rate
+    connect_rate = 0.0
+    if opts.connect_rate > 0:
+        connect_rate = opts.connect_rate / opts.workers
+        await asyncio.sleep(index / opts.connect_rate)
+    streamer = asyncio.ensure_future(stream())
+    try:
+        await run_load(
+            opts.host, opts.port, players, opts.per_session, opts.rate, connect_rate,
+            None if opts.seed is None else opts.seed + index,
+            prefix="w{}".format(index),
+            stats=stats,
+            bot_class=BOT_STRATEGIES[opts.strategy],
+        )
+    finally:
+        streamer.cancel()
+    results.put((index, stats.take()))
+
+
+def _worker(index, players, opts, results):
+    # Worker process, None tells the parent it is done
+    configure_logging_from_args(opts)
+    try:
+        asyncio.run(_run_shard(index, players, opts, results))
+    except Exception as e:
+        logging.error("Fleet worker %d failed: %s", index, e)
+    finally:
+        results.put((index, None))
+
+
+def _serve(opts, ready):
+    # Stand-in server process, its port is put to ready once listening
+    configure_logging_from_args(opts)
+    server = StandInServer(port=0, holes=opts.holes, seed=opts.seed)
+
+    async def serve():
+        await server.start()
+        ready.put(server.port)
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def run_fleet(opts):
+    # Run the fleet to the end, returns the merged LoadStats. Without a
+    # host a stand-in server is started in its own process
+    server = None
+    if opts.host is None:
+        ready = multiprocessing.Queue()
+        server = multiprocessing.Process(name="StandInServer", target=_serve,
+                                         args=(opts, ready), daemon=True)
+        server.start()
+        opts.host, opts.port = "127.0.0.1", ready.get()
+    results = multiprocessing.Queue()
+    workers = {}
+    for index, players in enumerate(shard(opts.players, opts.per_session, opts.workers)):
+        if players > 0:
+            workers[index] = multiprocessing.Process(
+                name="FleetWorker-{}".format(index), target=_worker,
+                args=(index, players, opts, results),
+            )
+    total = LoadStats()
+    start = time.perf_counter()
+    for p in workers.values():
+        p.start()
+    running = set(workers)
+    last_report = start
+    try:
+        while len(running) > 0:
+            try:
+                index, stats = results.get(timeout=opts.report_interval)
+            except Empty:
+                # Workers dying without saying so (killed) are done as well
+                for index in list(running):
+                    if workers[index].exitcode not in (None, 0):
+                        logging.error("Fleet worker %d died: %s", index, workers[index].exitcode)
+                        total.error("worker_died")
+                        running.discard(index)
+                continue
+            if stats is None:
+                running.discard(index)
+                continue
+            total.merge(stats)
+            now = time.perf_counter()
+            if now - last_report >= opts.report_interval:
+                last_report = now
+                print("{:7.1f}s {} moves ({:.0f}/s), {} games, {} workers running".format(
+                    now - start, total.moves, total.moves / (now - start),
+                    total.games, len(running)))
+    finally:
+        for p in workers.values():
+            p.join()
+        if server is not None:
+            server.terminate()
+            server.join()
+    total.wall_time = time.perf_counter() - start
+    return total
+
+
+def outcome_summary(stats):
+    # Scores of the finished games
+    scores = [score for outcome in stats.outcomes for _, score in outcome]
+    winners = [max(score for _, score in outcome) for outcome in stats.outcomes if outcome]
+    return {
+        "games": len(stats.outcomes),
+        "mean_score": sum(scores) / len(scores) if scores else 0.0,
+        "mean_winner_score": sum(winners) / len(winners) if winners else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process Sudoku bot fleet")
+    parser.add_argument("--host", default=None,
+                        help="game server, a local stand-in server if omitted")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-n", "--players", type=int, default=1000)
+    parser.add_argument("--per-session", type=int, default=2)
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes, one per core by default")
+    parser.add_argument("--strategy", default="solver", choices=sorted(BOT_STRATEGIES),
+                        help="solve the table or try every number")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="moves per second per player, 0 = no limit")
+    parser.add_argument("--connect-rate", type=float, default=100.0,
+                        help="sessions connected per second over all the workers, "
+                             "0 = all at once")
+    parser.add_argument("--report-interval", type=float, default=DEFAULT_REPORT_INTERVAL,
+                        help="seconds between the progress reports")
+    parser.add_argument("--holes", type=int, default=45,
+                        help="empty cells per game on the stand-in server")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", default=None, help="write the summary here")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging_from_args(args)
+    stats = run_fleet(args)
+    outcomes = outcome_summary(stats)
+    print(stats.report())
+    print("{games} games scored, mean score {mean_score:.1f}, "
+          "mean winner score {mean_winner_score:.1f}".format(**outcomes))
+    if args.json:
+        summary = stats.summary()
+        summary["outcomes"] = outcomes
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+# Append-only history of the finished games. Every (game, player) pair is
+# a fixed size record in a binary file, nicknames and session names are
+# interned in a sidecar file (one name per line, its line number being its
+# id). The records are read through mmap, per-player aggregates are built
+# once when opened and kept up to date on every append, so the leaderboard
+# and player statistics don't scan the records.
+import argparse
+import csv
+import heapq
+import json
+import mmap
+import os
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from struct import Struct
+from threading import Lock
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows, one writer at a time there
+    fcntl = None
+
+HISTORY_MAGIC = b"SUDHIST2"
+# game id, session name id, end time (epoch seconds), duration (ms), moves
+# made by the recording client, player name id, score, rank (1 = won),
+# players of the game
+_RECORD = Struct("<IIdIIIiHH")
+MAX_PLAYERS = 0xFFFF
+SCORE_MIN, SCORE_MAX = -(2**31), 2**31 - 1
+# Records read at once when scanning
+_CHUNK_RECORDS = 8192
+
+# A record with the names resolved, duration in seconds
+GameRecord = namedtuple(
+    "GameRecord",
+    ["game", "session", "ended", "duration", "moves", "player", "score", "rank", "players"],
+)
+PlayerStats = namedtuple(
+    "PlayerStats",
+    ["name", "games", "wins", "win_rate", "mean_score", "best_score"],
+)
+# Leaderboard keys, computed from the per-player aggregates
+_METRICS = {
+    "wins": lambda a: a.wins,
+    "win_rate": lambda a: a.wins / a.games,
+    "mean_score": lambda a: a.total_score / a.games,
+    "best_score": lambda a: a.best_score,
+    "games": lambda a: a.games,
+}
+LEADERBOARD_KEYS = tuple(_METRICS)
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+def ranks(scores):
+    # Rank of every score, equal scores share the rank
+    ordered = sorted((s for _, s in scores), reverse=True)
+    return [ordered.index(s) + 1 for _, s in scores]
+
+
+class _Aggregate:
+    __slots__ = ("games", "wins", "total_score", "best_score")
+
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.total_score = 0
+        self.best_score = None
+
+    def add(self, score, rank):
+        self.games += 1
+        self.wins += rank == 1
+        self.total_score += score
+        if self.best_score is None or score > self.best_score:
+            self.best_score = score
+
+
+class GameHistory:
+    # Clients sharing a history append to it in turns (flock), each one
+    # first loading the names and games the others appended. Opened
+    # readonly nothing is written nor repaired
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.names_path = path + ".names"
+        self.readonly = readonly
+        self.__lock = Lock()  # Games end on the network thread
+        self.__names = []  # id -> name
+        self.__ids = {}  # name -> id
+        self.__names_size = 0  # Bytes of the names file loaded
+        self.__aggregates = {}  # player name id -> _Aggregate
+        self.records = 0
+        self.games = 0
+        self.__f = self.__names_f = None
+        if not readonly:
+            self.__f = open(path, "ab")
+            self.__names_f = open(self.names_path, "ab")
+        with self.__file_lock():
+            if not readonly:
+                self.__repair()
+            self.__check_magic()
+            self.__catch_up()
+
+    @contextmanager
+    def __file_lock(self):
+        # Held by the writers while appending, readers go without
+        if self.readonly or fcntl is None:
+            yield
+            return
+        fcntl.flock(self.__f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.__f.fileno(), fcntl.LOCK_UN)
+
+    def __repair(self):
+        # Start a new history, drop what a crashed writer left cut short
+        size = os.fstat(self.__f.fileno()).st_size
+        if size == 0:
+            self.__f.write(HISTORY_MAGIC)
+            self.__f.flush()
+        elif size > len(HISTORY_MAGIC):
+            torn = (size - len(HISTORY_MAGIC)) % _RECORD.size
+            if torn:
+                os.ftruncate(self.__f.fileno(), size - torn)
+        with open(self.names_path, "rb") as f:
+            data = f.read()
+        valid = data.rfind(b"\n") + 1
+        if valid < len(data):
+            os.ftruncate(self.__names_f.fileno(), valid)
+
+    def __check_magic(self):
+        with open(self.path, "rb") as f:
+            if f.read(len(HISTORY_MAGIC)) != HISTORY_MAGIC:
+                raise ValueError("{} is not a game history".format(self.path))
+
+    def __catch_up(self):
+        # Load the names and records appended since the last time (by
+        # this or other clients), whole ones only
+        if (
+            os.path.exists(self.names_path)
+            and os.path.getsize(self.names_path) > self.__names_size
+        ):
+            with open(self.names_path, "rb") as f:
+                f.seek(self.__names_size)
+                data = f.read()
+            data = data[: data.rfind(b"\n") + 1]
+            self.__names_size += len(data)
+            for name in data.split(b"\n")[:-1]:
+                self.__intern_loaded(name.decode("utf-8"))
+        size = os.path.getsize(self.path) - len(HISTORY_MAGIC)
+        records = size // _RECORD.size
+        for rec in self.__scan(self.records, records):
+            self.__aggregate(rec)
+        self.records = max(self.records, records)
+
+    def __intern_loaded(self, name):
+        self.__ids[name] = len(self.__names)
+        self.__names.append(name)
+
+    def __intern(self, name):
+        # Called holding the locks. New names are written (and flushed)
+        # before the records using them
+        i = self.__ids.get(name)
+        if i is None:
+            name = name.replace("\n", " ")
+            line = (name + "\n").encode("utf-8")
+            self.__names_f.write(line)
+            self.__names_size += len(line)
+            self.__intern_loaded(name)
+            i = self.__ids[name]
+        return i
+
+    def __aggregate(self, rec):
+        # rec as unpacked from _RECORD
+        a = self.__aggregates.get(rec[5])
+        if a is None:
+            a = self.__aggregates[rec[5]] = _Aggregate()
+        a.add(rec[6], rec[7])
+        self.games = max(self.games, rec[0] + 1)
+
+    def append_game(self, session, scores, duration, moves=0, ended=None):
+        # Store a finished game, scores as the REP_SCORES_GAME_OVER data
+        # [(nickname, score), ...]. Returns the game id
+        if self.readonly:
+            raise ValueError("{} is opened read-only".format(self.path))
+        if len(scores) > MAX_PLAYERS:
+            raise ValueError("{} players, at most {} stored".format(len(scores), MAX_PLAYERS))
+        if any(not SCORE_MIN <= score <= SCORE_MAX for _, score in scores):
+            raise ValueError("Score out of range: {}".format(scores))
+        if ended is None:
+            ended = time.time()
+        duration_ms = min(int(duration * 1000), 0xFFFFFFFF)
+        with self.__lock, self.__file_lock():
+            self.__catch_up()
+            game = self.games
+            sess = self.__intern(session or "")
+            recs = [
+                (game, sess, ended, duration_ms, moves, self.__intern(name),
+                 score, rank, len(scores))
+                for (name, score), rank in zip(scores, ranks(scores))
+            ]
+            self.__names_f.flush()
+            self.__f.write(b"".join(_RECORD.pack(*rec) for rec in recs))
+            self.__f.flush()
+            self.records += len(recs)
+            for rec in recs:
+                self.__aggregate(rec)
+            self.games = game + 1
+        return game
+
+    def refresh(self):
+        # Load the games appended by others since opened
+        with self.__lock, self.__file_lock():
+            self.__catch_up()
+
+    def __scan(self, start, end):
+        # Raw records start...end-1, read through mmap a chunk at a time
+        if end <= start:
+            return
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                step = _CHUNK_RECORDS * _RECORD.size
+                first = len(HISTORY_MAGIC) + start * _RECORD.size
+                last = len(HISTORY_MAGIC) + end * _RECORD.size
+                for pos in range(first, last, step):
+                    yield from _RECORD.iter_unpack(mm[pos : min(pos + step, last)])
+
+    def __resolve(self, rec):
+        names = self.__names
+        return GameRecord(
+            rec[0], names[rec[1]], rec[2], rec[3] / 1000.0, rec[4], names[rec[5]],
+            rec[6], rec[7], rec[8],
+        )
+
+    def iter_records(self):
+        # GameRecord of every (game, player) loaded, oldest first
+        with self.__lock:
+            records = self.records
+        for rec in self.__scan(0, records):
+            yield self.__resolve(rec)
+
+    def __stats(self, player_id, a):
+        return PlayerStats(
+            self.__names[player_id], a.games, a.wins, a.wins / a.games,
+            a.total_score / a.games, a.best_score,
+        )
+
+    def player(self, name):
+        # PlayerStats of the nickname, None if it has no games
+        with self.__lock:
+            i = self.__ids.get(name)
+            a = self.__aggregates.get(i) if i is not None else None
+            return self.__stats(i, a) if a is not None else None
+
+    def leaderboard(self, n=10, key="wins", min_games=1):
+        # Top n PlayerStats by key (one of LEADERBOARD_KEYS)
+        if key not in LEADERBOARD_KEYS:
+            raise ValueError("Unknown leaderboard key {}".format(key))
+        metric = _METRICS[key]
+        with self.__lock:
+            top = heapq.nlargest(
+                n,
+                (item for item in self.__aggregates.items() if item[1].games >= min_games),
+                key=lambda item: (metric(item[1]), item[1].games),
+            )
+            return [self.__stats(i, a) for i, a in top]
+
+    def export(self, out, fmt="csv"):
+        # Stream every record to the text file out, returns how many
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError("Unknown export format {}".format(fmt))
+        count = 0
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(GameRecord._fields)
+            for rec in self.iter_records():
+                writer.writerow(rec)
+                count += 1
+        else:
+            for rec in self.iter_records():
+                out.write(json.dumps(rec._asdict()) + "\n")
+                count += 1
+        return count
+
+    def close(self):
+        with self.__lock:
+            if self.__f is not None:
+                self.__f.close()
+                self.__names_f.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the game history")
+    parser.add_argument("history", help="file written by clientMain --history")
+    parser.add_argument("--leaderboard", default="wins", choices=LEADERBOARD_KEYS,
+                        help="rank the players by this")
+    parser.add_argument("-n", type=int, default=10, help="players on the leaderboard")
+    parser.add_argument("--min-games", type=int, default=1)
+    parser.add_argument("--player", default=None, help="statistics of this nickname")
+    parser.add_argument("--export", default=None, choices=EXPORT_FORMATS,
+                        help="write every record to stdout")
+    args = parser.parse_args()
+    history = GameHistory(args.history, readonly=True)
+    try:
+        if args.export:
+            history.export(sys.stdout, args.export)
+        elif args.player:
+            print(history.player(args.player) or "No games of {}".format(args.player))
+        else:
+            print("{} games, {} records".format(history.games, history.records))
+            for rank, s in enumerate(
+                history.leaderboard(args.n, args.leaderboard, args.min_games), 1
+            ):
+                print("{:>3}. {:<8} games {:>6} wins {:>6} ({:5.1%}) "
+                      "mean score {:7.2f} best {:>4}".format(
+                          rank, s.name, s.games, s.wins, s.win_rate, s.mean_score,
+                          s.best_score))
+    finally:
+        history.close()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+# Headless load generator. Runs N scripted players on one event loop, each
+# registering a nickname, creating or joining a session and playing moves
+# at a configurable rate till the game is over. Reports request latency
+# per message type, connect time, moves per second and error counts.
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from clientAsync import AsyncClient
+from standInServer import StandInServer
+from utils import add_logging_arguments, configure_logging_from_args, getmylogger
+from messageProtocol import *
+
+
+logging = getmylogger(__name__)
+
+
+def percentile(sorted_samples, pct):
+    # Nearest-rank percentile of an already sorted list
+    if len(sorted_samples) <= 0:
+        return 0.0
+    rank = max(0, int(round(pct / 100.0 * len(sorted_samples) + 0.5)) - 1)
+    return sorted_samples[min(rank, len(sorted_samples) - 1)]
+
+
+class LoadStats:
+    # Latency samples (seconds) per message type plus counters, and the
+    # final scores of the games finished
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.moves = 0
+        self.games = 0
+        self.outcomes = []  # [(nickname, score), ...] per game
+        self.wall_time = 0.0
+
+    def record(self, kind, seconds):
+        self.latencies[kind].append(seconds)
+
+    def error(self, kind):
+        self.errors[kind] += 1
+
+    def merge(self, other):
+        for kind, samples in other.latencies.items():
+            self.latencies[kind].extend(samples)
+        for kind, count in other.errors.items():
+            self.errors[kind] += count
+        self.moves += other.moves
+        self.games += other.games
+        self.outcomes.extend(other.outcomes)
+
+    def take(self):
+        # Move what was collected so far to a new LoadStats, for streaming
+        # the results of a run still going on
+        taken = LoadStats()
+        taken.latencies, self.latencies = self.latencies, defaultdict(list)
+        taken.errors, self.errors = self.errors, defaultdict(int)
+        taken.moves, self.moves = self.moves, 0
+        taken.games, self.games = self.games, 0
+        taken.outcomes, self.outcomes = self.outcomes, []
+        return taken
+
+    def summary(self):
+        latency = {}
+        for kind, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            latency[kind] = {
+                "count": len(samples),
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p95_ms": percentile(samples, 95) * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        wall = self.wall_time
+        return {
+            "wall_time_s": wall,
+            "moves": self.moves,
+            "moves_per_s": self.moves / wall if wall > 0 else 0.0,
+            "games_finished": self.games,
+            "latency": latency,
+            "errors": dict(self.errors),
+        }
+
+    def report(self):
+        s = self.summary()
+        lines = [
+            "wall time {:.2f}s, {} moves ({:.1f}/s), {} games finished".format(
+                s["wall_time_s"], s["moves"], s["moves_per_s"], s["games_finished"]
+            )
+        ]
+        for kind, l in s["latency"].items():
+            lines.append(
+                "{:<12} n={:<7} p50={:8.2f}ms p95={:8.2f}ms p99={:8.2f}ms "
+                "max={:8.2f}ms".format(
+                    kind, l["count"], l["p50_ms"], l["p95_ms"], l["p99_ms"],
+                    l["max_ms"],
+                )
+            )
+        lines.append("errors: {}".format(s["errors"] if s["errors"] else "none"))
+        return "\n".join(lines)
+
+
+class Bot:
+    # Scripted player. Tries the digits of the empty cells in order till
+    # the server accepts them, at most `rate` moves per second
+    def __init__(self, name, stats, rate=0.0, rnd=random):
+        self.name = name
+        self.stats = stats
+        self.rate = rate
+        self.rnd = rnd
+        self.client = AsyncClient()
+        self.game_over = None  # Set to the scores when the game ends
+
+    async def __timed(self, kind, coro):
+        start = time.perf_counter()
+        rsp = await coro
+        self.stats.record(kind, time.perf_counter() - start)
+        return rsp
+
+    async def connect(self, host, port):
+        await self.__timed("connect", self.client.connect(host, port))
+        rsp = await self.__timed("nickname", self.client.nickname(self.name))
+        if rsp.header != REP_CURRENT_SESSIONS:
+            self.stats.error("nickname_refused")
+            return False
+        return True
+
+    async def join(self, sess_name, max_players=None):
+        rsp = await self.__timed(
+            "join", self.client.join_session(sess_name, max_players)
+        )
+        if rsp.header == REP_NOT_OK:
+            self.stats.error("join_refused")
+            return None
+        return rsp
+
+    async def wait_game(self, rsp):
+        if rsp.header == REP_WAITING_PLAYERS:
+            start = time.perf_counter()
+            rsp = await self.client.wait_game_start()
+            self.stats.record("game_start", time.perf_counter() - start)
+        return None if rsp is None else rsp.data
+
+    async def __watch(self):
+        async for msg in self.client.notifications():
+            if msg.header == REP_SCORES_GAME_OVER:
+                self.game_over = msg.data or []
+                return
+
+    def choose_cells(self, cells):
+        # Order in which the empty cells are attempted
+        empty = [i for i, v in enumerate(cells) if v == 0]
+        self.rnd.shuffle(empty)
+        return empty
+
+    def digits(self, cell):
+        # Numbers tried on the cell, in order
+        return range(1, 10)
+
+    async def play(self, cells):
+        watcher = asyncio.ensure_future(self.__watch())
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        for cell in self.choose_cells(cells):
+            if not await self.__fill(cell, interval):
+                break
+        else:
+            # Out of cells, the others are finishing the game
+            await watcher
+        if self.game_over is None:
+            watcher.cancel()
+
+    async def __fill(self, cell, interval):
+        # Try the digits on the cell, False once the game is over
+        for nr in self.digits(cell):
+            if self.game_over is not None:
+                return False
+            if interval > 0:
+                await asyncio.sleep(interval)
+            rsp = await self.__timed(
+                "put_number",
+                self.client.put_number(cell % 9 + 1, cell // 9 + 1, nr),
+            )
+            self.stats.moves += 1
+            if rsp.header != REP_PUT_NR:
+                await asyncio.sleep(0)  # Let the game over notification in
+                if self.game_over is None:
+                    self.stats.error("put_refused")
+                return False
+            if rsp.payload != PUT_NR_WRONG:
+                return True
+        return True
+
+
+async def run_session(group, sess_name, host, port, stats):
+    # First bot of the group creates the session, the rest join it
+    try:
+        for bot in group:
+            if not await bot.connect(host, port):
+                return
+        rsp = [await group[0].join(sess_name, len(group))]
+        for bot in group[1:]:
+            rsp.append(await bot.join(sess_name))
+        if None in rsp:
+            return
+        boards = await asyncio.gather(*[b.wait_game(r) for b, r in zip(group, rsp)])
+        await asyncio.gather(*[b.play(c) for b, c in zip(group, boards) if c])
+        if group[0].game_over is not None:
+            stats.games += 1
+            stats.outcomes.append(group[0].game_over)
+    except (OSError, ConnectionError) as e:
+        stats.error(type(e).__name__)
+    finally:
+        for bot in group:
+            await bot.client.close()
+
+
+async def run_load(host, port, players, per_session=2, rate=0.0,
+                   connect_rate=0.0, seed=None, prefix="", stats=None, bot_class=Bot):
+    # Play with `players` bots in sessions of `per_session` players,
+    # sessions are connected `connect_rate` per second (0 = all at once).
+    # Results are collected to stats (a new LoadStats by default)
+    if stats is None:
+        stats = LoadStats()
+    rnd = random.Random(seed)
+    start = time.perf_counter()
+    tasks = []
+    for n, first in enumerate(range(0, players, per_session)):
+        group = [
+            bot_class("{}b{}".format(prefix, i), stats, rate, rnd)
+            for i in range(first, min(first + per_session, players))
+        ]
+        if len(group) < 2:
+            break
+        tasks.append(
+            asyncio.ensure_future(
+                run_session(group, "{}s{}".format(prefix, n), host, port, stats)
+            )
+        )
+        if connect_rate > 0:
+            await asyncio.sleep(1.0 / connect_rate)
+    await asyncio.gather(*tasks)
+    stats.wall_time = time.perf_counter() - start
+    return stats
+
+
+async def main(args):
+    server = None
+    host, port = args.host, args.port
+    if host is None:
+        server = StandInServer(port=0, holes=args.holes, seed=args.seed)
+        await server.start()
+        host, port = server.host, server.port
+    try:
+        stats = await run_load(
+            host, port, args.players, args.per_session, args.rate,
+            args.connect_rate, args.seed,
+        )
+    finally:
+        if server is not None:
+            await server.close()
+    print(stats.report())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats.summary(), f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sudoku client load generator")
+    parser.add_argument("--host", default=None,
+                        help="game server, a local stand-in server if omitted")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-n", "--players", type=int, default=16)
+    parser.add_argument("--per-session", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="moves per second per player, 0 = no limit")
+    parser.add_argument("--connect-rate", type=float, default=0.0,
+                        help="sessions connected per second, 0 = all at once")
+    parser.add_argument("--holes", type=int, default=45,
+                        help="empty cells per game on the stand-in server")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", default=None, help="write the summary here")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging_from_args(args)
+    asyncio.run(main(args))
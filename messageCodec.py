@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# Codec of the messageProtocol frames. Frames are decoded into Message
+# objects through tables keyed on the header char, payloads parsed into
+# structured data once. Encoders build the outgoing frames of both sides.
+import re
+from collections import namedtuple
+from sudokuBoard import cell_index, parse_table
+from messageProtocol import *
+
+# header: REQ_*/REP_* code, payload: the raw text after the header,
+# data: payload parsed according to the header
+Message = namedtuple("Message", ["header", "payload", "data"])
+# Entry of the REP_CURRENT_SESSIONS list
+SessionInfo = namedtuple("SessionInfo", ["name", "players", "max_players"])
+# REP_TABLE_DELTA, changes are (cell index, number) pairs
+TableDelta = namedtuple("TableDelta", ["version", "changes"])
+
+# Replies answering a request, the rest are pushed by the server
+RESPONSE_HEADERS = frozenset(
+    [
+        REP_CURRENT_SESSIONS,
+        REP_CAPABILITIES,
+        REP_PUT_NR,
+        REP_WAITING_PLAYERS,
+        REP_TABLE,
+        REP_NOT_OK,
+    ]
+)
+NOTIFICATION_HEADERS = frozenset([REP_NOTIFY, REP_SCORES_GAME_OVER, REP_TABLE_DELTA])
+
+LIST_SEP = ","
+# REP_NOTIFY of a player's move
+_MOVE_NOTIFICATION = re.compile(r"\S+ put [1-9] at \([1-9], [1-9]\)$")
+
+
+def _text(payload):
+    return payload
+
+
+def _names(payload):
+    return [n.strip() for n in payload.split(LIST_SEP) if n.strip()]
+
+
+def _session(entry):
+    # sessName-currentPlayerNr/maxPlayerNr
+    name, _, counts = entry.rpartition("-")
+    players, _, max_players = counts.partition("/")
+    return SessionInfo(name, int(players), int(max_players))
+
+
+def _sessions(payload):
+    return [_session(e) for e in _names(payload)]
+
+
+def _score(entry):
+    # nickname|score
+    name, _, score = entry.rpartition(FIELD_SEP)
+    return name, int(score)
+
+
+def _scores(payload):
+    return [_score(e) for e in _names(payload)]
+
+
+def _join_new(payload):
+    name, _, max_players = payload.partition(FIELD_SEP)
+    return name, int(max_players)
+
+
+def _move(payload):
+    # xyz, column, row and number as digits
+    if len(payload) != 3:
+        raise ValueError("Move needs three digits")
+    x, y, nr = int(payload[0]), int(payload[1]), int(payload[2])
+    return x, y, nr
+
+
+def _change(entry):
+    # xyn, n may be 0 for a cleared cell
+    if len(entry) != 3 or not entry.isdigit() or "0" in entry[:2]:
+        raise ValueError("Change needs three digits")
+    return cell_index(int(entry[0]), int(entry[1])), int(entry[2])
+
+
+def _table_delta(payload):
+    version, _, changes = payload.partition(FIELD_SEP)
+    return TableDelta(int(version), [_change(e) for e in _names(changes)])
+
+
+REPLY_DECODERS = {
+    REP_CURRENT_SESSIONS: _sessions,
+    REP_CAPABILITIES: _names,
+    REP_WAITING_PLAYERS: _names,
+    REP_PUT_NR: _text,
+    REP_SCORES_GAME_OVER: _scores,
+    REP_TABLE: parse_table,
+    REP_NOTIFY: _text,
+    REP_TABLE_DELTA: _table_delta,
+    REP_NOT_OK: _text,
+}
+
+REQUEST_DECODERS = {
+    REQ_NICKNAME: _text,
+    REQ_JOIN_EXIST_SESS: _text,
+    REQ_JOIN_NEW_SESS: _join_new,
+    REQ_PUT_NR: _move,
+    REQ_CAPABILITIES: _names,
+    REQ_TABLE_RESYNC: _text,
+}
+
+
+def _decode(frame, decoders):
+    # None for a frame without a header, data is None for an unknown
+    # header or a payload which does not parse
+    if len(frame) < 2 or frame[1] != HEADER_SEP:
+        return None
+    header, payload = frame[0], frame[2:]
+    parser = decoders.get(header)
+    if parser is None:
+        return Message(header, payload, None)
+    try:
+        return Message(header, payload, parser(payload))
+    except ValueError:
+        return Message(header, payload, None)
+
+
+def decode_reply(frame):
+    return _decode(frame, REPLY_DECODERS)
+
+
+def decode_request(frame):
+    return _decode(frame, REQUEST_DECODERS)
+
+
+def encode(header, payload):
+    return header + HEADER_SEP + payload
+
+
+# Requests
+def encode_nickname(name):
+    return REQ_NICKNAME + HEADER_SEP + name
+
+
+def encode_join_session(name, max_players=None):
+    # Joins an existing session, creates a new one when max_players given
+    if max_players is None:
+        return REQ_JOIN_EXIST_SESS + HEADER_SEP + name
+    return REQ_JOIN_NEW_SESS + HEADER_SEP + name + FIELD_SEP + str(max_players)
+
+
+def encode_put_number(x, y, nr):
+    return "{}{}{}{}{}".format(REQ_PUT_NR, HEADER_SEP, x, y, nr)
+
+
+def encode_capabilities(caps, header=REQ_CAPABILITIES):
+    # Capabilities asked for (REQ_CAPABILITIES) or granted (REP_CAPABILITIES)
+    return header + HEADER_SEP + LIST_SEP.join(caps)
+
+
+# Replies
+def encode_sessions(sessions):
+    return REP_CURRENT_SESSIONS + HEADER_SEP + ", ".join(
+        "{}-{}/{}".format(*s) for s in sessions
+    )
+
+
+def encode_players(names):
+    return REP_WAITING_PLAYERS + HEADER_SEP + ", ".join(names)
+
+
+def encode_scores(scores):
+    return REP_SCORES_GAME_OVER + HEADER_SEP + ", ".join(
+        "{}{}{}".format(name, FIELD_SEP, score) for name, score in scores
+    )
+
+
+def format_table(cells):
+    # 81 ints as nine rows of nine space separated digits
+    return "\n".join(
+        " ".join(str(v) for v in cells[r : r + 9]) for r in range(0, 81, 9)
+    )
+
+
+def encode_table(cells):
+    return REP_TABLE + HEADER_SEP + format_table(cells)
+
+
+def format_changes(changes):
+    # (cell index, number) pairs as xyn
+    return ", ".join(
+        "{}{}{}".format(cell % 9 + 1, cell // 9 + 1, nr) for cell, nr in changes
+    )
+
+
+def encode_table_delta(version, changes):
+    return "{}{}{}{}{}".format(
+        REP_TABLE_DELTA, HEADER_SEP, version, FIELD_SEP, format_changes(changes)
+    )
+
+
+def is_move_notification(text):
+    # REP_NOTIFY payload telling a player's move, "name put 3 at (1, 2)"
+    return _MOVE_NOTIFICATION.match(text) is not None
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Framing layer for the messageProtocol byte stream. Frames are terminated
+# by MSG_TERMCHR, the decoder collects received chunks into a buffer and
+# splits out every completed frame in one pass. The incomplete tail (which
+# may end in a partially received UTF-8 sequence) stays buffered till the
+# next read.
+from messageProtocol import MSG_TERMCHR
+
+# How much to ask from the socket on every read
+RECV_CHUNK_SIZE = 4096
+
+_TERM_BYTE = MSG_TERMCHR.encode("utf-8")
+
+
+def encode_frame(msg):
+    # Message with the terminating char, ready to be sent out
+    return (msg + MSG_TERMCHR).encode("utf-8")
+
+
+class FrameDecoder:
+    def __init__(self, encoding="utf-8"):
+        self.__buf = bytearray()
+        self.__encoding = encoding
+
+    def feed(self, data):
+        # Append the received bytes, return the list of frames (without the
+        # terminating char) completed by them. The terminator is a single
+        # ASCII byte and therefore never a part of a multi-byte UTF-8
+        # sequence, so everything up to the last terminator decodes at once.
+        buf = self.__buf
+        buf += data
+        end = buf.rfind(_TERM_BYTE)
+        if end < 0:
+            return []
+        block = bytes(buf[:end]).decode(self.__encoding, "replace")
+        del buf[: end + 1]
+        return block.split(MSG_TERMCHR)
+
+    def pending(self):
+        # Number of buffered bytes not yet forming a complete frame
+        return len(self.__buf)
+
+    def reset(self):
+        # Drop the buffered partial frame (e.g. after reconnecting)
+        del self.__buf[:]
@@ -7,6 +7,12 @@ REQ_JOIN_EXIST_SESS = 'b'
 REQ_JOIN_NEW_SESS = 'c'
 # REQchr:xyz(int)+term
 REQ_PUT_NR = 'd'
+# REQchr:[capability, ...]+term, sent before the nickname. Servers not
+# knowing it answer REP_NOT_OK and the client stays with the text frames
+REQ_CAPABILITIES = 'e'
+# REQchr:+term, answered with the current REP_TABLE. Sent by clients
+# getting deltas when they missed one
+REQ_TABLE_RESYNC = 'f'
 
 # REQ_DICT = {
 #    REQ_NICKNAME: 'Client wants to connect with nickname',
@@ -19,16 +25,27 @@ REQ_PUT_NR = 'd'
 # replies
 # REPnr:[sessName-currentPlayerNr/maxPlayerNr, ...]+term
 REP_CURRENT_SESSIONS = '0'
+# REPnr:[capability, ...]+term, the requested ones the server supports.
+# Both sides use them for the frames following this one
+REP_CAPABILITIES = '1'
 # REPnr:[nickname...]+term
 REP_WAITING_PLAYERS = '2'
 # REPnr:msg=Success/cell full/wrong+term
 REP_PUT_NR = '3'
+PUT_NR_SUCCESS = 'Success'
+PUT_NR_CELL_FULL = 'cell full'
+PUT_NR_WRONG = 'wrong'
 # REPnr:[nickname|score, ...]+term
 REP_SCORES_GAME_OVER = '4'
 # REPnr:sudokuTable(81 int)+term
 REP_TABLE = '5'
 # REPnr:NotifyMsg+term
 REP_NOTIFY = '6'
+# REPnr:version(int)|[xyn, ...]+term, cells of the table changed since the
+# previous delta (version - 1), n being the new number. Sent to the clients
+# having CAP_DELTA instead of the move notifications. The first delta after
+# a REP_TABLE applies to that table whatever its version
+REP_TABLE_DELTA = '7'
 # REPnr:ErrorMsg+term
 REP_NOT_OK = '9'
 
@@ -43,8 +60,17 @@ REP_NOT_OK = '9'
 #    REP_NOT_OK: 'Try again'
 #    }
 
+# Capabilities
+# Length prefixed binary frames (see binaryFraming)
+CAP_BINARY = 'binary'
+# REP_TABLE_DELTA updates of the table while playing
+CAP_DELTA = 'delta'
+
 HEADER_SEP = ':'
 FIELD_SEP = '|'
 MSG_TERMCHR = "#"
 
+# Port the game server listens on
+DEFAULT_PORT = 7777
+
 
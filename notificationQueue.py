@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Bounded queue of the server notifications waiting to be shown. When full
+# it either drops the oldest notification, or first coalesces the new one
+# with a queued one sharing its key (successive board updates): the older
+# is removed and the new one queued last. Notifications without a key are
+# never coalesced. Consumers take everything queued in one batch.
+from collections import deque
+from threading import Condition
+
+OVERFLOW_DROP_OLDEST = "drop-oldest"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE)
+
+
+class NotificationQueue:
+    def __init__(self, maxlen=256, overflow=OVERFLOW_DROP_OLDEST):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy {}".format(overflow))
+        if maxlen < 1:
+            raise ValueError("Queue length must be positive, got {}".format(maxlen))
+        self.__lock = Condition()
+        self.__maxlen = maxlen
+        self.__coalesce = overflow == OVERFLOW_COALESCE
+        # Entries are [key, msg] lists, the latest queued entry of each key
+        # is indexed by it
+        self.__entries = deque()
+        self.__keyed = {}
+        self.__closed = False
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def put(self, msg, key=None):
+        # Queue the notification. When full, in coalesce mode a queued
+        # notification with the same key gives way to this one, otherwise
+        # the oldest is dropped
+        with self.__lock:
+            if self.__closed:
+                return
+            if len(self.__entries) >= self.__maxlen:
+                older = self.__keyed.get(key) if self.__coalesce and key is not None else None
+                if older is not None:
+                    self.__remove(older)
+                    self.coalesced += 1
+                else:
+                    self.__forget(self.__entries.popleft())
+                    self.dropped += 1
+            entry = [key, msg]
+            self.__entries.append(entry)
+            if key is not None:
+                self.__keyed[key] = entry
+            if len(self.__entries) == 1:
+                self.__lock.notifyAll()
+
+    def __remove(self, entry):
+        # Entry from the middle of the queue, only done when overflowing
+        for i, queued in enumerate(self.__entries):
+            if queued is entry:
+                del self.__entries[i]
+                break
+        self.__forget(entry)
+
+    def __forget(self, entry):
+        # Entry left the queue, unindex it unless a later one took its key
+        key = entry[0]
+        if key is not None and self.__keyed.get(key) is entry:
+            del self.__keyed[key]
+
+    def get_batch(self, max_batch=None, block=True):
+        # Wait for notifications, return the ones queued (up to max_batch)
+        # in arrival order. None once the queue is closed and drained,
+        # without blocking an empty list if nothing is queued
+        with self.__lock:
+            while len(self.__entries) <= 0:
+                if self.__closed:
+                    return None
+                if not block:
+                    return []
+                self.__lock.wait()
+            n = len(self.__entries)
+            if max_batch is not None:
+                n = min(n, max_batch)
+            batch = []
+            for _ in range(n):
+                entry = self.__entries.popleft()
+                self.__forget(entry)
+                batch.append(entry[1])
+            return batch
+
+    def close(self):
+        # Wake the consumer, no more notifications are accepted
+        with self.__lock:
+            self.__closed = True
+            self.__lock.notifyAll()
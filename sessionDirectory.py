@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Client side directory of the open game sessions, filled from the
+# REP_CURRENT_SESSIONS lists. Sessions are kept by name, with the names
+# also in a sorted list for the prefix searches. A later list is applied as
+# changes (sessions new, gone or changed) and the replies of joining keep
+# it up to date in between, so sessions are picked by their free seats
+# without asking the server again.
+from bisect import bisect_left, insort
+from threading import Lock
+
+
+def free_seats(info):
+    return info.max_players - info.players
+
+
+class SessionDirectory:
+    def __init__(self, sessions=()):
+        self.__lock = Lock()  # Updated by the network thread too (resume)
+        self.__sessions = {}  # name -> messageCodec.SessionInfo
+        self.__names = []  # Sorted
+        self.update(sessions)
+
+    def __len__(self):
+        return len(self.__sessions)
+
+    def __contains__(self, name):
+        return name in self.__sessions
+
+    def get(self, name):
+        return self.__sessions.get(name)
+
+    def update(self, sessions):
+        # Apply a REP_CURRENT_SESSIONS list, all the open sessions of the
+        # server. Returns the number of sessions (added, removed, changed)
+        listed = {s.name: s for s in sessions}
+        added = changed = 0
+        with self.__lock:
+            gone = [name for name in self.__sessions if name not in listed]
+            for name in gone:
+                self.__remove(name)
+            for name, info in listed.items():
+                old = self.__sessions.get(name)
+                if old is None:
+                    insort(self.__names, name)
+                    added += 1
+                elif old != info:
+                    changed += 1
+                self.__sessions[name] = info
+        return added, len(gone), changed
+
+    def put(self, info):
+        # Add or replace a single session
+        with self.__lock:
+            if info.name not in self.__sessions:
+                insort(self.__names, info.name)
+            self.__sessions[info.name] = info
+
+    def discard(self, name):
+        # Session started or gone
+        with self.__lock:
+            if name in self.__sessions:
+                self.__remove(name)
+
+    def __remove(self, name):
+        del self.__sessions[name]
+        del self.__names[bisect_left(self.__names, name)]
+
+    def with_prefix(self, prefix):
+        # Sessions whose name starts with prefix, by name
+        found = []
+        with self.__lock:
+            names = self.__names
+            i = bisect_left(names, prefix)
+            while i < len(names) and names[i].startswith(prefix):
+                found.append(self.__sessions[names[i]])
+                i += 1
+        return found
+
+    def open_sessions(self, min_free=1):
+        # Sessions with at least min_free seats free, the ones closest to
+        # starting (fewest free seats) first
+        with self.__lock:
+            found = [s for s in self.__sessions.values() if free_seats(s) >= min_free]
+        found.sort(key=lambda s: (free_seats(s), s.name))
+        return found
+
+    def best_open(self, exclude=()):
+        # Open session to join, None if there is none (besides exclude)
+        for info in self.open_sessions():
+            if info.name not in exclude:
+                return info
+        return None
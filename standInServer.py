@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+# Stand-in game server for testing and benchmarking the client offline.
+# Implements the whole messageProtocol on a single asyncio event loop:
+# nickname registration, session create/join, board distribution, move
+# validation, notifications, table deltas and final scores.
+import argparse
+import asyncio
+import random
+from threading import Thread, Event
+from binaryFraming import (
+    BINARY_REQUEST_DECODERS,
+    BinaryFrameDecoder,
+    encode_binary_frame,
+    encode_binary_table,
+    encode_binary_table_delta,
+)
+from messageCodec import (
+    decode_request,
+    encode,
+    encode_capabilities,
+    encode_players,
+    encode_scores,
+    encode_sessions,
+    encode_table,
+    encode_table_delta,
+)
+from messageFraming import FrameDecoder, RECV_CHUNK_SIZE, encode_frame
+from utils import add_logging_arguments, configure_logging_from_args, getmylogger
+from messageProtocol import *
+
+
+logging = getmylogger(__name__)
+
+# How many cells of the solved board are emptied for a game
+DEFAULT_HOLES = 45
+# Players with more than this many bytes not sent yet miss the table deltas
+# (and resync once they catch up) instead of buffering every one of them
+DELTA_BACKLOG = 64 * 1024
+
+
+def make_puzzle(holes=DEFAULT_HOLES, rnd=random):
+    # Returns (puzzle, solution) lists of 81 ints, 0 marking an empty cell.
+    # Solution is a shuffled copy of the canonical pattern board
+    def shuffled_lines():
+        bands = rnd.sample(range(3), 3)
+        return [b * 3 + line for b in bands for line in rnd.sample(range(3), 3)]
+
+    rows, cols = shuffled_lines(), shuffled_lines()
+    digits = rnd.sample(range(1, 10), 9)
+    solution = [
+        digits[(r * 3 + r // 3 + c) % 9] for r in rows for c in cols
+    ]
+    puzzle = list(solution)
+    for cell in rnd.sample(range(81), min(holes, 81)):
+        puzzle[cell] = 0
+    return puzzle, solution
+
+
+class _Player:
+    def __init__(self, writer):
+        self.writer = writer
+        self.name = None
+        self.session = None
+        self.score = 0
+        self.binary = False  # Binary frames negotiated
+        self.deltas = False  # Gets REP_TABLE_DELTA instead of move notifications
+        self.__decoder = FrameDecoder()
+
+    def receive(self, data):
+        # Requests completed by the received data as Messages, None for a
+        # frame without header
+        if self.binary:
+            return [msg for msg, _ in self.__decoder.feed(data)]
+        return [decode_request(frame) for frame in self.__decoder.feed(data)]
+
+    def use_binary(self):
+        self.binary = True
+        self.__decoder = BinaryFrameDecoder(BINARY_REQUEST_DECODERS)
+
+    def backlog(self):
+        return self.writer.transport.get_write_buffer_size()
+
+    def send(self, msg, binary_frame=None):
+        # binary_frame: the message already encoded, when the caller has it
+        if self.binary:
+            self.writer.write(binary_frame or encode_binary_frame(msg))
+        else:
+            self.writer.write(encode_frame(msg))
+
+
+class _Session:
+    def __init__(self, name, max_players):
+        self.name = name
+        self.max_players = max_players
+        self.players = []
+        self.board = None  # Set once the game starts
+        self.solution = None
+        self.empty = 0  # Cells left to fill
+        self.left = {}  # nickname -> score of the players dropped mid game
+        # Cells changed by the moves of the current loop iteration, sent as
+        # one delta of the next table version
+        self.version = 0
+        self.changes = []
+
+    def started(self):
+        return self.board is not None
+
+    def broadcast(self, msg, skip=None, binary_frame=None, to=None):
+        # Each framing encoded once, for the first player using it. Sent to
+        # the players given in to, all of them by default
+        frames = {}
+        for p in self.players if to is None else to:
+            if p is skip:
+                continue
+            frame = frames.get(p.binary)
+            if frame is None:
+                if p.binary:
+                    frame = binary_frame or encode_binary_frame(msg)
+                else:
+                    frame = encode_frame(msg)
+                frames[p.binary] = frame
+            p.writer.write(frame)
+
+
+class StandInServer:
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, holes=DEFAULT_HOLES,
+                 seed=None, binary=True, deltas=True):
+        self.host = host
+        self.port = port  # Replaced by the bound port when 0 is given
+        self.__holes = holes
+        self.__rnd = random.Random(seed)
+        self.__server = None
+        self.__names = {}  # nickname -> _Player
+        self.__sessions = {}  # session name -> _Session
+        self.__handlers = {
+            REQ_NICKNAME: self.__nickname,
+            REQ_JOIN_EXIST_SESS: self.__join_existing,
+            REQ_JOIN_NEW_SESS: self.__join_new,
+            REQ_PUT_NR: self.__put_number,
+        }
+        # Without any capability the server answers REQ_CAPABILITIES like
+        # an old one, REP_NOT_OK
+        self.__capabilities_supported = []
+        if binary:
+            self.__capabilities_supported.append(CAP_BINARY)
+        if deltas:
+            self.__capabilities_supported.append(CAP_DELTA)
+            self.__handlers[REQ_TABLE_RESYNC] = self.__resync
+        if len(self.__capabilities_supported) > 0:
+            self.__handlers[REQ_CAPABILITIES] = self.__capabilities
+        # Used when running in a background thread
+        self.__loop = None
+        self.__thread = None
+
+    async def start(self):
+        self.__server = await asyncio.start_server(
+            self.__serve_client, self.host, self.port, backlog=4096
+        )
+        self.port = self.__server.sockets[0].getsockname()[1]
+        logging.info("Stand-in server listening on %s:%s", self.host, self.port)
+
+    async def serve_forever(self):
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    async def close(self):
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    def start_in_thread(self):
+        # Run the server on its own event loop in a daemon thread, returns
+        # the bound port once it is accepting connections
+        ready = Event()
+
+        def run():
+            self.__loop = asyncio.new_event_loop()
+            self.__loop.run_until_complete(self.start())
+            ready.set()
+            self.__loop.run_forever()
+            self.__loop.run_until_complete(self.close())
+            self.__loop.close()
+
+        self.__thread = Thread(name="StandInServer", target=run, daemon=True)
+        self.__thread.start()
+        ready.wait()
+        return self.port
+
+    def stop_thread(self):
+        if self.__thread is not None:
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__thread.join()
+            self.__thread = None
+
+    async def __serve_client(self, reader, writer):
+        player = _Player(writer)
+        try:
+            while True:
+                data = await reader.read(RECV_CHUNK_SIZE)
+                if len(data) <= 0:
+                    break
+                for msg in player.receive(data):
+                    self.__protocol_rcv(player, msg)
+                await writer.drain()
+        except (OSError, ConnectionError) as e:
+            logging.debug("Client connection error: %s", e)
+        finally:
+            self.__disconnect(player)
+            writer.close()
+
+    def __protocol_rcv(self, player, msg):
+        handler = self.__handlers.get(msg.header) if msg is not None else None
+        if handler is None:
+            player.send(encode(REP_NOT_OK, "Unknown request"))
+        elif msg.data is None:
+            player.send(encode(REP_NOT_OK, "Malformed request"))
+        else:
+            handler(player, msg.data)
+
+    def __session_list(self):
+        return encode_sessions(
+            (s.name, len(s.players), s.max_players)
+            for s in self.__sessions.values()
+            if not s.started()
+        )
+
+    def __capabilities(self, player, caps):
+        # Grant the supported ones, the reply is the last text frame
+        granted = [c for c in caps if c in self.__capabilities_supported]
+        player.send(encode_capabilities(granted, REP_CAPABILITIES))
+        player.deltas = CAP_DELTA in granted
+        if CAP_BINARY in granted:
+            player.use_binary()
+
+    def __nickname(self, player, name):
+        if len(name) not in range(1, 9) or not name.isalnum():
+            player.send(encode(REP_NOT_OK, "Not a suitable name"))
+        elif self.__names.get(name, player) is not player or player.session:
+            player.send(encode(REP_NOT_OK, "Name taken"))
+        else:
+            if player.name is not None:
+                del self.__names[player.name]
+            player.name = name
+            self.__names[name] = player
+            player.send(self.__session_list())
+
+    def __can_join(self, player):
+        if player.name is None:
+            player.send(encode(REP_NOT_OK, "Nickname first"))
+        elif player.session is not None:
+            player.send(encode(REP_NOT_OK, "Already in session"))
+        else:
+            return True
+        return False
+
+    def __join_new(self, player, data):
+        if not self.__can_join(player):
+            return
+        name, max_players = data
+        if len(name) not in range(1, 9) or not name.isalnum():
+            player.send(encode(REP_NOT_OK, "Not a suitable session name"))
+        elif name in self.__sessions:
+            player.send(encode(REP_NOT_OK, "Session exists"))
+        elif max_players < 2:
+            player.send(encode(REP_NOT_OK, "Need a minimum of two players"))
+        else:
+            sess = _Session(name, max_players)
+            self.__sessions[name] = sess
+            self.__add_player(sess, player)
+
+    def __join_existing(self, player, name):
+        if not self.__can_join(player):
+            return
+        sess = self.__sessions.get(name)
+        if sess is None:
+            player.send(encode(REP_NOT_OK, "No such session"))
+        elif sess.started() and player.name in sess.left:
+            self.__rejoin(sess, player)
+        elif sess.started():
+            player.send(encode(REP_NOT_OK, "Game already started"))
+        else:
+            self.__add_player(sess, player)
+
+    def __add_player(self, sess, player):
+        sess.players.append(player)
+        player.session = sess
+        player.score = 0
+        if len(sess.players) < sess.max_players:
+            player.send(encode_players(p.name for p in sess.players))
+            sess.broadcast(
+                encode(REP_NOTIFY, "{} joined the session".format(player.name)),
+                skip=player,
+            )
+            return
+        # Session is full, everybody gets the table
+        sess.board, sess.solution = make_puzzle(self.__holes, self.__rnd)
+        sess.empty = sess.board.count(0)
+        sess.broadcast(
+            encode_table(sess.board), binary_frame=encode_binary_table(sess.board)
+        )
+        logging.info("Game started in session %s", sess.name)
+
+    def __rejoin(self, sess, player):
+        # Player lost the connection mid game and is back, it gets its seat,
+        # score and the current table
+        sess.players.append(player)
+        player.session = sess
+        player.score = sess.left.pop(player.name)
+        player.send(encode_table(sess.board), encode_binary_table(sess.board))
+        sess.broadcast(
+            encode(REP_NOTIFY, "{} rejoined the session".format(player.name)),
+            skip=player,
+        )
+
+    def __put_number(self, player, move):
+        sess = player.session
+        if sess is None or not sess.started():
+            player.send(encode(REP_NOT_OK, "Not in a game"))
+            return
+        if not all(1 <= v <= 9 for v in move):
+            player.send(encode(REP_NOT_OK, "Not proper input"))
+            return
+        x, y, nr = move
+        cell = (y - 1) * 9 + (x - 1)
+        if sess.board[cell] != 0:
+            player.send(encode(REP_PUT_NR, PUT_NR_CELL_FULL))
+        elif sess.solution[cell] != nr:
+            player.score -= 1
+            player.send(encode(REP_PUT_NR, PUT_NR_WRONG))
+        else:
+            player.score += 1
+            sess.board[cell] = nr
+            sess.empty -= 1
+            player.send(encode(REP_PUT_NR, PUT_NR_SUCCESS))
+            sess.broadcast(
+                encode(REP_NOTIFY, "{} put {} at ({}, {})".format(player.name, nr, x, y)),
+                skip=player,
+                to=[p for p in sess.players if not p.deltas],
+            )
+            if len(sess.changes) <= 0:
+                asyncio.get_running_loop().call_soon(self.__send_delta, sess)
+            sess.changes.append((cell, nr))
+            if sess.empty <= 0:
+                self.__game_over(sess)
+
+    def __send_delta(self, sess):
+        # Moves of the loop iteration as one delta, the mover gets it too to
+        # keep counting the versions
+        if len(sess.changes) <= 0:
+            return
+        sess.version += 1
+        changes, sess.changes = sess.changes, []
+        to = [p for p in sess.players if p.deltas and p.backlog() <= DELTA_BACKLOG]
+        if len(to) > 0:
+            sess.broadcast(
+                encode_table_delta(sess.version, changes),
+                binary_frame=encode_binary_table_delta(sess.version, changes),
+                to=to,
+            )
+
+    def __resync(self, player, _):
+        # Client missed a delta, the current table brings it up to date
+        sess = player.session
+        if sess is None or not sess.started():
+            player.send(encode(REP_NOT_OK, "Not in a game"))
+        else:
+            player.send(encode_table(sess.board), encode_binary_table(sess.board))
+
+    def __game_over(self, sess):
+        self.__send_delta(sess)
+        scores = [(p.name, p.score) for p in sess.players] + list(sess.left.items())
+        ranked = sorted(scores, key=lambda s: -s[1])
+        sess.broadcast(encode_scores(ranked))
+        for p in sess.players:
+            p.session = None
+        del self.__sessions[sess.name]
+        logging.info("Game over in session %s", sess.name)
+
+    def __disconnect(self, player):
+        sess = player.session
+        if sess is not None:
+            sess.players.remove(player)
+            player.session = None
+            if sess.started():
+                sess.left[player.name] = player.score  # Seat kept for rejoin
+            if len(sess.players) <= 0:
+                del self.__sessions[sess.name]
+            else:
+                sess.broadcast(
+                    encode(REP_NOTIFY, "{} left the session".format(player.name))
+                )
+        if player.name is not None and self.__names.get(player.name) is player:
+            del self.__names[player.name]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Sudoku game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--holes", type=int, default=DEFAULT_HOLES,
+                        help="empty cells per game")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--text-only", action="store_true",
+                        help="refuse binary frames like a server predating them")
+    parser.add_argument("--no-deltas", action="store_true",
+                        help="send move notifications instead of table deltas")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging_from_args(args)
+    server = StandInServer(
+        args.host, args.port, args.holes, args.seed, not args.text_only, not args.no_deltas
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logging.info("Terminating")
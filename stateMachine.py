@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Small event driven state machine. Transitions are declared in a table
+# (state, event) -> Transition(handler, next_state), with entry/exit hooks
+# per state and a bounded trace of the transitions taken.
+from collections import deque, namedtuple
+from threading import RLock
+from time import monotonic
+from utils import getmylogger
+
+# Matches every state in the transition table
+ANY_STATE = "*"
+
+# handler(data) is called on the event, next_state (if not None) is
+# entered after it. Handlers may also move the machine on their own
+Transition = namedtuple("Transition", ["handler", "next_state"])
+# Entry of the transition trace
+TraceEntry = namedtuple("TraceEntry", ["time", "old_state", "event", "new_state"])
+
+
+logging = getmylogger(__name__)
+
+
+class StateMachine:
+    def __init__(self, initial, transitions, on_enter=None, on_exit=None,
+                 trace_len=256):
+        self.__lock = RLock()  # Hooks may move the machine on their own
+        self.__state = initial
+        self.__transitions = dict(transitions)
+        self.__on_enter = dict(on_enter or {})  # state -> hook(old_state)
+        self.__on_exit = dict(on_exit or {})  # state -> hook(new_state)
+        self.trace = deque(maxlen=trace_len)
+
+    @property
+    def state(self):
+        return self.__state
+
+    def __lookup(self, event):
+        t = self.__transitions.get((self.__state, event))
+        if t is None:
+            t = self.__transitions.get((ANY_STATE, event))
+        return t
+
+    def fire(self, event, data=None):
+        # Run the transition of the event in the current state, returns
+        # the handler's result. Unexpected events are recorded and ignored
+        with self.__lock:
+            t = self.__lookup(event)
+            if t is None:
+                self.trace.append(TraceEntry(monotonic(), self.__state, event, None))
+                logging.debug("Event %s Ignored In State %s", event, self.__state)
+                return None
+        # Handlers may block (e.g. on a server reply), the lock is not held
+        result = t.handler(data) if t.handler is not None else None
+        if t.next_state is not None:
+            self.goto(t.next_state, event)
+        return result
+
+    def goto(self, new_state, event=None):
+        # Enter the state, running the exit hook of the current one and the
+        # entry hook of the new one (also when re-entering the same state)
+        with self.__lock:
+            old_state = self.__state
+            self.trace.append(TraceEntry(monotonic(), old_state, event, new_state))
+            logging.debug("State Has Changed %s -> %s (%s)", old_state, new_state, event)
+            hook = self.__on_exit.get(old_state)
+            if hook is not None:
+                hook(new_state)
+            self.__state = new_state
+            hook = self.__on_enter.get(new_state)
+            if hook is not None:
+                hook(old_state)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Client side model of the Sudoku board received in REP_TABLE. Cells are
+# kept in an array, digits used by each row, column and box in 9-bit masks
+# so a move is validated in O(1) before it is sent to the server.
+import re
+from array import array
+
+# Cell index -> row, column and box index, cell -> its 20 peers
+ROW_OF = tuple(i // 9 for i in range(81))
+COL_OF = tuple(i % 9 for i in range(81))
+BOX_OF = tuple((i // 27) * 3 + (i % 9) // 3 for i in range(81))
+PEERS = tuple(
+    tuple(
+        j
+        for j in range(81)
+        if j != i
+        and (ROW_OF[j] == ROW_OF[i] or COL_OF[j] == COL_OF[i] or BOX_OF[j] == BOX_OF[i])
+    )
+    for i in range(81)
+)
+# Units as cell index tuples: 9 rows, 9 columns, 9 boxes
+UNITS = (
+    tuple(tuple(c for c in range(81) if ROW_OF[c] == u) for u in range(9))
+    + tuple(tuple(c for c in range(81) if COL_OF[c] == u) for u in range(9))
+    + tuple(tuple(c for c in range(81) if BOX_OF[c] == u) for u in range(9))
+)
+# Digit -> its bit (0 is an empty cell), all the digits
+BIT = (0,) + tuple(1 << (d - 1) for d in range(1, 10))
+ALL_DIGITS = 0x1FF
+
+# Why a move can't be made
+MOVE_CELL_FULL = "cell full"
+MOVE_ROW_CLASH = "number already in the row"
+MOVE_COL_CLASH = "number already in the column"
+MOVE_BOX_CLASH = "number already in the box"
+
+_DIGITS = re.compile(r"\d")
+
+
+def cell_index(x, y):
+    # Column x and row y are in 1..9, as typed by the player
+    return (y - 1) * 9 + (x - 1)
+
+
+def parse_table(payload):
+    # 81 ints of the REP_TABLE payload, whatever the separators are
+    cells = [int(v) for v in _DIGITS.findall(payload)]
+    if len(cells) != 81:
+        raise ValueError("Table has {} cells instead of 81".format(len(cells)))
+    return cells
+
+
+class Board:
+    def __init__(self, cells=None):
+        self.cells = array("B", cells if cells is not None else bytes(81))
+        self.rows = array("H", bytes(18))
+        self.cols = array("H", bytes(18))
+        self.boxes = array("H", bytes(18))
+        for cell, value in enumerate(self.cells):
+            if value:
+                self.__mark(cell, BIT[value])
+
+    @classmethod
+    def from_table(cls, payload):
+        return cls(parse_table(payload))
+
+    def __mark(self, cell, bit):
+        self.rows[ROW_OF[cell]] |= bit
+        self.cols[COL_OF[cell]] |= bit
+        self.boxes[BOX_OF[cell]] |= bit
+
+    def __unmark(self, cell, bit):
+        self.rows[ROW_OF[cell]] &= ~bit
+        self.cols[COL_OF[cell]] &= ~bit
+        self.boxes[BOX_OF[cell]] &= ~bit
+
+    def used(self, cell):
+        # Mask of the digits already seen by the cell's peers
+        return self.rows[ROW_OF[cell]] | self.cols[COL_OF[cell]] | self.boxes[BOX_OF[cell]]
+
+    def check_move(self, x, y, nr):
+        # None if nr can be put to (x, y), the reason otherwise
+        cell = cell_index(x, y)
+        bit = BIT[nr]
+        if self.cells[cell]:
+            return MOVE_CELL_FULL
+        if self.rows[ROW_OF[cell]] & bit:
+            return MOVE_ROW_CLASH
+        if self.cols[COL_OF[cell]] & bit:
+            return MOVE_COL_CLASH
+        if self.boxes[BOX_OF[cell]] & bit:
+            return MOVE_BOX_CLASH
+        return None
+
+    def can_place(self, x, y, nr):
+        cell = cell_index(x, y)
+        return not self.cells[cell] and not self.used(cell) & BIT[nr]
+
+    def set_cell(self, cell, value):
+        # Overwrite the cell (0 clears it), keeping the masks in sync
+        old = self.cells[cell]
+        if old == value:
+            return
+        if old:
+            self.__unmark(cell, BIT[old])
+        self.cells[cell] = value
+        if value:
+            self.__mark(cell, BIT[value])
+
+    def place(self, x, y, nr):
+        self.set_cell(cell_index(x, y), nr)
+
+    def empty_cells(self):
+        return [cell for cell, value in enumerate(self.cells) if not value]
+
+    def is_complete(self):
+        return 0 not in self.cells
+
+    def __str__(self):
+        return "\n".join(
+            " ".join(str(v) for v in self.cells[r : r + 9]) for r in range(0, 81, 9)
+        )
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Hint engine on top of sudokuBoard. Candidates of every cell are kept as
+# 9-bit masks and updated incrementally when a number gets placed, along
+# with the per unit digit counts, so the naked/hidden singles and the next
+# best move are found without rescanning the board.
+from array import array
+from collections import namedtuple
+from sudokuBoard import ALL_DIGITS, BIT, BOX_OF, COL_OF, PEERS, ROW_OF, UNITS
+
+# Number of set bits of every 9-bit mask
+POPCOUNT = bytes(bin(m).count("1") for m in range(ALL_DIGITS + 1))
+# Units (row, column, box index into UNITS) each cell belongs to
+UNITS_OF = tuple((ROW_OF[c], 9 + COL_OF[c], 18 + BOX_OF[c]) for c in range(81))
+
+HINT_NAKED_SINGLE = "only number possible in the cell"
+HINT_HIDDEN_SINGLE = "only place for the number"
+HINT_FEWEST_CANDIDATES = "cell with the fewest candidates"
+
+# x, y, nr as the player types them, reason is one of the HINT_* above
+Hint = namedtuple("Hint", ["x", "y", "nr", "reason"])
+
+
+def digits_of(mask):
+    return [d for d in range(1, 10) if mask & BIT[d]]
+
+
+def _hint(cell, nr, reason):
+    return Hint(cell % 9 + 1, cell // 9 + 1, nr, reason)
+
+
+class HintEngine:
+    def __init__(self, board):
+        self.reset(board)
+
+    def reset(self, board):
+        # Full recompute, needed only for a board not derived from this one
+        self.__board = board
+        self.__values = array("B", board.cells)
+        self.candidates = array("H", bytes(162))
+        # How many cells of a unit (27) can still take a digit (9)
+        self.__counts = array("B", bytes(27 * 9))
+        self.__naked = set()  # Cells with a single candidate
+        self.__hidden = set()  # (unit, digit) with a single possible cell
+        for cell, value in enumerate(board.cells):
+            if not value:
+                mask = ALL_DIGITS & ~board.used(cell)
+                self.candidates[cell] = mask
+                for d in digits_of(mask):
+                    for u in UNITS_OF[cell]:
+                        self.__counts[u * 9 + d - 1] += 1
+                if POPCOUNT[mask] == 1:
+                    self.__naked.add(cell)
+        for u in range(27):
+            for d in range(1, 10):
+                if self.__counts[u * 9 + d - 1] == 1:
+                    self.__hidden.add((u, d))
+
+    def __remove(self, cell, bits):
+        # Drop candidate bits of a cell, keeping the counts and singles
+        mask = self.candidates[cell]
+        bits &= mask
+        if not bits:
+            return
+        mask &= ~bits
+        self.candidates[cell] = mask
+        if POPCOUNT[mask] == 1:
+            self.__naked.add(cell)
+        else:
+            self.__naked.discard(cell)
+        counts = self.__counts
+        for d in digits_of(bits):
+            for u in UNITS_OF[cell]:
+                i = u * 9 + d - 1
+                counts[i] -= 1
+                if counts[i] == 1:
+                    self.__hidden.add((u, d))
+                elif counts[i] == 0:
+                    self.__hidden.discard((u, d))
+
+    def place(self, cell, nr):
+        # A number got placed to the (previously empty) cell
+        self.__values[cell] = nr
+        self.__remove(cell, ALL_DIGITS)
+        self.__naked.discard(cell)
+        bit = BIT[nr]
+        for peer in PEERS[cell]:
+            if self.candidates[peer] & bit:
+                self.__remove(peer, bit)
+        for u in UNITS_OF[cell]:
+            self.__hidden.discard((u, nr))
+
+    def sync(self, board):
+        # Catch up with the board (a new table or moves made meanwhile).
+        # Newly filled cells are applied incrementally, anything else
+        # (cleared or changed cells) needs the full recompute
+        self.__board = board
+        old = self.__values
+        filled = []
+        for cell, value in enumerate(board.cells):
+            if value != old[cell]:
+                if old[cell]:
+                    self.reset(board)
+                    return
+                filled.append((cell, value))
+        for cell, value in filled:
+            self.place(cell, value)
+
+    def naked_singles(self):
+        # [(cell, nr)] for the cells that can take a single number only
+        return [(c, self.candidates[c].bit_length()) for c in self.__naked]
+
+    def __hidden_cell(self, unit, nr):
+        bit = BIT[nr]
+        for cell in UNITS[unit]:
+            if self.candidates[cell] & bit:
+                return cell
+        return None
+
+    def hidden_singles(self):
+        # [(cell, nr)] for the numbers having a single place in a unit
+        singles = []
+        for unit, nr in self.__hidden:
+            cell = self.__hidden_cell(unit, nr)
+            if cell is not None:
+                singles.append((cell, nr))
+        return singles
+
+    def next_best_move(self):
+        # Hint for the player, None if there's no empty cell left
+        for cell in self.__naked:
+            return _hint(cell, self.candidates[cell].bit_length(), HINT_NAKED_SINGLE)
+        for unit, nr in self.__hidden:
+            cell = self.__hidden_cell(unit, nr)
+            if cell is not None:
+                return _hint(cell, nr, HINT_HIDDEN_SINGLE)
+        best, best_count = None, 10
+        for cell in range(81):
+            count = POPCOUNT[self.candidates[cell]]
+            if 0 < count < best_count:
+                best, best_count = cell, count
+        if best is None:
+            return None
+        mask = self.candidates[best]
+        return _hint(best, (mask & -mask).bit_length(), HINT_FEWEST_CANDIDATES)
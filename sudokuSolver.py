@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Sudoku solver for the 81 int board format of REP_TABLE. Naked singles
+# are filled by bitmask constraint propagation, whatever is left is solved
+# as an exact cover problem (Knuth's Algorithm X over dict/set columns,
+# the Python counterpart of dancing links). solve_many spreads a stream of
+# puzzles over a process pool. As a script it reads puzzles line by line
+# and writes the solutions as they are found.
+import argparse
+import sys
+from multiprocessing import Pool
+from sudokuBoard import ALL_DIGITS, BIT, BOX_OF, COL_OF, ROW_OF, parse_table
+
+# Written instead of a solution when there's none
+UNSOLVABLE = "unsolvable"
+
+_EMPTY_CHARS = ".0"
+_DIGIT_CHARS = "123456789"
+
+
+def _constraints(cell, nr):
+    # Exact cover columns satisfied by putting nr to the cell: the cell is
+    # filled, and nr is in its row, column and box
+    d = nr - 1
+    return (
+        cell,
+        81 + ROW_OF[cell] * 9 + d,
+        162 + COL_OF[cell] * 9 + d,
+        243 + BOX_OF[cell] * 9 + d,
+    )
+
+
+def _propagate(cells):
+    # Fill the naked singles till there are none left. Returns the masks
+    # of the digits used in rows, columns and boxes, None on a contradiction
+    rows, cols, boxes = [0] * 9, [0] * 9, [0] * 9
+    for cell, value in enumerate(cells):
+        if value:
+            bit = BIT[value]
+            r, c, b = ROW_OF[cell], COL_OF[cell], BOX_OF[cell]
+            if (rows[r] | cols[c] | boxes[b]) & bit:
+                return None
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+    empty = [cell for cell in range(81) if not cells[cell]]
+    progress = True
+    while progress and empty:
+        progress = False
+        left = []
+        for cell in empty:
+            r, c, b = ROW_OF[cell], COL_OF[cell], BOX_OF[cell]
+            mask = ALL_DIGITS & ~(rows[r] | cols[c] | boxes[b])
+            if not mask:
+                return None
+            if mask & (mask - 1):
+                left.append(cell)
+                continue
+            cells[cell] = mask.bit_length()
+            rows[r] |= mask
+            cols[c] |= mask
+            boxes[b] |= mask
+            progress = True
+        empty = left
+    return rows, cols, boxes
+
+
+def _select(X, Y, row):
+    cols = []
+    for j in Y[row]:
+        for i in X[j]:
+            for k in Y[i]:
+                if k != j:
+                    X[k].discard(i)
+        cols.append(X.pop(j))
+    return cols
+
+
+def _deselect(X, Y, row, cols):
+    for j in reversed(Y[row]):
+        X[j] = cols.pop()
+        for i in X[j]:
+            for k in Y[i]:
+                if k != j:
+                    X[k].add(i)
+
+
+def _exact_cover(X, Y, solution):
+    if not X:
+        return True
+    # Column with the fewest rows, stopping early on a forced (or dead) one
+    col, fewest = None, 10
+    for j, rows in X.items():
+        if len(rows) < fewest:
+            col, fewest = j, len(rows)
+            if fewest <= 1:
+                break
+    for row in list(X[col]):
+        solution.append(row)
+        cols = _select(X, Y, row)
+        if _exact_cover(X, Y, solution):
+            return True
+        _deselect(X, Y, row, cols)
+        solution.pop()
+    return False
+
+
+def solve(cells):
+    # Solved copy of the 81 ints (0 is an empty cell), None if unsolvable
+    cells = list(cells)
+    masks = _propagate(cells)
+    if masks is None:
+        return None
+    rows, cols, boxes = masks
+    # Only the candidates still allowed by the masks become exact cover
+    # rows, only the unsatisfied constraints become columns
+    Y = {}
+    for cell in range(81):
+        if not cells[cell]:
+            used = rows[ROW_OF[cell]] | cols[COL_OF[cell]] | boxes[BOX_OF[cell]]
+            for nr in range(1, 10):
+                if not used & BIT[nr]:
+                    Y[(cell, nr)] = _constraints(cell, nr)
+    if not Y:
+        return cells
+    X = {}
+    for row, satisfies in Y.items():
+        for j in satisfies:
+            X.setdefault(j, set()).add(row)
+    # Every unsatisfied constraint must have at least one candidate
+    for cell in range(81):
+        if not cells[cell] and cell not in X:
+            return None
+    for u in range(9):
+        for d in range(9):
+            for base, masks_of in ((81, rows), (162, cols), (243, boxes)):
+                if not masks_of[u] & (1 << d) and base + u * 9 + d not in X:
+                    return None
+    solution = []
+    if not _exact_cover(X, Y, solution):
+        return None
+    for cell, nr in solution:
+        cells[cell] = nr
+    return cells
+
+
+def solve_table(payload):
+    # Solve the REP_TABLE payload
+    return solve(parse_table(payload))
+
+
+def parse_puzzle(line):
+    # 81 chars, digits with '0' or '.' for the empty cells. Other chars
+    # (separators) are skipped
+    cells = [
+        int(ch) if ch in _DIGIT_CHARS else 0
+        for ch in line
+        if ch in _DIGIT_CHARS or ch in _EMPTY_CHARS
+    ]
+    if len(cells) != 81:
+        raise ValueError("Puzzle has {} cells instead of 81".format(len(cells)))
+    return cells
+
+
+def solve_line(line):
+    # Puzzle line -> solution line
+    try:
+        solution = solve(parse_puzzle(line))
+    except ValueError:
+        return UNSOLVABLE
+    return UNSOLVABLE if solution is None else "".join(map(str, solution))
+
+
+def solve_many(lines, processes=None, chunksize=256):
+    # Solve a stream of puzzle lines on all the cores, yields the solution
+    # lines in the order of the puzzles. processes=1 solves in this process
+    if processes == 1:
+        for line in lines:
+            yield solve_line(line)
+        return
+    with Pool(processes) as pool:
+        for solution in pool.imap(solve_line, lines, chunksize):
+            yield solution
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve Sudoku puzzles, one per line")
+    parser.add_argument("input", nargs="?", type=argparse.FileType("r"),
+                        default=sys.stdin)
+    parser.add_argument("output", nargs="?", type=argparse.FileType("w"),
+                        default=sys.stdout)
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="worker processes, all cores by default")
+    parser.add_argument("--chunksize", type=int, default=256)
+    args = parser.parse_args()
+    puzzles = (line for line in args.input if line.strip())
+    for solution in solve_many(puzzles, args.processes, args.chunksize):
+        args.output.write(solution + "\n")
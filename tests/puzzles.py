@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+# Known puzzles of the tests, as sudokuSolver puzzle lines
+from sudokuSolver import parse_puzzle
+
+# Solvable with naked and hidden singles only
+EASY = "53..7....6..195....98....6.8...6...34..8.3..17...2...6.6....28....419..5....8..79"
+EASY_SOLUTION = "534678912672195348198342567859761423426853791713924856961537284287419635345286179"
+# Needs search
+HARD = "8..........36......7..9.2...5...7.......457.....1...3...1....68..85...1..9....4.."
+HARD_SOLUTION = "812753649943682175675491283154237896369845721287169534521974368438526917796318452"
+# Two 5s in the first row
+BROKEN = "55..7....6..195....98....6.8...6...34..8.3..17...2...6.6....28....419..5....8..79"
+
+
+def cells(line):
+    return parse_puzzle(line)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import pytest
+from binaryFraming import (
+    BINARY_HEADER,
+    BINARY_REQUEST_DECODERS,
+    MAX_PAYLOAD,
+    BinaryFrameDecoder,
+    binary_frame,
+    encode_binary_frame,
+    encode_binary_table,
+    encode_binary_table_delta,
+    pack_delta,
+    pack_move,
+    pack_table,
+    unpack_delta,
+    unpack_move,
+    unpack_table,
+)
+from messageCodec import (
+    TableDelta,
+    decode_reply,
+    encode,
+    encode_put_number,
+    encode_scores,
+    encode_table,
+    encode_table_delta,
+)
+from messageProtocol import *
+from puzzles import EASY, EASY_SOLUTION, cells
+
+
+def _decode_all(data, decoder=None):
+    decoder = decoder or BinaryFrameDecoder()
+    return [msg for msg, _ in decoder.feed(data)]
+
+
+def test_payloads_round_trip():
+    for line in (EASY, EASY_SOLUTION):
+        assert list(unpack_table(pack_table(cells(line)))) == cells(line)
+    assert unpack_move(pack_move(9, 1, 5)) == (9, 1, 5)
+    delta = TableDelta(70000, [(0, 1), (40, 0), (80, 9)])
+    assert unpack_delta(pack_delta(*delta)) == delta
+
+
+def test_frames_decode_like_text():
+    # Binary frames give the Messages the text frames decode to
+    text = [
+        encode_table(cells(EASY)),
+        encode_table_delta(3, [(10, 4), (11, 0)]),
+        encode_scores([("alice", 3), ("bob", 1)]),
+        encode(REP_NOTIFY, "bob put 3 at (1, 1)"),
+        encode(REP_PUT_NR, PUT_NR_SUCCESS),
+    ]
+    data = b"".join(bytes(encode_binary_frame(m)) for m in text)
+    assert _decode_all(data) == [decode_reply(m) for m in text]
+
+
+def test_direct_encoders_match():
+    table = cells(EASY)
+    assert encode_binary_table(table) == encode_binary_frame(encode_table(table))
+    assert encode_binary_table_delta(2, [(5, 6)]) == encode_binary_frame(
+        encode_table_delta(2, [(5, 6)])
+    )
+
+
+def test_partial_frames():
+    data = bytes(encode_binary_frame(encode_table(cells(EASY)))) * 2
+    decoder = BinaryFrameDecoder()
+    received = []
+    for i in range(len(data)):
+        received += _decode_all(data[i : i + 1], decoder)
+        if len(received) == 0:
+            assert decoder.pending() == i + 1
+    assert len(received) == 2 and received[0].data == cells(EASY)
+    assert decoder.pending() == 0
+
+
+def test_requests():
+    data = bytes(encode_binary_frame(encode_put_number(3, 4, 5)))
+    assert len(data) == BINARY_HEADER.size + 2
+    msgs = _decode_all(data, BinaryFrameDecoder(BINARY_REQUEST_DECODERS))
+    assert msgs[0].payload == "345" and msgs[0].data == (3, 4, 5)
+
+
+def test_bad_payloads():
+    assert _decode_all(bytes(binary_frame(REP_TABLE, b"\x12")))[0].data is None
+    msg = _decode_all(bytes(binary_frame("z", b"hi")))[0]
+    assert msg.header == "z" and msg.payload == "hi" and msg.data is None
+    with pytest.raises(ValueError):
+        binary_frame(REP_NOTIFY, bytes(MAX_PAYLOAD + 1))
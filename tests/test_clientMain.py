@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Clients playing through game_loop against an in-process stand-in server
+import socket
+import time
+from threading import Thread
+import pytest
+from clientIO import ScriptedSyncIO
+from clientMain import Client
+from clientTransport import TransportConfig
+from standInServer import StandInServer
+from sudokuSolver import solve
+
+S = Client._Client__gm_states
+E = Client._Client__gm_events
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+def state(client):
+    trace = client.state_trace()
+    return trace[-1].new_state if trace else S.NEED_NAME
+
+
+@pytest.fixture
+def server(request):
+    # Games of a single empty cell unless parametrized with more
+    srv = StandInServer(port=0, seed=5, holes=getattr(request, "param", 1))
+    srv.start_in_thread()
+    yield srv
+    srv.stop_thread()
+
+
+@pytest.fixture
+def play(server):
+    # Start game_loop clients with their scripts, stopped at the end
+    started = []
+
+    def start(*script, **options):
+        io = ScriptedSyncIO(list(script))
+        client = Client(io, **options)
+        loop = Thread(target=client.game_loop)
+        loop.start()
+        started.append((io, client, loop))
+        return io, client
+
+    yield start
+    for io, client, loop in started:
+        io.feed("Q")
+    for io, client, loop in started:
+        # Clients not reading input (waiting for players) stop with this
+        client.stop()
+        loop.join(5)
+        assert not loop.is_alive()
+
+
+def _address(server):
+    return "127.0.0.1:{}".format(server.port)
+
+
+def _start_game(server, play, **options):
+    alice = play("alice", _address(server), "c", "2", "g1", **options)
+    wait_for(lambda: state(alice[1]) == S.WAIT_FOR_PLAYERS)
+    bob = play("bob", _address(server), "j", "g1", **options)
+    wait_for(lambda: state(alice[1]) == S.NEED_PUTNUMBER)
+    wait_for(lambda: state(bob[1]) == S.NEED_PUTNUMBER)
+    return alice, bob
+
+
+def _finish(io, client):
+    # Fill the single empty cell of the game
+    board = client._Client__board
+    cell = board.empty_cells()[0]
+    io.feed("{}{}{}".format(cell % 9 + 1, cell // 9 + 1, solve(list(board.cells))[cell]))
+
+
+def test_game_over_while_waiting_for_input(server, play):
+    (alice_io, alice), (bob_io, bob) = _start_game(server, play)
+    _finish(alice_io, alice)
+    # Bob typed nothing, the game over still takes him to the sessions
+    wait_for(lambda: state(bob) == S.NEED_SESSION)
+    wait_for(lambda: "[c]reate" in bob_io.outputs[-1])
+    bob_io.feed("c")
+    wait_for(lambda: bob_io.outputs[-1] == "How many people are playing?")
+
+
+def test_input_after_game_over_goes_to_the_sessions(server, play):
+    (alice_io, alice), (bob_io, bob) = _start_game(server, play)
+    _finish(alice_io, alice)
+    wait_for(lambda: state(alice) == S.NEED_SESSION)
+    # Input typed after the game ended goes to the session prompt
+    alice_io.feed("l")
+    wait_for(lambda: any("Open Sessions" in o for o in alice_io.outputs))
+    assert state(alice) == S.NEED_SESSION
+
+
+def test_game_states(server, play):
+    (alice_io, alice), (bob_io, bob) = _start_game(server, play)
+    _finish(alice_io, alice)
+    wait_for(lambda: state(bob) == S.NEED_SESSION)
+    assert [e.new_state for e in alice.state_trace()] == [
+        S.NOTCONNECTED, S.NEED_SESSION, S.WAIT_FOR_PLAYERS, S.NEED_PUTNUMBER, S.NEED_SESSION,
+    ]
+    # The game start and end came from the server, as events
+    assert [e.event for e in bob.state_trace()][-2:] == [E.TABLE_RECEIVED, E.GAME_OVER]
+
+
+def test_joining_an_unlisted_session(server, play):
+    bob_io, bob = play("bob", _address(server))
+    wait_for(lambda: state(bob) == S.NEED_SESSION)
+    # Created after bob got the sessions list, its size is unknown to him
+    alice_io, alice = play("alice", _address(server), "c", "3", "g1")
+    wait_for(lambda: state(alice) == S.WAIT_FOR_PLAYERS)
+    bob_io.feed("j")
+    bob_io.feed("g1")
+    wait_for(lambda: state(bob) == S.WAIT_FOR_PLAYERS)
+    assert "g1" not in bob.sessions
+    assert bob._Client__can_join("g1")
+
+
+def _table_updates(client):
+    return [n for n in client.poll_notifications() if n.startswith("Table Updated")]
+
+
+@pytest.mark.parametrize("server", [3], indirect=True)
+def test_own_moves_are_not_shown_as_table_updates(server, play):
+    (alice_io, alice), (bob_io, bob) = _start_game(server, play, table_deltas=True)
+    assert alice.table_deltas and bob.table_deltas
+    _finish(alice_io, alice)
+    wait_for(lambda: alice._Client__board_version == 1 and bob._Client__board_version == 1)
+    assert _table_updates(alice) == []
+    assert len(_table_updates(bob)) == 1
+
+
+def test_input_for_a_left_state_is_dropped():
+    io = ScriptedSyncIO()
+    client = Client(io)
+    run_event = client._Client__run_event
+    # Typed while asked for the server address, the state has not changed
+    assert run_event(E.USER_INPUT, "alice", S.NOTCONNECTED)
+    assert client.state_trace() == []
+    assert run_event(E.USER_INPUT, "alice", S.NEED_NAME)
+    assert state(client) == S.NOTCONNECTED
+    assert not run_event(None, None, None)
+    client.stop()
+
+
+def _old_server(listener):
+    # Answers the nickname only, REQ_CAPABILITIES goes unanswered
+    conn, _ = listener.accept()
+    with conn:
+        buf = b""
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                return
+            buf += data
+            while b"#" in buf:
+                frame, _, buf = buf.partition(b"#")
+                if frame.startswith(b"a:"):
+                    conn.sendall(b"0:#")
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_unanswered_capabilities_keep_the_connection(binary):
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    Thread(target=_old_server, args=(listener,), daemon=True).start()
+    client = Client(ScriptedSyncIO(), transport=TransportConfig(response_timeout=1.0),
+                    binary=binary, table_deltas=True)
+    try:
+        client.set_user_name("alice")
+        client.get_connected("127.0.0.1:{}".format(listener.getsockname()[1]))
+        assert state(client) == S.NEED_SESSION
+        assert not client.table_deltas and not client.binary_framing
+        assert client.network_thread.is_alive()
+    finally:
+        client.stop()
+        listener.close()
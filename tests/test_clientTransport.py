@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import pytest
+from clientTransport import (
+    DEFAULT_PORT,
+    ReconnectPolicy,
+    backoff_delays,
+    parse_address,
+    timeout_seconds,
+)
+
+
+def test_parse_address():
+    assert parse_address("localhost") == ("localhost", DEFAULT_PORT)
+    assert parse_address(" 10.0.0.1:8000 ") == ("10.0.0.1", 8000)
+    assert parse_address("[::1]:8000") == ("::1", 8000)
+    assert parse_address("[::1]") == ("::1", DEFAULT_PORT)
+    assert parse_address("::1") == ("::1", DEFAULT_PORT)
+    assert parse_address("host:", 9) == ("host", 9)
+
+
+@pytest.mark.parametrize("address", ["", ":8000", "[]:8000", "host:0", "host:65536", "host:x"])
+def test_bad_addresses(address):
+    with pytest.raises(ValueError):
+        parse_address(address)
+
+
+class _Low:
+    # Jitter taking the most off
+    def uniform(self, a, b):
+        return a
+
+
+def test_backoff_delays():
+    policy = ReconnectPolicy(max_attempts=5, initial_delay=1.0, max_delay=3.0, factor=2.0)
+    assert list(backoff_delays(policy, _Low())) == [0.0, 0.5, 1.0, 1.5, 1.5]
+
+
+def test_timeout_seconds():
+    assert timeout_seconds("2.5") == 2.5
+    assert timeout_seconds("0") is None and timeout_seconds("-1") is None
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import pytest
+from gameHistory import HISTORY_MAGIC, GameHistory, ranks
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "games.hist")
+
+
+def test_ranks_share_equal_scores():
+    assert ranks([("a", 3), ("b", 5), ("c", 3), ("d", -1)]) == [2, 1, 2, 4]
+
+
+def test_records_and_stats(path):
+    h = GameHistory(path)
+    assert h.append_game("s1", [("alice", 5), ("bob", 2)], 12.5, moves=4, ended=100.0) == 0
+    assert h.append_game("s2", [("bob", 7), ("alice", 1)], 3.0, ended=200.0) == 1
+    records = list(h.iter_records())
+    assert [(r.game, r.session, r.player, r.score, r.rank) for r in records] == [
+        (0, "s1", "alice", 5, 1), (0, "s1", "bob", 2, 2),
+        (1, "s2", "bob", 7, 1), (1, "s2", "alice", 1, 2),
+    ]
+    assert records[0].duration == 12.5 and records[0].moves == 4 and records[0].players == 2
+    alice = h.player("alice")
+    assert (alice.games, alice.wins, alice.win_rate, alice.mean_score, alice.best_score) == (
+        2, 1, 0.5, 3.0, 5
+    )
+    assert h.player("carol") is None
+    assert [s.name for s in h.leaderboard(key="best_score")] == ["bob", "alice"]
+    assert h.leaderboard(min_games=3) == []
+    with pytest.raises(ValueError):
+        h.leaderboard(key="luck")
+    h.close()
+
+
+def test_reopened_and_shared(path):
+    writer = GameHistory(path)
+    writer.append_game("s1", [("alice", 1)], 1.0)
+    other = GameHistory(path)
+    other.append_game("s2", [("bob", 2), ("alice", 2)], 1.0)
+    # The first writer catches up before appending, the game ids go on
+    assert writer.append_game("s3", [("carol", 0)], 1.0) == 2
+    reader = GameHistory(path, readonly=True)
+    assert reader.games == 3 and reader.records == 4
+    assert reader.player("alice").wins == 2
+    with pytest.raises(ValueError):
+        reader.append_game("s4", [("dave", 1)], 1.0)
+    other.refresh()
+    assert other.player("carol").games == 1
+    for h in (writer, other, reader):
+        h.close()
+
+
+def test_torn_writes_are_dropped(path):
+    h = GameHistory(path)
+    h.append_game("s1", [("alice", 1)], 1.0)
+    h.close()
+    with open(path, "ab") as f:
+        f.write(b"\0" * 7)
+    with open(path + ".names", "ab") as f:
+        f.write(b"half a na")
+    h = GameHistory(path)
+    assert h.records == 1
+    h.append_game("s2", [("bob", 1)], 1.0)
+    assert [r.player for r in h.iter_records()] == ["alice", "bob"]
+    h.close()
+
+
+def test_not_a_history(path):
+    with open(path, "wb") as f:
+        f.write(b"something else")
+    with pytest.raises(ValueError):
+        GameHistory(path, readonly=True)
+
+
+def test_bad_games(path):
+    h = GameHistory(path)
+    with pytest.raises(ValueError):
+        h.append_game("s1", [("alice", 2**31)], 1.0)
+    assert h.games == 0 and os.path.getsize(path) == len(HISTORY_MAGIC)
+    h.close()
+
+
+def test_export(path):
+    h = GameHistory(path)
+    h.append_game("s1", [("alice", 5), ("bob", 2)], 1.0, ended=100.0)
+    out = io.StringIO()
+    assert h.export(out, "csv") == 2
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith("game,session,ended") and lines[1].startswith("0,s1,100.0")
+    out = io.StringIO()
+    assert h.export(out, "jsonl") == 2
+    assert json.loads(out.getvalue().splitlines()[1])["player"] == "bob"
+    h.close()
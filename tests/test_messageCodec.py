@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from messageCodec import (
+    SessionInfo,
+    TableDelta,
+    decode_reply,
+    decode_request,
+    encode,
+    encode_capabilities,
+    encode_join_session,
+    encode_nickname,
+    encode_players,
+    encode_put_number,
+    encode_scores,
+    encode_sessions,
+    encode_table,
+    encode_table_delta,
+    is_move_notification,
+)
+from messageProtocol import *
+from puzzles import EASY, cells
+
+
+def test_requests_round_trip():
+    assert decode_request(encode_nickname("alice")).data == "alice"
+    assert decode_request(encode_join_session("s1")).data == "s1"
+    msg = decode_request(encode_join_session("s1", 3))
+    assert msg.header == REQ_JOIN_NEW_SESS and msg.data == ("s1", 3)
+    assert decode_request(encode_put_number(2, 1, 3)).data == (2, 1, 3)
+    assert decode_request(encode_capabilities([CAP_BINARY, CAP_DELTA])).data == [
+        CAP_BINARY, CAP_DELTA,
+    ]
+
+
+def test_replies_round_trip():
+    sessions = [SessionInfo("s1", 1, 2), SessionInfo("my-game", 3, 4)]
+    assert decode_reply(encode_sessions(sessions)).data == sessions
+    assert decode_reply(encode_players(["alice", "bob"])).data == ["alice", "bob"]
+    scores = [("alice", 12), ("bob", -3)]
+    assert decode_reply(encode_scores(scores)).data == scores
+    table = cells(EASY)
+    assert decode_reply(encode_table(table)).data == table
+    delta = TableDelta(7, [(0, 5), (80, 0)])
+    assert decode_reply(encode_table_delta(*delta)).data == delta
+    caps = encode_capabilities([CAP_DELTA], REP_CAPABILITIES)
+    assert decode_reply(caps).data == [CAP_DELTA]
+
+
+def test_payload_kept_as_sent():
+    msg = decode_reply(encode(REP_NOTIFY, "bob put 3 at (1, 1)"))
+    assert msg == (REP_NOTIFY, "bob put 3 at (1, 1)", "bob put 3 at (1, 1)")
+
+
+def test_malformed_payload_has_no_data():
+    assert decode_reply(encode(REP_TABLE_DELTA, "x|119")).data is None
+    assert decode_reply(encode(REP_TABLE_DELTA, "3|019")).data is None
+    assert decode_reply(encode(REP_SCORES_GAME_OVER, "alice|many")).data is None
+    assert decode_request(encode(REQ_PUT_NR, "12")).data is None
+    assert decode_reply(encode(REP_TABLE, "1 2 3")).data is None
+
+
+def test_unknown_header_and_missing_separator():
+    msg = decode_reply("z:whatever")
+    assert msg.header == "z" and msg.payload == "whatever" and msg.data is None
+    assert decode_reply("") is None
+    assert decode_reply("5") is None
+    assert decode_reply("5-1 2") is None
+
+
+def test_move_notifications():
+    assert is_move_notification("bob put 3 at (1, 2)")
+    assert not is_move_notification("bob joined the session")
+    assert not is_move_notification("bob put 0 at (1, 2)")
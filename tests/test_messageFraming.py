@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from messageFraming import FrameDecoder, encode_frame
+from messageProtocol import MSG_TERMCHR
+
+
+def test_frames_split():
+    decoder = FrameDecoder()
+    data = encode_frame("0:s1/1/2") + encode_frame("6:bob joined") + b"5:1"
+    assert decoder.feed(data) == ["0:s1/1/2", "6:bob joined"]
+    assert decoder.pending() == 3
+    assert decoder.feed(MSG_TERMCHR.encode()) == ["5:1"]
+    assert decoder.pending() == 0
+
+
+def test_partial_utf8():
+    # A multi-byte char cut between the reads is decoded once complete
+    data = encode_frame("6:Élodie joined") + encode_frame("6:añadido")
+    decoder = FrameDecoder()
+    received = []
+    for i in range(len(data)):
+        received += decoder.feed(data[i : i + 1])
+    assert received == ["6:Élodie joined", "6:añadido"]
+    cut = data.index("ñ".encode()) + 1
+    decoder = FrameDecoder()
+    assert decoder.feed(data[:cut]) == ["6:Élodie joined"]
+    assert decoder.feed(data[cut:]) == ["6:añadido"]
+
+
+def test_empty_frames_and_reset():
+    decoder = FrameDecoder()
+    assert decoder.feed(b"##") == ["", ""]
+    assert decoder.feed(b"3:Succ") == []
+    decoder.reset()
+    assert decoder.pending() == 0
+    assert decoder.feed(encode_frame("3:Success")) == ["3:Success"]
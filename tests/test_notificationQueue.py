@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from threading import Thread
+import pytest
+from notificationQueue import OVERFLOW_COALESCE, NotificationQueue
+
+
+def test_drop_oldest():
+    q = NotificationQueue(3)
+    for i in range(5):
+        q.put(i, key="k")
+    assert q.dropped == 2 and q.coalesced == 0
+    assert q.get_batch() == [2, 3, 4]
+
+
+def test_coalesce_keyed_only_on_overflow():
+    q = NotificationQueue(3, OVERFLOW_COALESCE)
+    q.put("board 1", key="board")
+    q.put("bob joined")
+    q.put("board 2", key="board")
+    assert len(q) == 3
+    # Full: the latest board update gives way, the others stay in order
+    q.put("board 3", key="board")
+    assert q.coalesced == 1 and q.dropped == 0
+    # Without a key the oldest is dropped
+    q.put("alice left")
+    assert q.dropped == 1
+    assert q.get_batch() == ["bob joined", "board 3", "alice left"]
+
+
+def test_coalesce_after_the_keyed_left():
+    q = NotificationQueue(2, OVERFLOW_COALESCE)
+    q.put("board 1", key="board")
+    q.put("x")
+    q.put("y")  # Drops board 1, the key is no longer queued
+    q.put("board 2", key="board")
+    assert q.dropped == 2 and q.coalesced == 0
+    assert q.get_batch() == ["y", "board 2"]
+
+
+def test_batches():
+    q = NotificationQueue()
+    assert q.get_batch(block=False) == []
+    for i in range(5):
+        q.put(i)
+    assert q.get_batch(max_batch=2) == [0, 1]
+    assert q.get_batch() == [2, 3, 4]
+
+
+def test_close_wakes_the_consumer():
+    q = NotificationQueue()
+    got = []
+    consumer = Thread(target=lambda: got.append(q.get_batch()))
+    consumer.start()
+    q.close()
+    consumer.join(5)
+    assert got == [None]
+    q.put("late")
+    assert q.get_batch() is None
+
+
+def test_bad_arguments():
+    for maxlen in (0, -1):
+        with pytest.raises(ValueError):
+            NotificationQueue(maxlen)
+    with pytest.raises(ValueError):
+        NotificationQueue(overflow="block")
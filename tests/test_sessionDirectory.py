@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from messageCodec import SessionInfo
+from sessionDirectory import SessionDirectory, free_seats
+
+
+def _names(sessions):
+    return [s.name for s in sessions]
+
+
+def test_update_applies_changes():
+    d = SessionDirectory([SessionInfo("s1", 1, 2), SessionInfo("s2", 1, 4)])
+    assert len(d) == 2 and "s1" in d
+    counts = d.update([SessionInfo("s2", 2, 4), SessionInfo("s3", 0, 3)])
+    assert counts == (1, 1, 1)
+    assert "s1" not in d and d.get("s2").players == 2
+    assert d.update([SessionInfo("s2", 2, 4), SessionInfo("s3", 0, 3)]) == (0, 0, 0)
+
+
+def test_prefix_search():
+    d = SessionDirectory(SessionInfo(name, 0, 2) for name in ["beta", "alpha", "alps", "al"])
+    assert _names(d.with_prefix("al")) == ["al", "alpha", "alps"]
+    assert _names(d.with_prefix("alp")) == ["alpha", "alps"]
+    assert d.with_prefix("c") == []
+    d.discard("alpha")
+    d.discard("missing")
+    d.put(SessionInfo("alto", 0, 2))
+    assert _names(d.with_prefix("al")) == ["al", "alps", "alto"]
+
+
+def test_open_sessions_closest_to_starting_first():
+    d = SessionDirectory([
+        SessionInfo("full", 3, 3),
+        SessionInfo("b", 1, 4),
+        SessionInfo("a", 2, 4),
+        SessionInfo("d", 3, 4),
+        SessionInfo("c", 1, 2),
+    ])
+    assert free_seats(d.get("b")) == 3
+    # Fewest free seats first, then by name
+    assert _names(d.open_sessions()) == ["c", "d", "a", "b"]
+    assert _names(d.open_sessions(min_free=2)) == ["a", "b"]
+    assert d.best_open().name == "c"
+    assert d.best_open(exclude={"c", "d", "a"}).name == "b"
+    assert d.best_open(exclude={"a", "b", "c", "d"}) is None
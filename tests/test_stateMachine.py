@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from stateMachine import ANY_STATE, StateMachine, Transition
+
+
+def _machine(calls):
+    transitions = {
+        ("idle", "start"): Transition(lambda data: calls.append(("start", data)), "running"),
+        ("running", "stop"): Transition(None, "idle"),
+        ("running", "tick"): Transition(lambda data: data * 2, None),
+        (ANY_STATE, "reset"): Transition(None, "idle"),
+    }
+    on_enter = {"running": lambda old: calls.append(("enter", old))}
+    on_exit = {"running": lambda new: calls.append(("exit", new))}
+    return StateMachine("idle", transitions, on_enter, on_exit, trace_len=4)
+
+
+def test_transitions_and_hooks():
+    calls = []
+    fsm = _machine(calls)
+    fsm.fire("start", 1)
+    assert fsm.state == "running"
+    assert calls == [("start", 1), ("enter", "idle")]
+    # No next state, the handler result is returned
+    assert fsm.fire("tick", 21) == 42 and fsm.state == "running"
+    fsm.fire("reset")
+    assert fsm.state == "idle" and calls[-1] == ("exit", "idle")
+
+
+def test_unexpected_events_are_traced_and_ignored():
+    fsm = _machine([])
+    assert fsm.fire("stop") is None
+    assert fsm.state == "idle"
+    assert [(e.old_state, e.event, e.new_state) for e in fsm.trace] == [("idle", "stop", None)]
+
+
+def test_trace_is_bounded():
+    fsm = _machine([])
+    for _ in range(3):
+        fsm.fire("start")
+        fsm.fire("stop")
+    assert [(e.old_state, e.new_state) for e in fsm.trace] == [
+        ("idle", "running"), ("running", "idle"), ("idle", "running"), ("running", "idle"),
+    ]
+    fsm.goto("idle")
+    assert fsm.trace[-1].event is None and len(fsm.trace) == 4
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from sudokuBoard import Board, cell_index
+from sudokuHints import (
+    HINT_FEWEST_CANDIDATES,
+    HINT_HIDDEN_SINGLE,
+    HINT_NAKED_SINGLE,
+    HintEngine,
+    digits_of,
+)
+from puzzles import EASY, EASY_SOLUTION, HARD, HARD_SOLUTION, cells
+
+
+def _candidates(board):
+    # Brute force candidates of every cell
+    return [
+        [] if board.cells[c] else
+        [nr for nr in range(1, 10) if board.can_place(c % 9 + 1, c // 9 + 1, nr)]
+        for c in range(81)
+    ]
+
+
+def test_candidates_match_the_rules():
+    for line in (EASY, HARD):
+        board = Board(cells(line))
+        hints = HintEngine(board)
+        assert [digits_of(m) for m in hints.candidates] == _candidates(board)
+
+
+def test_singles_agree_with_the_solution():
+    solution = cells(EASY_SOLUTION)
+    hints = HintEngine(Board(cells(EASY)))
+    singles = hints.naked_singles() + hints.hidden_singles()
+    assert len(singles) > 0
+    for cell, nr in singles:
+        assert solution[cell] == nr
+
+
+def test_following_the_hints_solves_an_easy_puzzle():
+    solution = cells(EASY_SOLUTION)
+    board = Board(cells(EASY))
+    hints = HintEngine(board)
+    while True:
+        hint = hints.next_best_move()
+        if hint is None:
+            break
+        assert hint.reason in (HINT_NAKED_SINGLE, HINT_HIDDEN_SINGLE)
+        cell = cell_index(hint.x, hint.y)
+        assert solution[cell] == hint.nr
+        board.set_cell(cell, hint.nr)
+        hints.place(cell, hint.nr)
+    assert list(board.cells) == solution
+
+
+def test_hard_puzzle_falls_back_to_fewest_candidates():
+    hint = HintEngine(Board(cells(HARD))).next_best_move()
+    assert hint.reason == HINT_FEWEST_CANDIDATES
+
+
+def test_sync_matches_a_fresh_engine():
+    solution = cells(HARD_SOLUTION)
+    board = Board(cells(HARD))
+    hints = HintEngine(board)
+    # Moves made by others arrive as a new table
+    newer = list(board.cells)
+    for cell in range(0, 81, 7):
+        newer[cell] = solution[cell]
+    hints.sync(Board(newer))
+    assert list(hints.candidates) == list(HintEngine(Board(newer)).candidates)
+    # A different game needs the full recompute
+    other = Board(cells(EASY))
+    hints.sync(other)
+    assert list(hints.candidates) == list(HintEngine(other).candidates)
+    assert hints.next_best_move() == HintEngine(other).next_best_move()
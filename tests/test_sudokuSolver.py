@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pytest
+from messageCodec import format_table
+from sudokuSolver import (
+    UNSOLVABLE,
+    parse_puzzle,
+    solve,
+    solve_line,
+    solve_many,
+    solve_table,
+)
+from puzzles import BROKEN, EASY, EASY_SOLUTION, HARD, HARD_SOLUTION, cells
+
+
+@pytest.mark.parametrize("puzzle, solution", [(EASY, EASY_SOLUTION), (HARD, HARD_SOLUTION)])
+def test_known_puzzles(puzzle, solution):
+    assert solve(cells(puzzle)) == cells(solution)
+    assert solve_line(puzzle) == solution
+
+
+def test_solved_and_broken():
+    assert solve(cells(EASY_SOLUTION)) == cells(EASY_SOLUTION)
+    assert solve(cells(BROKEN)) is None
+    assert solve_line(BROKEN) == UNSOLVABLE
+    assert solve_line("123") == UNSOLVABLE
+
+
+def test_input_left_alone():
+    puzzle = cells(EASY)
+    solve(puzzle)
+    assert puzzle == cells(EASY)
+
+
+def test_table_payload():
+    assert solve_table(format_table(cells(EASY))) == cells(EASY_SOLUTION)
+
+
+def test_parse_puzzle():
+    assert parse_puzzle(EASY.replace(".", "0")) == cells(EASY)
+    spaced = " ".join(EASY[i : i + 9] for i in range(0, 81, 9))
+    assert parse_puzzle(spaced) == cells(EASY)
+    with pytest.raises(ValueError):
+        parse_puzzle(EASY[:80])
+
+
+def test_solve_many_in_order():
+    lines = [EASY, BROKEN, HARD]
+    assert list(solve_many(lines, processes=1)) == [EASY_SOLUTION, UNSOLVABLE, HARD_SOLUTION]
@@ -1,22 +1,125 @@
+import argparse
+import atexit
+import json
 import logging
+import os
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+
+# All the module loggers hang under this one, which holds the only handler
+LOGGER_ROOT = "sudoku"
+# Environment overrides of the logging defaults
+LOG_LEVEL_ENV = "SUDOKU_LOG_LEVEL"
+LOG_FILE_ENV = "SUDOKU_LOG_FILE"
+LOG_FORMAT_ENV = "SUDOKU_LOG_FORMAT"  # text or json
+LOG_MAX_BYTES_ENV = "SUDOKU_LOG_MAX_BYTES"  # rotate past this size, 0 = never
+
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_LOG_FILE = "client.log"
+LOG_FORMATS = ("text", "json")
+LOG_BACKUPS = 3
+
+_TEXT_FORMAT = "%(levelname)s : %(asctime)s (%(threadName)-2s) %(message)s"
+
+# Background writer of the log records, None till configured
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    # One JSON object per record, easy to load or grep by field
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(level=None, path=None, fmt=None, max_bytes=None):
+    # (Re)configure the logging pipeline. Loggers only put the records to a
+    # queue, the disk is written by the listener's background thread so the
+    # network thread never waits on file I/O. Arguments left None come from
+    # the environment, then the defaults
+    global _listener
+    level = level or os.environ.get(LOG_LEVEL_ENV, DEFAULT_LOG_LEVEL)
+    path = path or os.environ.get(LOG_FILE_ENV, DEFAULT_LOG_FILE)
+    fmt = fmt or os.environ.get(LOG_FORMAT_ENV, "text")
+    if max_bytes is None:
+        max_bytes = int(os.environ.get(LOG_MAX_BYTES_ENV, "0"))
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+    if max_bytes > 0:
+        f_handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=LOG_BACKUPS, delay=True
+        )
+    else:
+        f_handler = logging.FileHandler(path, delay=True)
+    if fmt == "json":
+        f_handler.setFormatter(JsonLinesFormatter())
+    else:
+        f_handler.setFormatter(logging.Formatter(_TEXT_FORMAT))
+    records = SimpleQueue()
+    _listener = QueueListener(records, f_handler)
+    _listener.start()
+    root = logging.getLogger(LOGGER_ROOT)
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+
+
+def _stop_logging():
+    # Flush what's still queued when the interpreter exits
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_logging)
+
+
+def add_logging_arguments(parser):
+    # Command line switches overriding the logging environment
+    parser.add_argument("--log-level", default=None,
+                        help="DEBUG, INFO, WARNING or ERROR (${})".format(LOG_LEVEL_ENV))
+    parser.add_argument("--log-file", default=None,
+                        help="log file (${})".format(LOG_FILE_ENV))
+    parser.add_argument("--log-format", default=None, choices=LOG_FORMATS,
+                        help="text or JSON lines (${})".format(LOG_FORMAT_ENV))
+    parser.add_argument("--log-max-bytes", type=int, default=None,
+                        help="rotate the log past this size (${})".format(LOG_MAX_BYTES_ENV))
+
+
+def configure_logging_from_args(args):
+    configure_logging(args.log_level, args.log_file, args.log_format, args.log_max_bytes)
+
+
+def positive_int(text):
+    # argparse type of the options needing at least 1
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("{} is not an integer".format(text))
+    if value < 1:
+        raise argparse.ArgumentTypeError("{} is not positive".format(value))
+    return value
 
 
 def getmylogger(name):
-    # Create a custom logger
-    logger = logging.getLogger(name)
-    # Create handler
-    f_handler = logging.FileHandler('client.log')
-    f_handler.setLevel(logging.DEBUG)
-    # Create formatter and add it to handler 
-    f_format = logging.Formatter("%(levelname)s : %(asctime)s (%(threadName)-2s) %(message)s")
-    f_handler.setFormatter(f_format)
-    # Add handler to the logger
-    logger.addHandler(f_handler)
-    logger.setLevel(logging.DEBUG)
-    return logger
+    # Logger of a module. The shared handler is set up on the first call,
+    # so calling this any number of times adds no handlers
+    if _listener is None:
+        configure_logging()
+    return logging.getLogger("{}.{}".format(LOGGER_ROOT, name))
 
 
 # Create a custom enum generator for further usage
 def enum(**enums):
     return type('Enum', (), enums)
-
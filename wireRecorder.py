@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Append-only capture of the client's wire traffic. Every chunk received
+# from and every frame sent to the server is stored as a record of
+# (monotonic ns, direction, length) followed by the raw bytes, so a capture
+# reproduces the original read boundaries and timing when replayed. New
+# connections are marked by an empty WIRE_CONNECT record.
+import struct
+from threading import Lock
+from time import monotonic_ns
+
+CAPTURE_MAGIC = b"SUDWIRE1"
+WIRE_IN = 0  # Received from the server
+WIRE_OUT = 1  # Sent to the server
+WIRE_CONNECT = 2  # (Re)connected, the framing starts over
+
+_RECORD = struct.Struct("<QBI")
+
+
+class WireRecorder:
+    def __init__(self, path):
+        # New captures start with the magic, existing ones are appended to
+        self.__lock = Lock()  # Network and game threads both record
+        self.__f = open(path, "ab")
+        if self.__f.tell() == 0:
+            self.__f.write(CAPTURE_MAGIC)
+        self.records = 0
+
+    def record(self, direction, data):
+        header = _RECORD.pack(monotonic_ns(), direction, len(data))
+        with self.__lock:
+            if self.__f is None:
+                return
+            self.__f.write(header)
+            self.__f.write(data)
+            self.records += 1
+
+    def flush(self):
+        with self.__lock:
+            if self.__f is not None:
+                self.__f.flush()
+
+    def close(self):
+        with self.__lock:
+            if self.__f is not None:
+                self.__f.close()
+                self.__f = None
+
+
+def read_records(path):
+    # Yield the (monotonic ns, direction, bytes) records of a capture. A
+    # record cut short (capture still being written) ends the iteration
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("{} is not a wire capture".format(path))
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            t_ns, direction, length = _RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield t_ns, direction, data
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Offline replay of a wire capture (see wireRecorder). The received chunks
+# go through the client's framing, dispatch and state machine exactly as
+# read from the socket, the captured requests are tracked as sent so their
+# replies are handled like live ones. No network is involved, so the
+# receive path can be measured in isolation, at full speed or in the
+# captured timing.
+import argparse
+import json
+import time
+from clientIO import ScriptedSyncIO
+from clientMain import Client
+from binaryFraming import BINARY_REQUEST_DECODERS, BinaryFrameDecoder
+from messageCodec import encode
+from messageFraming import FrameDecoder
+from wireRecorder import WIRE_CONNECT, WIRE_OUT, read_records
+from utils import add_logging_arguments, configure_logging_from_args, getmylogger
+
+
+logging = getmylogger(__name__)
+
+
+def replay(path, client=None, realtime=False, speed=1.0):
+    # Feed the capture to the client (a fresh offline one by default),
+    # returns the replay statistics. The capture is read up front so disk
+    # I/O does not count in the timing
+    records = list(read_records(path))
+    if client is None:
+        # Follows the capture to binary frames if they were negotiated
+        client = Client(ScriptedSyncIO(keep_output=0), binary=True)
+    sent = FrameDecoder()
+    sent_binary = BinaryFrameDecoder(BINARY_REQUEST_DECODERS)
+    frames = 0
+    received = 0
+    t_first = records[0][0] if len(records) > 0 else 0
+    start = clock_start = time.perf_counter()
+    for t_ns, direction, data in records:
+        if direction == WIRE_CONNECT:
+            # Captures are appended to by every run, each with a monotonic
+            # clock of its own. The timing starts over with a connection
+            t_first, clock_start = t_ns, time.perf_counter()
+            client.replay_connected()
+            sent.reset()
+            sent_binary.reset()
+            continue
+        if realtime:
+            delay = (t_ns - t_first) / 1e9 / speed - (time.perf_counter() - clock_start)
+            if delay > 0:
+                time.sleep(delay)
+        if direction == WIRE_OUT:
+            # Requests follow the framing the client has switched to
+            if client.binary_framing:
+                for msg, _ in sent_binary.feed(data):
+                    client.replay_request(encode(msg.header, msg.payload))
+            else:
+                for req in sent.feed(data):
+                    client.replay_request(req)
+            continue
+        frames += client.replay_received(data)
+        received += len(data)
+        client.dispatch_events()
+    elapsed = time.perf_counter() - start
+    return {
+        "records": len(records),
+        "frames": frames,
+        "bytes": received,
+        "seconds": elapsed,
+        "frames_per_sec": frames / elapsed if elapsed > 0 else 0.0,
+        "mb_per_sec": received / elapsed / 1e6 if elapsed > 0 else 0.0,
+        "transitions": len(client.state_trace()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a client wire capture offline")
+    parser.add_argument("capture", help="file written by clientMain --capture")
+    parser.add_argument("--realtime", action="store_true",
+                        help="keep the captured timing instead of full speed")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time scale of --realtime, 2 replays twice as fast")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="replay the capture this many times, fresh client each")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_logging_from_args(args)
+    for _ in range(args.repeat):
+        stats = replay(args.capture, realtime=args.realtime, speed=args.speed)
+        if args.json:
+            print(json.dumps(stats))
+        else:
+            print(
+                "{records} records, {frames} frames, {bytes} bytes in {seconds:.4f}s: "
+                "{frames_per_sec:.0f} frames/s, {mb_per_sec:.2f} MB/s, "
+                "{transitions} transitions".format(**stats)
+            )